@@ -1,7 +1,9 @@
 #!/usr/bin/python3
+import time
+STARTED_AT = time.perf_counter()
+
+import os
 import urwid
-import subprocess
-import threading
 
 class E_mitiApp:
     def __init__(self):
@@ -14,6 +16,7 @@ class E_mitiApp:
         ]
         
         self.loop = None
+        self.system = None
         self.build_ui()
 
     def build_ui(self):
@@ -41,16 +44,38 @@ class E_mitiApp:
         self.loop = urwid.MainLoop(background, palette=self.palette, unhandled_input=self.unhandled_input)
 
     def start_main(self):
-        subprocess.run(["python3", "main.py"])
+        # Hand over to the inventory UI inside this process and main loop
+        import main
+        from background import DatabaseWorker
+        self.system = main.InventorySystemUI(connect=main.connect_services)
+        self.system.main_menu()
+        self.system.worker = DatabaseWorker(self.loop, max_workers=int(os.getenv("DB_POOL_SIZE", "5")))
+        self.loop.screen.register_palette(main.palette)
+        self.loop.screen.clear()
+        self.loop.widget = self.system.top
 
     def on_enter(self, button):
-        threading.Thread(target=self.start_main).start()
-        raise urwid.ExitMainLoop()
+        self.start_main()
 
     def unhandled_input(self, key):
-        if key == 'q':
-            self.loop.stop()
+        # Only the welcome screen quits on q; the inventory UI has its own Exit
+        if key == 'q' and self.system is None:
+            raise urwid.ExitMainLoop()
+
+    def close(self):
+        if self.system is not None:
+            self.system.close()
 
 if __name__ == "__main__":
     app = E_mitiApp()
-    app.loop.run()
\ No newline at end of file
+    timings = {}
+    if os.getenv("EMITI_STARTUP_TIMING") == "1":
+        from main import report_first_paint
+        report_first_paint(app.loop, STARTED_AT, timings)
+    try:
+        app.loop.run()
+    finally:
+        app.close()
+        if timings:
+            from main import print_startup_timings
+            print_startup_timings(timings)
\ No newline at end of file
@@ -0,0 +1,92 @@
+import os
+import queue
+import threading
+import typing
+from concurrent.futures import Future, ThreadPoolExecutor
+import urwid
+
+
+class DatabaseWorker:
+    # Runs blocking database calls on a thread pool and hands results back to
+    # the urwid main loop through a watched pipe, so callbacks run on the UI thread.
+    def __init__(self, loop: urwid.MainLoop, max_workers: int = 4):
+        self.loop = loop
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-worker")
+        self._results = queue.SimpleQueue()
+        self._pipe = loop.watch_pipe(self._deliver)
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._futures = {}
+
+    def submit(self, key: typing.Optional[str], fn: typing.Callable, *args,
+               callback: typing.Callable = None, on_error: typing.Callable = None,
+               on_cancel: typing.Callable = None) -> Future:
+        # A newer request with the same key makes any older one stale: it is
+        # cancelled if it has not started and its result is dropped if it has.
+        # Either way on_cancel runs on the main loop in place of the callback.
+        generation = None
+        if key is not None:
+            with self._lock:
+                generation = self._generations.get(key, 0) + 1
+                self._generations[key] = generation
+                previous = self._futures.get(key)
+                if previous is not None:
+                    previous.cancel()
+        future = self.executor.submit(fn, *args)
+        if key is not None:
+            with self._lock:
+                self._futures[key] = future
+        future.add_done_callback(lambda done: self._queue_result(key, generation, done, callback, on_error, on_cancel))
+        return future
+
+    def cancel(self, key: str):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            future = self._futures.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def cancel_all(self):
+        with self._lock:
+            keys = list(self._generations)
+        for key in keys:
+            self.cancel(key)
+
+    def _queue_result(self, key, generation, future, callback, on_error, on_cancel):
+        if future.cancelled() and on_cancel is None:
+            return
+        self._results.put((key, generation, future, callback, on_error, on_cancel))
+        try:
+            os.write(self._pipe, b"\n")
+        except OSError:
+            pass
+
+    def _deliver(self, data) -> bool:
+        while True:
+            try:
+                key, generation, future, callback, on_error, on_cancel = self._results.get_nowait()
+            except queue.Empty:
+                break
+            stale = future.cancelled()
+            if key is not None and not stale:
+                with self._lock:
+                    stale = self._generations.get(key) != generation
+                    if not stale:
+                        self._futures.pop(key, None)
+            if stale:
+                if on_cancel is not None:
+                    on_cancel()
+                continue
+            error = future.exception()
+            if error is not None:
+                if on_error is None:
+                    raise error
+                on_error(error)
+            elif callback is not None:
+                callback(future.result())
+        return True
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.loop.remove_watch_pipe(self._pipe)
+        os.close(self._pipe)
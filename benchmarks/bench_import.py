@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+# Compares the per-row add_item path with the chunked bulk import path.
+# Rows are written for --user-id under a BENCH- code prefix and removed afterwards.
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dotenv import load_dotenv
+from db_pool import ConnectionPool
+from inventory_database import InventoryDatabase
+from inventory_management import InventoryManagement
+
+
+def make_rows(count: int):
+    expiry = (datetime.now() + timedelta(days=365)).strftime('%Y-%m-%d')
+    for i in range(count):
+        yield {
+            "name": f"Bench Item {i % 500}",
+            "quantity": i % 100 + 1,
+            "price": round(1 + (i % 1000) / 10, 2),
+            "code": f"BENCH-{i}",
+            "expiry_date": expiry,
+            "flag": "0",
+        }
+
+
+def cleanup(inventory_db: InventoryDatabase, user_id: int):
+    # Through InventoryDatabase so item_holdings loses the benchmark rows too
+    with inventory_db.transaction() as cursor:
+        inventory_db.delete_by_code_prefix(cursor, "BENCH-", user_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-row vs bulk inventory import throughput")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    load_dotenv()
+    pool = ConnectionPool(host=os.getenv("DB_HOST"), user=os.getenv("DB_USER"),
+                          password=os.getenv("DB_PASSWORD"), database=os.getenv("DB_NAME"),
+                          pool_size=2)
+    inventory_db = InventoryDatabase(pool)
+    inventory_mgmt = InventoryManagement(inventory_db)
+
+    try:
+        start = time.perf_counter()
+        for row in make_rows(args.rows):
+            inventory_mgmt.add_item(args.user_id, row["name"], row["quantity"], row["price"],
+                                    row["code"], row["expiry_date"], False)
+        per_row = time.perf_counter() - start
+        cleanup(inventory_db, args.user_id)
+
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", newline="", delete=False) as f:
+            writer = csv.DictWriter(f, fieldnames=["name", "quantity", "price", "code", "expiry_date", "flag"])
+            writer.writeheader()
+            writer.writerows(make_rows(args.rows))
+            path = f.name
+        try:
+            start = time.perf_counter()
+            result = inventory_mgmt.import_file(args.user_id, path, chunk_size=args.chunk_size)
+            bulk = time.perf_counter() - start
+        finally:
+            os.unlink(path)
+    finally:
+        cleanup(inventory_db, args.user_id)
+        pool.close()
+
+    print(f"rows:      {args.rows}")
+    print(f"per-row:   {per_row:.2f}s ({args.rows / per_row:.0f} rows/s)")
+    print(f"bulk:      {bulk:.2f}s ({args.rows / bulk:.0f} rows/s, chunk size {args.chunk_size}, {result})")
+    print(f"speedup:   {per_row / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+# Cold-start benchmark: spawns a fresh interpreter per run and measures the
+# time from interpreter start to the first rendered frame of the welcome
+# screen and of the inventory system's main menu (rendered to an off-screen
+# canvas, so no terminal is needed), and whether the database stack was
+# imported along the way.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PROBE = r"""
+import time, sys, json
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import Welcome
+app = Welcome.E_mitiApp()
+app.loop.widget.render((120, 40), focus=True)
+welcome_ms = (time.perf_counter() - started) * 1000
+import main
+system = main.InventorySystemUI(connect=main.connect_services)
+system.main_menu()
+system.top.render((120, 40), focus=True)
+menu_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{"welcome_ms": welcome_ms, "main_menu_ms": menu_ms,
+                   "mysql_imported": "mysql.connector" in sys.modules}}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start to first paint")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        result = subprocess.run([sys.executable, "-c", PROBE.format(root=ROOT)], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    summary = {
+        "runs": args.runs,
+        "welcome_ms_median": statistics.median(run["welcome_ms"] for run in runs),
+        "main_menu_ms_median": statistics.median(run["main_menu_ms"] for run in runs),
+        "mysql_imported": any(run["mysql_imported"] for run in runs),
+    }
+    print(f"welcome screen first paint:  {summary['welcome_ms_median']:.1f} ms (median of {args.runs})")
+    print(f"inventory main menu painted: {summary['main_menu_ms_median']:.1f} ms")
+    print(f"database stack imported before login: {summary['mysql_imported']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
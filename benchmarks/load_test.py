@@ -0,0 +1,395 @@
+#!/usr/bin/python3
+# Simulates many terminals working against one database at once. Each session
+# logs in, then loops over a weighted mix of browse/search/mutate operations
+# through UserManagement and InventoryManagement until the run ends:
+#   python3 benchmarks/load_test.py --sessions 32 --duration 60 --mix browse=50,update=20,adjust=30
+# By default it runs on a file-backed SQLite stand-in (so writers really do
+# contend for the database lock); --mysql uses the DB_* settings from .env and
+# removes its LOAD- rows and users afterwards.
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from db_metrics import QueryMetrics
+from inventory_management import InventoryManagement
+from sqlite_database import SQLiteInventoryDatabase, SQLitePool
+from user_database import UserDatabase
+from user_management import UserManagement
+
+DEFAULT_MIX = "browse=35,search=15,lookup=15,update=15,add=8,adjust=8,flag=2,report=2"
+OPERATIONS = ("browse", "search", "lookup", "update", "add", "adjust", "flag", "report")
+ITEM_NAMES = 300
+PASSWORD = "load-test"
+# MySQL lock wait timeout and deadlock
+LOCK_ERRNOS = (1205, 1213)
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}; expected one of {', '.join(OPERATIONS)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"expected NAME=WEIGHT, got {part!r}")
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("the operation mix needs at least one positive weight")
+    return mix
+
+
+def is_contention(err: Exception) -> bool:
+    if getattr(err, "errno", None) in LOCK_ERRNOS:
+        return True
+    message = str(err).lower()
+    return "locked" in message or "busy" in message or "deadlock" in message or "lock wait" in message
+
+
+class ErrorTracker:
+    # The database classes report most failures by printing and returning a
+    # falsy value, so statement errors are picked up from the metrics hook and
+    # charged to whatever operation the session thread is running
+    def __init__(self, metrics: QueryMetrics):
+        self._local = threading.local()
+        metrics.add_hook(self._on_statement)
+
+    def _on_statement(self, name: str, elapsed_ms: float, rows: int, error):
+        if error is not None and getattr(self._local, "errors", None) is not None:
+            self._local.errors.append(error)
+
+    def begin(self):
+        self._local.errors = []
+
+    def end(self) -> list:
+        errors, self._local.errors = self._local.errors, None
+        return errors
+
+
+class Backend:
+    def __init__(self, args, pool_size: int):
+        self.metrics = QueryMetrics()
+        self.errors = ErrorTracker(self.metrics)
+        if args.mysql:
+            from dotenv import load_dotenv
+            from db_pool import ConnectionPool
+            from inventory_database import InventoryDatabase
+            load_dotenv()
+            self.pool = ConnectionPool(host=os.getenv("DB_HOST"), user=os.getenv("DB_USER"),
+                                       password=os.getenv("DB_PASSWORD"), database=os.getenv("DB_NAME"),
+                                       pool_size=pool_size, metrics=self.metrics)
+            self.inventory_db = InventoryDatabase(self.pool)
+        else:
+            self.pool = SQLitePool(args.database, timeout=args.busy_timeout, metrics=self.metrics)
+            self.inventory_db = SQLiteInventoryDatabase(self.pool)
+        self.user_db = UserDatabase(self.pool)
+
+    def session_services(self, cache: bool):
+        # One InventoryManagement per session, like one terminal process with its own caches
+        sizes = {} if cache else {"cache_size": 0, "code_cache_size": 0}
+        return UserManagement(self.user_db), InventoryManagement(self.inventory_db, **sizes)
+
+    def close(self):
+        self.pool.close()
+
+
+def prepare(args):
+    # Users load0..loadN-1, each with --rows-per-user items; names are shared so searches find several holders
+    if not args.mysql:
+        pool = SQLitePool(args.database)
+        pool.create_schema()
+        pool.acquire().execute(f"PRAGMA journal_mode={args.journal_mode}")
+        pool.close()
+    backend = Backend(args, 2)
+    user_mgmt, inventory_mgmt = backend.session_services(False)
+    expiry = datetime.now() + timedelta(days=365)
+    try:
+        for number in range(args.users):
+            username = f"load{number}"
+            authenticated, user_id, _ = user_mgmt.authenticate_user(username, PASSWORD)
+            if not authenticated:
+                user_mgmt.register_user(username, PASSWORD, "pharmacist")
+                _, user_id, _ = user_mgmt.authenticate_user(username, PASSWORD)
+            rows = ({
+                "name": f"Load Item {i % ITEM_NAMES}",
+                "quantity": 1000,
+                "price": 1 + (i % 500) / 10,
+                "code": f"LOAD-{number}-{i}",
+                "expiry_date": expiry - timedelta(days=i % 300),
+            } for i in range(args.rows_per_user))
+            inventory_mgmt.add_items_bulk(user_id, rows, chunk_size=5000)
+    finally:
+        backend.close()
+
+
+def cleanup(args):
+    backend = Backend(args, 1)
+    try:
+        # Through InventoryDatabase so item_holdings loses the LOAD- rows in the same transaction
+        with backend.inventory_db.transaction() as cursor:
+            backend.inventory_db.delete_by_code_prefix(cursor, "LOAD-")
+            usernames = [f"load{number}" for number in range(args.users)]
+            cursor.execute(f"DELETE FROM users WHERE username IN ({', '.join(['%s'] * len(usernames))})", usernames)
+    finally:
+        backend.close()
+
+
+class Session:
+    def __init__(self, number: int, args, backend: Backend):
+        self.number = number
+        self.args = args
+        self.backend = backend
+        self.random = random.Random(args.seed * 7919 + number)
+        self.user_mgmt, self.inventory_mgmt = backend.session_services(not args.no_cache)
+        self.username = f"load{number % args.users}"
+        self.user_id = None
+        self.items = []
+        self.codes = {}
+        self.added = 0
+        self.expiry = datetime.now() + timedelta(days=200)
+        self.results = {}
+
+    def record(self, name: str, elapsed_ms: float, errors: list):
+        result = self.results.setdefault(name, {"latencies": [], "lock_errors": 0, "errors": 0})
+        result["latencies"].append(elapsed_ms)
+        if errors:
+            if any(is_contention(err) for err in errors):
+                result["lock_errors"] += 1
+            else:
+                result["errors"] += 1
+
+    def timed(self, name: str, fn):
+        self.backend.errors.begin()
+        start = time.perf_counter()
+        errors = []
+        try:
+            fn()
+        except Exception as err:
+            errors.append(err)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        errors.extend(self.backend.errors.end())
+        self.record(name, elapsed_ms, errors)
+
+    def login(self):
+        authenticated, self.user_id, _ = self.user_mgmt.authenticate_user(self.username, PASSWORD)
+        if not authenticated:
+            raise RuntimeError(f"{self.username} could not log in")
+
+    def run(self, deadline: float) -> dict:
+        self.timed("login", self.login)
+        if self.user_id is None:
+            return self.results
+        # The session's own items, for updates and scans; not part of the measured work
+        batch = self.inventory_mgmt.db.load_inventory(self.user_id, "columns")
+        self.items = list(batch.id)
+        self.codes = dict(zip(batch.id, batch.code))
+        names = [name for name, weight in self.args.mix.items() if weight > 0]
+        weights = [self.args.mix[name] for name in names]
+        while time.perf_counter() < deadline:
+            name = self.random.choices(names, weights)[0]
+            self.timed(name, getattr(self, f"op_{name}"))
+            if self.args.think_ms:
+                time.sleep(self.random.expovariate(1000 / self.args.think_ms))
+        return self.results
+
+    def op_browse(self):
+        sort_key = self.random.choice(("id", "name", "expiry_date", "price"))
+        page = self.inventory_mgmt.get_inventory_page(self.user_id, sort_key, limit=50, form="record")
+        if page:
+            last = page[-1]
+            self.inventory_mgmt.get_inventory_page(self.user_id, sort_key, after=(last[sort_key], last['id']), limit=50,
+                                                   form="record")
+
+    def op_search(self):
+        name = f"Load Item {self.random.randrange(ITEM_NAMES)}"
+        matches = self.inventory_mgmt.search_item_names(name[:-1], 8)
+        if matches:
+            self.inventory_mgmt.get_top_users_for_item(matches[0])
+
+    def op_lookup(self):
+        self.inventory_mgmt.find_by_code(f"LOAD-{self.number % self.args.users}-"
+                                         f"{self.random.randrange(max(self.args.rows_per_user, 1))}", self.user_id)
+
+    def op_update(self):
+        if not self.items:
+            return
+        item_id = self.random.choice(self.items)
+        index = self.random.randrange(ITEM_NAMES)
+        self.inventory_mgmt.update_item(item_id, f"Load Item {index}", self.random.randint(100, 1000),
+                                        1 + index / 10, self.codes[item_id], self.expiry)
+
+    def op_add(self):
+        self.added += 1
+        code = f"LOAD-S{self.number}-{self.added}-{self.args.seed}"
+        item = self.inventory_mgmt.create_item(self.user_id, f"Load Item {self.random.randrange(ITEM_NAMES)}", 100, 2.5,
+                                               code, self.expiry)
+        if item and item.get('id') is not None:
+            self.items.append(item['id'])
+            self.codes[item['id']] = code
+
+    def op_adjust(self):
+        if self.codes:
+            self.inventory_mgmt.adjust_quantity_by_code(self.codes[self.random.choice(self.items)],
+                                                        self.random.choice((-1, 1)), self.user_id)
+
+    def op_flag(self):
+        if self.items:
+            self.inventory_mgmt.flag_item(self.random.choice(self.items))
+
+    def op_report(self):
+        self.inventory_mgmt.get_report(self.user_id)
+
+
+def merge_results(merged: dict, results: dict):
+    for name, result in results.items():
+        target = merged.setdefault(name, {"latencies": [], "lock_errors": 0, "errors": 0})
+        target["latencies"].extend(result["latencies"])
+        target["lock_errors"] += result["lock_errors"]
+        target["errors"] += result["errors"]
+
+
+def run_sessions(args, numbers: list, start_at: float) -> dict:
+    # One process's share of the sessions, each on its own thread; start_at is
+    # wall-clock time so every process starts and stops together
+    backend = Backend(args, len(numbers))
+    sessions = [Session(number, args, backend) for number in numbers]
+    time.sleep(max(start_at - time.time(), 0))
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=session.run, args=(deadline,), name=f"session-{session.number}")
+               for session in sessions]
+    # The database classes print every failed statement; they are counted instead unless --verbose
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    backend.close()
+    merged = {}
+    for session in sessions:
+        merge_results(merged, session.results)
+    return merged
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarise(merged: dict, elapsed: float) -> list:
+    rows = []
+    for name in ("login",) + OPERATIONS:
+        result = merged.get(name)
+        if not result or not result["latencies"]:
+            continue
+        latencies = sorted(result["latencies"])
+        rows.append({
+            "operation": name,
+            "count": len(latencies),
+            "ops_per_s": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": latencies[-1],
+            "lock_errors": result["lock_errors"],
+            "errors": result["errors"],
+        })
+    return rows
+
+
+def print_table(rows: list, elapsed: float):
+    print(f"{'operation':<10} {'count':>8} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} "
+          f"{'lock err':>9} {'errors':>7}")
+    for row in rows:
+        print(f"{row['operation']:<10} {row['count']:>8} {row['ops_per_s']:>9.1f} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+              f"{row['p99_ms']:>9.2f} {row['max_ms']:>9.2f} {row['lock_errors']:>9} {row['errors']:>7}")
+    total = sum(row['count'] for row in rows if row['operation'] != "login")
+    print(f"total: {total} operations in {elapsed:.1f}s ({total / elapsed:.1f} ops/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent multi-terminal load test for the E-miti data layer")
+    parser.add_argument("--sessions", type=int, default=16, help="concurrent simulated terminals")
+    parser.add_argument("--processes", type=int, default=1, help="spread the sessions over this many processes")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load after login")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"operation weights, default {DEFAULT_MIX}")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a session's operations")
+    parser.add_argument("--users", type=int, default=8, help="distinct accounts the sessions log in as")
+    parser.add_argument("--rows-per-user", type=int, default=2000)
+    parser.add_argument("--no-cache", action="store_true", help="disable the per-session read caches")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mysql", action="store_true", help="run against the MySQL server configured in .env")
+    parser.add_argument("--database", help="SQLite file to use (default: a temporary file, removed afterwards)")
+    parser.add_argument("--journal-mode", default="wal", choices=["wal", "delete"], help="SQLite journal mode")
+    parser.add_argument("--busy-timeout", type=float, default=5.0, help="SQLite seconds to wait on a locked database")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows afterwards")
+    parser.add_argument("--output", help="also write the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="print database errors as they happen")
+    args = parser.parse_args()
+
+    temporary = None
+    if not args.mysql and args.database is None:
+        temporary = tempfile.mkdtemp(prefix="emiti-load-")
+        args.database = os.path.join(temporary, "load.db")
+    try:
+        start = time.perf_counter()
+        prepare(args)
+        print(f"seeded {args.users} users x {args.rows_per_user} rows in {time.perf_counter() - start:.1f}s")
+
+        numbers = list(range(args.sessions))
+        processes = max(1, min(args.processes, args.sessions))
+        # Everyone starts together once all the sessions have been set up
+        start_at = time.time() + 1.0 + 0.5 * processes
+        if processes == 1:
+            results = [run_sessions(args, numbers, start_at)]
+        else:
+            with ProcessPoolExecutor(processes) as executor:
+                futures = [executor.submit(run_sessions, args, numbers[offset::processes], start_at)
+                           for offset in range(processes)]
+                results = [future.result() for future in futures]
+        elapsed = max(time.time() - start_at, 1e-9)
+
+        merged = {}
+        for result in results:
+            merge_results(merged, result)
+        rows = summarise(merged, elapsed)
+        backend = "mysql" if args.mysql else f"sqlite ({args.journal_mode})"
+        print(f"{args.sessions} sessions on {processes} process(es) against {backend}, "
+              f"{'no cache' if args.no_cache else 'cached reads'}")
+        print_table(rows, elapsed)
+        if args.output:
+            config = {key: value for key, value in vars(args).items() if key != "mix"}
+            with open(args.output, "w") as f:
+                json.dump({
+                    "python": platform.python_version(),
+                    "sqlite": sqlite3.sqlite_version,
+                    "timestamp": datetime.now().isoformat(timespec="seconds"),
+                    "config": dict(config, mix=args.mix),
+                    "elapsed_s": elapsed,
+                    "results": rows,
+                }, f, indent=2)
+    finally:
+        if args.mysql and not args.keep:
+            cleanup(args)
+        if temporary is not None and not args.keep:
+            shutil.rmtree(temporary, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+# Data- and UI-layer benchmarks against the in-memory SQLite stand-in.
+# Results are written as JSON so runs from different commits can be compared:
+#   python3 benchmarks/run_benchmarks.py --output new.json --compare old.json
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from inventory_management import InventoryManagement
+from sqlite_database import SQLiteInventoryDatabase, SQLitePool
+from user_database import UserDatabase
+from user_management import UserManagement
+
+USER_ID = 1
+
+
+def seed(inventory_mgmt: InventoryManagement, size: int):
+    expiry = datetime.now() + timedelta(days=180)
+    rows = ({
+        "name": f"Item {i % 1000}",
+        "quantity": i % 100 + 1,
+        "price": 1 + (i % 500) / 10,
+        "code": f"SEED-{i}",
+        "expiry_date": expiry - timedelta(days=i % 365),
+    } for i in range(size))
+    inventory_mgmt.add_items_bulk(USER_ID, rows, chunk_size=5000)
+
+
+def measure(name: str, size: int, fn, iterations: int, setup=None) -> dict:
+    timings = []
+    for i in range(iterations):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "name": name,
+        "size": size,
+        "iterations": iterations,
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "min_ms": timings[0],
+    }
+
+
+def row_form_benchmarks(inventory_mgmt: InventoryManagement, size: int, iterations: int) -> list:
+    # Decode time and retained memory of a full load in each row form
+    results = []
+    for form in ("dict", "record", "columns"):
+        row = measure(f"rows.load_inventory_{form}", size,
+                      lambda i: inventory_mgmt.db.load_inventory(USER_ID, form), iterations)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        rows = inventory_mgmt.db.load_inventory(USER_ID, form)
+        row["bytes_per_row"] = (tracemalloc.get_traced_memory()[0] - before) / max(len(rows), 1)
+        tracemalloc.stop()
+        del rows
+        results.append(row)
+    return results
+
+
+def render_benchmarks(inventory_mgmt: InventoryManagement, size: int, iterations: int) -> list:
+    from main import InventorySystemUI
+
+    screen = (160, 50)
+    system = InventorySystemUI(None, inventory_mgmt)
+    system.user_id = USER_ID
+
+    def first_paint(i):
+        system.inventory_menu()
+        system.top.render(screen, focus=True)
+
+    def scroll_page(i):
+        system.top.keypress(screen, "page down")
+        system.top.render(screen, focus=True)
+
+    results = [measure("ui.inventory_menu_first_paint", size, first_paint, iterations,
+                       setup=inventory_mgmt.cache.clear)]
+    system.inventory_menu()
+    results.append(measure("ui.inventory_scroll_page", size, scroll_page, iterations))
+    return results
+
+
+def run(size: int, iterations: int, with_ui: bool) -> list:
+    pool = SQLitePool()
+    pool.create_schema()
+    user_mgmt = UserManagement(UserDatabase(pool))
+    inventory_mgmt = InventoryManagement(SQLiteInventoryDatabase(pool))
+    user_mgmt.register_user("bench", "secret", "pharmacist")
+    for i in range(50):
+        user_mgmt.register_user(f"user{i}", "secret", "pharmacist")
+
+    start = time.perf_counter()
+    seed(inventory_mgmt, size)
+    results = [{"name": "seed.add_items_bulk", "size": size, "iterations": 1,
+                "mean_ms": (time.perf_counter() - start) * 1000}]
+
+    expiry = datetime.now() + timedelta(days=30)
+    added = []
+    results.append(measure("inventory.add_item", size, lambda i: added.append(
+        inventory_mgmt.create_item(USER_ID, "Bench Added", 1, 1.0, f"ADD-{size}-{i}", expiry)['id']), iterations))
+    results.append(measure("inventory.update_item", size, lambda i: inventory_mgmt.update_item(
+        added[i], "Bench Added", i, 2.0, f"ADD-{size}-{i}", expiry), iterations))
+    results.append(measure("inventory.get_inventory_cold", size, lambda i: inventory_mgmt.get_inventory(USER_ID),
+                           max(3, iterations // 10), setup=inventory_mgmt.cache.clear))
+    results.append(measure("inventory.get_inventory_warm", size, lambda i: inventory_mgmt.get_inventory(USER_ID), iterations))
+    results.append(measure("inventory.get_inventory_page_cold", size, lambda i: inventory_mgmt.get_inventory_page(
+        USER_ID, sort_key="expiry_date", limit=100), iterations, setup=inventory_mgmt.cache.clear))
+    results.append(measure("inventory.get_top_users_for_item_cold", size, lambda i: inventory_mgmt.get_top_users_for_item(
+        f"Item {i % 1000}"), iterations, setup=inventory_mgmt.cache.clear))
+    results.append(measure("inventory.get_top_users_for_item_warm", size, lambda i: inventory_mgmt.get_top_users_for_item(
+        "Item 1"), iterations))
+    results.append(measure("inventory.get_report_cold", size, lambda i: inventory_mgmt.get_report(USER_ID),
+                           max(3, iterations // 10), setup=inventory_mgmt.cache.clear))
+    results.append(measure("user.authenticate_user", size, lambda i: user_mgmt.authenticate_user(
+        f"user{i % 50}", "secret"), iterations))
+    results.extend(row_form_benchmarks(inventory_mgmt, size, max(3, iterations // 10)))
+    if with_ui:
+        results.extend(render_benchmarks(inventory_mgmt, size, max(3, iterations // 10)))
+    pool.close()
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(results: list, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {(row["name"], row["size"]): row for row in json.load(f)["results"]}
+    print(f"{'benchmark':<42} {'size':>7} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for row in results:
+        old = baseline.get((row["name"], row["size"]))
+        if old is None:
+            continue
+        change = (row["mean_ms"] - old["mean_ms"]) / old["mean_ms"] * 100 if old["mean_ms"] else 0.0
+        print(f"{row['name']:<42} {row['size']:>7} {old['mean_ms']:>12.3f} {row['mean_ms']:>12.3f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="E-miti data and UI layer benchmarks")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated inventory sizes")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="baseline JSON file from an earlier run")
+    parser.add_argument("--no-ui", action="store_true", help="skip the urwid render benchmarks")
+    args = parser.parse_args()
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        for row in run(size, args.iterations, not args.no_ui):
+            results.append(row)
+            memory = f" {row['bytes_per_row']:>8.0f} B/row" if "bytes_per_row" in row else ""
+            print(f"{row['name']:<42} {row['size']:>7} {row['mean_ms']:>10.3f} ms{memory}")
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "results": results,
+        }, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import time
+import typing
+
+MAX_GAPS = 1000
+
+
+class ChangeTracker:
+    # Follows inventory_changes for one view. A change_id is allocated when a
+    # transaction writes but only becomes visible when it commits, so a lower
+    # id can show up after a higher one: ids skipped over are remembered as
+    # gaps and re-checked on the next polls. A gap still missing after
+    # gap_timeout seconds (usually a rollback) asks for a reload rather than
+    # risk losing a change.
+    def __init__(self, user_id: typing.Optional[int], position: int, gap_timeout: float = 30.0):
+        self.user_id = user_id
+        self.position = position
+        self.gap_timeout = gap_timeout
+        self.gaps = {}
+
+    def missing(self) -> typing.List[int]:
+        return sorted(self.gaps)
+
+    def accept(self, changes: typing.List[dict], now: typing.Optional[float] = None) -> typing.Tuple[list, bool]:
+        # Returns ([(item_id, item or None), ...], resync); None means the item is gone from this view
+        now = time.monotonic() if now is None else now
+        latest = {}
+        highest = self.position
+        for change in changes:
+            change_id = change['change_id']
+            if change_id in self.gaps:
+                del self.gaps[change_id]
+            elif change_id <= self.position:
+                continue
+            else:
+                for missing in range(highest + 1, change_id):
+                    self.gaps[missing] = now
+                highest = max(highest, change_id)
+            if self.user_id is None or change['user_id'] == self.user_id:
+                latest[change['item_id']] = change['item']
+        self.position = highest
+        resync = len(self.gaps) > MAX_GAPS or any(now - since >= self.gap_timeout for since in self.gaps.values())
+        if resync:
+            self.gaps.clear()
+        return list(latest.items()), resync
@@ -0,0 +1,306 @@
+#!/usr/bin/python3
+# Non-interactive entry point for scripted and nightly jobs, e.g.
+#   EMITI_PASSWORD=... python3 cli.py --username admin --json export --all nightly.csv
+#   python3 cli.py --username clerk run jobs.txt     (one subcommand per line, one connection)
+import argparse
+import json
+import os
+import shlex
+import sys
+import typing
+from datetime import datetime, timedelta
+import mysql.connector
+from dotenv import load_dotenv
+from inventory_export import export_inventory
+from inventory_import import parse_expiry_date
+from inventory_reports import LOW_STOCK_THRESHOLD, InventoryReport, format_report
+from services import Services, connect_services
+from stock_ledger import HISTORY_DAYS, StockHistory, format_stock_history
+
+
+class CommandError(Exception):
+    pass
+
+
+class Session:
+    # Everything one invocation (or one script) needs: a single pooled
+    # connection, and the user the commands act for once authenticated
+    def __init__(self, services: Services, username: typing.Optional[str], password: typing.Optional[str]):
+        self.services = services
+        self.username = username
+        self.password = password
+        self.user_id = None
+        self.role = None
+
+    @property
+    def inventory_mgmt(self):
+        return self.services.inventory_mgmt
+
+    def require_user(self) -> int:
+        if self.user_id is None:
+            if not self.username or self.password is None:
+                raise CommandError("this command needs --username and a password (--password or EMITI_PASSWORD)")
+            authenticated, self.user_id, self.role = self.services.user_mgmt.authenticate_user(self.username, self.password)
+            if not authenticated:
+                raise CommandError(f"invalid credentials for {self.username!r}")
+        return self.user_id
+
+    def require_admin(self):
+        self.require_user()
+        if self.role != "admin":
+            raise CommandError("only Admin users can act on all inventory")
+
+
+def parse_date(value: str) -> datetime:
+    try:
+        return parse_expiry_date(value)
+    except ValueError as err:
+        raise argparse.ArgumentTypeError(str(err))
+
+
+def parse_adjustment(value: str) -> typing.Tuple[str, int]:
+    code, separator, delta = value.rpartition(":")
+    try:
+        if not separator or not code:
+            raise ValueError
+        return code, int(delta)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected CODE:DELTA, got {value!r}")
+
+
+def import_command(session: Session, args) -> typing.Tuple[dict, int]:
+    result = session.inventory_mgmt.import_file(session.require_user(), args.path, args.chunk_size)
+    output = {
+        "inserted": result.inserted,
+        "errors": [{"line": line, "message": message} for line, message in result.errors],
+    }
+    return output, 1 if result.errors else 0
+
+
+def export_command(session: Session, args) -> typing.Tuple[dict, int]:
+    if args.all:
+        session.require_admin()
+        user_id = None
+    else:
+        user_id = session.require_user()
+    result = export_inventory(session.inventory_mgmt, args.path, user_id, args.format, args.chunk_size,
+                              args.rows_per_file, args.expires_before, args.expires_after, args.flag)
+    return {"rows": result.rows, "files": result.files}, 0
+
+
+def adjust_command(session: Session, args) -> typing.Tuple[dict, int]:
+    deltas = {}
+    for code, delta in args.adjustments:
+        deltas[code] = deltas.get(code, 0) + delta
+    user_id = None
+    if args.all:
+        session.require_admin()
+    else:
+        user_id = session.require_user()
+    adjusted = session.inventory_mgmt.adjust_quantities_by_code(deltas, user_id)
+    unknown = [code for code in deltas if code not in adjusted]
+    output = {
+        "adjusted": {code: {"id": item['id'], "quantity": item['quantity']} for code, item in adjusted.items()},
+        "unknown": unknown,
+    }
+    return output, 1 if unknown else 0
+
+
+def flag_expired_command(session: Session, args) -> typing.Tuple[dict, int]:
+    session.require_admin()
+    before = datetime.now().replace(microsecond=0) + timedelta(days=args.lead_days)
+    return {"flagged": session.inventory_mgmt.flag_expiring(before), "before": before}, 0
+
+
+def top_holders_command(session: Session, args) -> typing.Tuple[list, int]:
+    session.require_user()
+    rows = session.inventory_mgmt.get_top_users_for_item(args.item)
+    return [{"username": row['username'], "total_quantity": int(row['total_quantity'])} for row in rows], 0
+
+
+def prune_changes_command(session: Session, args) -> typing.Tuple[dict, int]:
+    session.require_admin()
+    before = datetime.now().replace(microsecond=0) - timedelta(days=args.days)
+    inventory_mgmt = session.inventory_mgmt
+    output = {
+        "pruned": inventory_mgmt.prune_changes(before),
+        "pruned_mutation_keys": inventory_mgmt.prune_applied_mutations(before),
+        "before": before,
+    }
+    return output, 0
+
+
+def report_command(session: Session, args) -> typing.Tuple[InventoryReport, int]:
+    if args.all:
+        session.require_admin()
+        user_id = None
+    else:
+        user_id = session.require_user()
+    return session.inventory_mgmt.get_report(user_id, args.low_stock), 0
+
+
+def stock_history_command(session: Session, args) -> typing.Tuple[StockHistory, int]:
+    end = args.end or datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=args.days)
+    return session.inventory_mgmt.get_stock_history(session.require_user(), start, end, args.item), 0
+
+
+def stock_on_hand_command(session: Session, args) -> typing.Tuple[list, int]:
+    on_hand = session.inventory_mgmt.get_stock_on_hand(session.require_user(), args.at, args.item)
+    return [{"name": name, "quantity": quantity} for name, quantity in sorted(on_hand.items())], 0
+
+
+def checkpoint_stock_command(session: Session, args) -> typing.Tuple[dict, int]:
+    session.require_admin()
+    interval = timedelta(hours=args.interval_hours)
+    return {"snapshots": session.inventory_mgmt.checkpoint_stock(interval=interval)}, 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="E-miti inventory commands for scripts and scheduled jobs")
+    parser.add_argument("--username", default=os.getenv("EMITI_USERNAME"), help="user the commands act for")
+    parser.add_argument("--password", default=None, help="defaults to the EMITI_PASSWORD environment variable")
+    parser.add_argument("--json", action="store_true", help="print one JSON document per command")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    add_subcommands(subcommands)
+    run = subcommands.add_parser("run", help="run one subcommand per line of FILE ('-' for stdin) over one connection")
+    run.add_argument("script")
+    run.add_argument("--keep-going", action="store_true", help="continue after a failing line")
+    return parser
+
+
+def add_subcommands(subcommands):
+    command = subcommands.add_parser("import", help="bulk import a CSV or JSONL file")
+    command.add_argument("path")
+    command.add_argument("--chunk-size", type=int, default=1000)
+    command.set_defaults(handler=import_command)
+
+    command = subcommands.add_parser("export", help="stream inventory to .csv, .jsonl or .col")
+    command.add_argument("path")
+    command.add_argument("--all", action="store_true", help="every user's inventory (Admin only)")
+    command.add_argument("--format", choices=["csv", "jsonl", "col"], help="defaults to the file extension")
+    command.add_argument("--chunk-size", type=int, default=10000)
+    command.add_argument("--rows-per-file", type=int)
+    command.add_argument("--expires-before", type=parse_date)
+    command.add_argument("--expires-after", type=parse_date)
+    flags = command.add_mutually_exclusive_group()
+    flags.add_argument("--flagged", dest="flag", action="store_const", const=True)
+    flags.add_argument("--unflagged", dest="flag", action="store_const", const=False)
+    command.set_defaults(handler=export_command, flag=None)
+
+    command = subcommands.add_parser("adjust", help="apply quantity deltas by item code")
+    command.add_argument("adjustments", nargs="+", type=parse_adjustment, metavar="CODE:DELTA")
+    command.add_argument("--all", action="store_true", help="match codes in any user's inventory (Admin only)")
+    command.set_defaults(handler=adjust_command)
+
+    command = subcommands.add_parser("flag-expired", help="flag every item past (or within LEAD_DAYS of) expiry (Admin only)")
+    command.add_argument("--lead-days", type=int, default=0)
+    command.set_defaults(handler=flag_expired_command)
+
+    command = subcommands.add_parser("top-holders", help="the five users holding most of an item")
+    command.add_argument("item")
+    command.set_defaults(handler=top_holders_command)
+
+    command = subcommands.add_parser("prune-changes", help="drop change-feed entries and write-behind replay keys older than DAYS (Admin only)")
+    command.add_argument("--days", type=int, default=7)
+    command.set_defaults(handler=prune_changes_command)
+
+    command = subcommands.add_parser("report", help="valuation, expiry buckets and low stock for the user")
+    command.add_argument("--all", action="store_true", help="whole estate with per-role and per-user totals (Admin only)")
+    command.add_argument("--low-stock", type=int, default=LOW_STOCK_THRESHOLD, help="low-stock threshold per item name")
+    command.set_defaults(handler=report_command)
+
+    command = subcommands.add_parser("stock-history", help="opening, received, used and closing stock per item over DAYS")
+    command.add_argument("--days", type=int, default=HISTORY_DAYS)
+    command.add_argument("--end", type=parse_date, help="end of the period (default now)")
+    command.add_argument("--item", help="only this item name")
+    command.set_defaults(handler=stock_history_command)
+
+    command = subcommands.add_parser("stock-on-hand", help="quantity per item name as it stood at a past date")
+    command.add_argument("at", type=parse_date)
+    command.add_argument("--item", help="only this item name")
+    command.set_defaults(handler=stock_on_hand_command)
+
+    command = subcommands.add_parser("checkpoint-stock", help="snapshot every user's stock not snapshotted within INTERVAL_HOURS (Admin only)")
+    command.add_argument("--interval-hours", type=float, default=24)
+    command.set_defaults(handler=checkpoint_stock_command)
+
+
+def print_output(name: str, output, as_json: bool):
+    if isinstance(output, (InventoryReport, StockHistory)):
+        if not as_json:
+            print(format_report(output) if isinstance(output, InventoryReport) else format_stock_history(output))
+            return
+        output = output.as_dict()
+    if as_json:
+        print(json.dumps({"command": name, "result": output}, default=str))
+    elif isinstance(output, list):
+        for row in output:
+            print("  ".join(f"{key}={value}" for key, value in row.items()))
+    else:
+        for key, value in output.items():
+            print(f"{key}: {value}")
+
+
+def run_command(session: Session, args, as_json: bool) -> int:
+    try:
+        output, status = args.handler(session, args)
+    except (CommandError, ValueError, OSError, mysql.connector.Error) as err:
+        if as_json:
+            print(json.dumps({"command": args.command, "error": str(err)}))
+        else:
+            print(f"Error: {err}", file=sys.stderr)
+        return 2
+    print_output(args.command, output, as_json)
+    return status
+
+
+def run_script(session: Session, args) -> int:
+    # Each non-blank, non-comment line is parsed like a command line of its own
+    script_parser = argparse.ArgumentParser(prog="run", exit_on_error=False)
+    add_subcommands(script_parser.add_subparsers(dest="command", required=True))
+    f = sys.stdin if args.script == "-" else open(args.script, encoding="utf-8")
+    failed = 0
+    try:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                command_args = script_parser.parse_args(shlex.split(line))
+            except (argparse.ArgumentError, ValueError) as err:
+                status = 2
+                print(f"Error: line {line_no}: {err}", file=sys.stderr)
+            except SystemExit:
+                # argparse has already printed the usage error for this line
+                status = 2
+            else:
+                status = run_command(session, command_args, args.json)
+            if status:
+                failed = failed or status
+                if not args.keep_going:
+                    break
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return failed
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    load_dotenv()
+    password = args.password if args.password is not None else os.getenv("EMITI_PASSWORD")
+    # One connection serves the whole run; no scheduler or metrics threads
+    services = connect_services(background=False, pool_size=1)
+    session = Session(services, args.username, password)
+    try:
+        if args.command == "run":
+            return run_script(session, args)
+        return run_command(session, args, args.json)
+    finally:
+        services.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import http.server
+import logging
+import os
+import re
+import threading
+import time
+import typing
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+WHITESPACE = re.compile(r"\s+")
+TARGET_TABLE = re.compile(r"\b(?:into|update|from)\s+(\w+)", re.IGNORECASE)
+
+slow_query_logger = logging.getLogger("e_miti.slow_query")
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, elapsed_ms: float, rows: int, failed: bool):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.rows += rows
+        if failed:
+            self.errors += 1
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+
+class QueryMetrics:
+    # Hooks are called as hook(name, elapsed_ms, rows, error) after every statement.
+    def __init__(self, slow_query_ms: typing.Optional[float] = None, slow_query_log: typing.Optional[str] = None):
+        self.slow_query_ms = slow_query_ms
+        self.hooks = []
+        self._stats = {}
+        self._lock = threading.Lock()
+        if slow_query_log:
+            handler = logging.FileHandler(slow_query_log)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            slow_query_logger.addHandler(handler)
+            slow_query_logger.setLevel(logging.INFO)
+            slow_query_logger.propagate = False
+
+    def add_hook(self, hook: typing.Callable[[str, float, int, typing.Optional[Exception]], None]):
+        self.hooks.append(hook)
+
+    def observe(self, name: str, statement: str, params, elapsed_ms: float, rows: int,
+                error: typing.Optional[Exception] = None):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = QueryStats()
+            stats.observe(elapsed_ms, rows, error is not None)
+        if self.slow_query_ms is not None and elapsed_ms >= self.slow_query_ms:
+            slow_query_logger.info("%.1fms %s rows=%d %s", elapsed_ms, name, rows, redact(statement, params))
+        for hook in self.hooks:
+            hook(name, elapsed_ms, rows, error)
+
+    def add_rows(self, name: str, rows: int):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is not None:
+                stats.rows += rows
+
+    def wrap(self, cursor, name: str) -> "InstrumentedCursor":
+        return InstrumentedCursor(cursor, name, self)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "count": stats.count,
+                    "errors": stats.errors,
+                    "rows": stats.rows,
+                    "total_ms": stats.total_ms,
+                    "buckets": list(stats.buckets),
+                }
+                for name, stats in self._stats.items()
+            }
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# HELP emiti_db_query_duration_seconds Database statement latency by query name.",
+            "# TYPE emiti_db_query_duration_seconds histogram",
+        ]
+        snapshot = self.snapshot()
+        for name, stats in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS_MS, stats["buckets"]):
+                cumulative += count
+                lines.append(f'emiti_db_query_duration_seconds_bucket{{query="{name}",le="{bound / 1000:g}"}} {cumulative}')
+            lines.append(f'emiti_db_query_duration_seconds_bucket{{query="{name}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'emiti_db_query_duration_seconds_sum{{query="{name}"}} {stats["total_ms"] / 1000:.6f}')
+            lines.append(f'emiti_db_query_duration_seconds_count{{query="{name}"}} {stats["count"]}')
+        lines.append("# HELP emiti_db_query_rows_total Rows returned or affected by query name.")
+        lines.append("# TYPE emiti_db_query_rows_total counter")
+        for name, stats in sorted(snapshot.items()):
+            lines.append(f'emiti_db_query_rows_total{{query="{name}"}} {stats["rows"]}')
+        lines.append("# HELP emiti_db_query_errors_total Failed statements by query name.")
+        lines.append("# TYPE emiti_db_query_errors_total counter")
+        for name, stats in sorted(snapshot.items()):
+            lines.append(f'emiti_db_query_errors_total{{query="{name}"}} {stats["errors"]}')
+        return "\n".join(lines) + "\n"
+
+
+def redact(statement: str, params) -> str:
+    # Statements only carry %s placeholders; bound values are never written out
+    statement = WHITESPACE.sub(" ", statement).strip()
+    if params and isinstance(params, list) and isinstance(params[0], (list, tuple)):
+        return f"{statement} [{len(params)} parameter sets redacted]"
+    count = len(params) if params else 0
+    return f"{statement} [{count} params redacted]"
+
+
+def statement_label(statement: str) -> str:
+    # e.g. "insert:item_holdings", so each statement of a multi-statement method gets its own series
+    words = statement.split(None, 1)
+    verb = words[0].lower() if words else "unknown"
+    table = TARGET_TABLE.search(statement)
+    return f"{verb}:{table.group(1)}" if table else verb
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, name: str, metrics: QueryMetrics):
+        self._cursor = cursor
+        self._name = name
+        self._metrics = metrics
+        self._last_name = name
+
+    def __getattr__(self, attribute):
+        return getattr(self._cursor, attribute)
+
+    def _timed(self, method, statement: str, params, rows_of):
+        name = f"{self._name}:{statement_label(statement)}"
+        self._last_name = name
+        start = time.perf_counter()
+        try:
+            result = method(statement, params)
+        except Exception as err:
+            self._metrics.observe(name, statement, params, (time.perf_counter() - start) * 1000, 0, err)
+            raise
+        self._metrics.observe(name, statement, params, (time.perf_counter() - start) * 1000, rows_of())
+        return result
+
+    def execute(self, statement: str, params=()):
+        return self._timed(self._cursor.execute, statement, params, lambda: max(self._cursor.rowcount, 0))
+
+    def executemany(self, statement: str, seq_params):
+        seq_params = list(seq_params)
+        return self._timed(self._cursor.executemany, statement, seq_params, lambda: max(self._cursor.rowcount, 0))
+
+    def __iter__(self):
+        # Streaming cursors only know their row count once they have been read
+        rows = 0
+        try:
+            for row in self._cursor:
+                rows += 1
+                yield row
+        finally:
+            self._metrics.add_rows(self._last_name, rows)
+
+
+class PrometheusFileExporter:
+    # Rewrites a Prometheus text-format file every interval seconds, e.g. for
+    # node_exporter's textfile collector.
+    def __init__(self, metrics: QueryMetrics, path: str, interval: float = 15.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join(timeout=5)
+        self.write()
+
+    def write(self):
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            f.write(self.metrics.prometheus_text())
+        # Atomic replace so a scraper never sees a half-written file
+        os.replace(temporary, self.path)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+
+def serve_metrics(metrics: QueryMetrics, port: int, host: str = "127.0.0.1") -> http.server.ThreadingHTTPServer:
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,163 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+
+
+class ConnectionPool:
+    def __init__(self, host, user, password, database, pool_size: int = 5,
+                 checkout_timeout: float = 30.0, max_retries: int = 5,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, metrics=None):
+        self.config = {
+            "host": host,
+            "user": user,
+            "password": password,
+            "database": database,
+            # Lets a streaming cursor be abandoned part way without poisoning the connection
+            "consume_results": True,
+        }
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metrics = metrics
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        delay = self.backoff_base
+        for attempt in range(self.max_retries):
+            try:
+                return mysql.connector.connect(**self.config)
+            except mysql.connector.Error:
+                if attempt == self.max_retries - 1:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, self.backoff_max)
+
+    def dedicated(self):
+        # A connection outside the pool and its pool_size, e.g. to hold a
+        # session-scoped lock for a long time; the caller closes it
+        return self._connect()
+
+    def _healthy(self, conn) -> bool:
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.pool_size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    return self._connect()
+                except mysql.connector.Error:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            try:
+                conn = self._idle.get(timeout=self.checkout_timeout)
+            except queue.Empty:
+                raise mysql.connector.errors.PoolError("Timed out waiting for a database connection")
+
+        if self._healthy(conn):
+            return conn
+        # Stale connection (e.g. after a server failover): replace it in place.
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+        try:
+            return self._connect()
+        except mysql.connector.Error:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def release(self, conn):
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except mysql.connector.Error:
+                self._discard(conn)
+                return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            self._discard(conn)
+
+    def failures(self) -> int:
+        # Database errors seen by the calling thread; callers compare before and
+        # after a read whose errors were caught and turned into an empty result
+        return getattr(self._local, "failures", 0)
+
+    def _failed(self):
+        self._local.failures = self.failures() + 1
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.acquire()
+        except mysql.connector.Error:
+            self._failed()
+            raise
+        try:
+            yield conn
+        except mysql.connector.Error:
+            self._failed()
+            if not self._healthy(conn):
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self.release(conn)
+
+    @contextmanager
+    def cursor(self, dictionary: bool = True, commit: bool = False, buffered: bool = True, name: str = "query",
+               prepared: bool = False):
+        with self.connection() as conn:
+            # Prepared cursors use the binary protocol and are never buffered by the connector
+            cursor = conn.cursor(dictionary=dictionary, buffered=buffered and not prepared, prepared=prepared)
+            if self.metrics is not None:
+                cursor = self.metrics.wrap(cursor, name)
+            try:
+                yield cursor
+                if commit:
+                    conn.commit()
+            except Exception:
+                if conn.is_connected():
+                    conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
@@ -0,0 +1,182 @@
+import heapq
+import threading
+import typing
+from datetime import datetime, timedelta
+import mysql.connector
+from inventory_import import parse_expiry_date
+
+# Held by the one terminal that runs the scheduler for the whole estate
+LOCK_NAME = "e_miti_expiry_scheduler"
+
+
+class ExpiryScheduler:
+    # Flags stock as it reaches (expiry_date - lead). Only items due within the
+    # horizon are held in a heap; the thread sleeps until the earliest one is
+    # due, flags everything due in one set-based UPDATE, and re-reads the next
+    # horizon from the (flag, expiry_date) index when the current one runs out.
+    # A cycle that hits a database error keeps its work (the horizon is not
+    # advanced, popped items go back on the heap) and is retried with backoff.
+    # Given a pool, only the terminal holding LOCK_NAME (a MySQL GET_LOCK on a
+    # dedicated connection outside pool_size) does any of this; the others
+    # check back every leader_check seconds and take over if it goes away.
+    def __init__(self, inventory_mgmt, lead_days: int = 0, horizon: timedelta = timedelta(hours=6),
+                 batch_size: int = 500, schedule_limit: int = 10000, pool=None, leader_check: float = 60.0,
+                 retry_base: float = 0.5, retry_max: float = 8.0):
+        self.inventory_mgmt = inventory_mgmt
+        self.pool = pool
+        self.leader_check = leader_check
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._lock_conn = None
+        self.lead = timedelta(days=lead_days)
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.schedule_limit = schedule_limit
+        self._heap = []
+        self._horizon_end = None
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = None
+        inventory_mgmt.add_listener(self._on_change)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="expiry-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._lock_conn is not None:
+            try:
+                cursor = self._lock_conn.cursor()
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+                cursor.fetchall()
+                cursor.close()
+            except mysql.connector.Error:
+                pass
+            self._close_lock_conn()
+
+    def _close_lock_conn(self):
+        try:
+            self._lock_conn.close()
+        except mysql.connector.Error:
+            pass
+        self._lock_conn = None
+
+    def _is_leader(self) -> bool:
+        if self.pool is None:
+            return True
+        if self._lock_conn is not None:
+            try:
+                self._lock_conn.ping(reconnect=False)
+                return True
+            except mysql.connector.Error:
+                # The lock went with the session
+                self._close_lock_conn()
+        try:
+            conn = self.pool.dedicated()
+        except mysql.connector.Error:
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+            locked = cursor.fetchone()[0] == 1
+            cursor.close()
+        except mysql.connector.Error:
+            locked = False
+        self._lock_conn = conn
+        if not locked:
+            self._close_lock_conn()
+        return locked
+
+    def _on_change(self, event: str, item: dict, old: typing.Optional[dict] = None):
+        if event not in ("add", "update") or item.get('flag'):
+            return
+        try:
+            due = parse_expiry_date(item['expiry_date']) - self.lead
+        except (KeyError, ValueError):
+            return
+        with self._condition:
+            if self._horizon_end is not None and due < self._horizon_end:
+                heapq.heappush(self._heap, (due, item['id'], item['user_id']))
+                self._condition.notify()
+
+    def _failures(self) -> int:
+        # The database layer reports errors and returns empty results; the pool counts them
+        return self.inventory_mgmt.db.pool.failures()
+
+    def _refill(self, now: datetime) -> bool:
+        # Anything already past due (e.g. while no terminal was running) is caught up in one statement
+        failures = self._failures()
+        self.inventory_mgmt.flag_expiring(now + self.lead)
+        horizon_end = now + self.horizon
+        rows = self.inventory_mgmt.get_expiry_schedule(horizon_end + self.lead, self.schedule_limit)
+        if self._failures() != failures:
+            return False
+        if len(rows) == self.schedule_limit:
+            # Truncated: come back for the rest once this window has been worked off
+            horizon_end = rows[-1]['expiry_date'] - self.lead
+        entries = [(row['expiry_date'] - self.lead, row['id'], row['user_id']) for row in rows]
+        with self._condition:
+            self._horizon_end = horizon_end
+            self._heap.extend(entries)
+            heapq.heapify(self._heap)
+        return True
+
+    def _pop_due(self, now: datetime) -> typing.List[tuple]:
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                due.append(heapq.heappop(self._heap))
+        return due
+
+    def _flag_due(self, now: datetime) -> bool:
+        due = self._pop_due(now)
+        if not due:
+            return True
+        failures = self._failures()
+        self.inventory_mgmt.flag_items([{"id": item_id, "user_id": user_id} for _, item_id, user_id in due],
+                                       expiring_before=now + self.lead + timedelta(seconds=1))
+        if self._failures() == failures:
+            return True
+        with self._condition:
+            for entry in due:
+                heapq.heappush(self._heap, entry)
+        return False
+
+    def _run(self):
+        retry = self.retry_base
+        while True:
+            if not self._is_leader():
+                with self._condition:
+                    # Whoever holds the lock has its own schedule; start afresh if this terminal takes over
+                    self._heap = []
+                    self._horizon_end = None
+                    if self._stopped:
+                        return
+                    self._condition.wait(self.leader_check)
+                    if self._stopped:
+                        return
+                continue
+            now = datetime.now()
+            ok = True
+            if self._horizon_end is None or now >= self._horizon_end:
+                ok = self._refill(now)
+            ok = ok and self._flag_due(now)
+            with self._condition:
+                if self._stopped:
+                    return
+                if not ok:
+                    timeout = retry
+                    retry = min(retry * 2, self.retry_max)
+                else:
+                    retry = self.retry_base
+                    wake_at = min(self._heap[0][0], self._horizon_end) if self._heap else self._horizon_end
+                    timeout = (wake_at - datetime.now()).total_seconds()
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
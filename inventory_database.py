@@ -1,38 +1,70 @@
 import mysql.connector
 import os
+import typing
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from db_pool import ConnectionPool
+from migrations import create_item_holdings
+from records import INVENTORY_COLUMNS, INVENTORY_SELECT, InventoryBatch, check_form, decode_inventory
 
 load_dotenv()
 
+SORT_KEYS = ("id", "name", "expiry_date", "price")
+BATCH_FIELDS = ("name", "quantity", "price", "code", "expiry_date")
+
+def page_key(row: dict, sort_key: str = "id") -> tuple:
+    return (row[sort_key], row['id'])
+
+def add_holding(adjustments: dict, name: str, user_id: int, quantity: int, count: int):
+    total, items = adjustments.get((name, user_id), (0, 0))
+    adjustments[(name, user_id)] = (total + quantity, items + count)
+
 class InventoryDatabase:
-    def __init__(self, host, user, password, database):
-        self.conn = mysql.connector.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=database
-        )
-        self.cursor = self.conn.cursor(dictionary=True)
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
 
     def save_item(self, item: dict) -> bool:
         try:
-            self.cursor.execute(
-                "INSERT INTO inventory (user_id, name, quantity, price, code, expiry_date, created_at, flag) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-                (item['user_id'], item['name'], item['quantity'], item['price'], item['code'], item['expiry_date'], item['created_at'], item['flag'])
-            )
-            self.conn.commit()
+            with self.pool.cursor(commit=True, name="inventory.save_item") as cursor:
+                cursor.execute(
+                    "INSERT INTO inventory (user_id, name, quantity, price, code, expiry_date, created_at, flag) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                    (item['user_id'], item['name'], item['quantity'], item['price'], item['code'], item['expiry_date'], item['created_at'], item['flag'])
+                )
+                item['id'] = cursor.lastrowid
+                self._adjust_holdings(cursor, {(item['name'], item['user_id']): (item['quantity'], 1)})
             return True
         except mysql.connector.Error as err:
             print(f"Error: {err}")
             return False
 
+    def save_items(self, items: list) -> int:
+        # One transaction per chunk; raises so the caller can isolate bad rows
+        with self.pool.cursor(commit=True, name="inventory.save_items") as cursor:
+            cursor.executemany(
+                "INSERT INTO inventory (user_id, name, quantity, price, code, expiry_date, created_at, flag) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                [(item['user_id'], item['name'], item['quantity'], item['price'], item['code'], item['expiry_date'], item['created_at'], item['flag']) for item in items]
+            )
+            adjustments = {}
+            for item in items:
+                add_holding(adjustments, item['name'], item['user_id'], item['quantity'], 1)
+            self._adjust_holdings(cursor, adjustments)
+        return len(items)
+
     def update_item(self, item: dict) -> bool:
         try:
-            self.cursor.execute(
-                "UPDATE inventory SET name=%s, quantity=%s, price=%s, code=%s, expiry_date=%s WHERE id=%s",
-                (item['name'], item['quantity'], item['price'], item['code'], item['expiry_date'], item['id'])
-            )
-            self.conn.commit()
+            with self.pool.cursor(commit=True, name="inventory.update_item") as cursor:
+                cursor.execute("SELECT user_id, name, quantity FROM inventory WHERE id=%s FOR UPDATE", (item['id'],))
+                old = cursor.fetchone()
+                cursor.execute(
+                    "UPDATE inventory SET name=%s, quantity=%s, price=%s, code=%s, expiry_date=%s WHERE id=%s",
+                    (item['name'], item['quantity'], item['price'], item['code'], item['expiry_date'], item['id'])
+                )
+                if old:
+                    adjustments = {}
+                    add_holding(adjustments, old['name'], old['user_id'], -old['quantity'], -1)
+                    add_holding(adjustments, item['name'], old['user_id'], item['quantity'], 1)
+                    self._adjust_holdings(cursor, adjustments)
             return True
         except mysql.connector.Error as err:
             print(f"Error: {err}")
@@ -40,8 +72,12 @@ class InventoryDatabase:
 
     def delete_item(self, item_id: int) -> bool:
         try:
-            self.cursor.execute("DELETE FROM inventory WHERE id=%s", (item_id,))
-            self.conn.commit()
+            with self.pool.cursor(commit=True, name="inventory.delete_item") as cursor:
+                cursor.execute("SELECT user_id, name, quantity FROM inventory WHERE id=%s FOR UPDATE", (item_id,))
+                old = cursor.fetchone()
+                cursor.execute("DELETE FROM inventory WHERE id=%s", (item_id,))
+                if old:
+                    self._adjust_holdings(cursor, {(old['name'], old['user_id']): (-old['quantity'], -1)})
             return True
         except mysql.connector.Error as err:
             print(f"Error: {err}")
@@ -49,33 +85,752 @@ class InventoryDatabase:
 
     def flag_item(self, item_id: int) -> bool:
         try:
-            self.cursor.execute("UPDATE inventory SET flag=1 WHERE id=%s", (item_id,))
-            self.conn.commit()
+            with self.pool.cursor(commit=True, name="inventory.flag_item") as cursor:
+                cursor.execute("UPDATE inventory SET flag=1 WHERE id=%s", (item_id,))
             return True
         except mysql.connector.Error as err:
             print(f"Error: {err}")
             return False
 
-    def load_inventory(self, user_id: int) -> list:
+    def flag_items(self, item_ids: list, expiring_before: typing.Optional[datetime] = None) -> int:
+        # Set-based flagging; the expiry guard makes entries from a stale schedule harmless
+        flagged = 0
+        try:
+            with self.pool.cursor(commit=True, name="inventory.flag_items") as cursor:
+                for start in range(0, len(item_ids), 1000):
+                    chunk = item_ids[start:start + 1000]
+                    query = f"UPDATE inventory SET flag=1 WHERE flag=0 AND id IN ({', '.join(['%s'] * len(chunk))})"
+                    params = list(chunk)
+                    if expiring_before is not None:
+                        query += " AND expiry_date < %s"
+                        params.append(expiring_before)
+                    cursor.execute(query, params)
+                    flagged += cursor.rowcount
+            return flagged
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return 0
+
+    def flag_expiring(self, before: datetime) -> int:
+        try:
+            with self.pool.cursor(commit=True, name="inventory.flag_expiring") as cursor:
+                cursor.execute("UPDATE inventory SET flag=1 WHERE flag=0 AND expiry_date < %s", (before,))
+                return cursor.rowcount
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return 0
+
+    def load_expiry_schedule(self, before: datetime, limit: int = 10000) -> list:
+        try:
+            with self.pool.cursor(name="inventory.load_expiry_schedule") as cursor:
+                cursor.execute(
+                    "SELECT id, user_id, expiry_date FROM inventory WHERE flag=0 AND expiry_date < %s ORDER BY expiry_date LIMIT %s",
+                    (before, limit)
+                )
+                return cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+
+    def find_by_code(self, code: str, user_id: int) -> dict:
+        # Several lots of one product share a code; the first to expire is the one on the shelf
+        try:
+            with self.pool.cursor(name="inventory.find_by_code") as cursor:
+                cursor.execute("SELECT * FROM inventory WHERE user_id=%s AND code=%s ORDER BY expiry_date, id LIMIT 1",
+                               (user_id, code))
+                return cursor.fetchone()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return None
+
+    def adjust_quantities_by_code(self, deltas: dict, user_id: typing.Optional[int] = None) -> typing.Tuple[list, list]:
+        # Applies a burst of scans in one transaction; quantities never go below zero.
+        # Each code's delta goes to its first-expiring lot (estate-wide when user_id is None).
+        if not deltas:
+            return [], []
+        codes = list(deltas)
+        query = f"SELECT * FROM inventory WHERE code IN ({', '.join(['%s'] * len(codes))})"
+        params = list(codes)
+        if user_id is not None:
+            query += " AND user_id=%s"
+            params.append(user_id)
+        try:
+            with self.pool.cursor(commit=True, name="inventory.adjust_quantities_by_code") as cursor:
+                cursor.execute(query + " ORDER BY expiry_date, id FOR UPDATE", params)
+                old_rows = []
+                for row in cursor.fetchall():
+                    if all(row['code'] != taken['code'] for taken in old_rows):
+                        old_rows.append(row)
+                new_rows = [dict(row, quantity=max(row['quantity'] + deltas[row['code']], 0)) for row in old_rows]
+                cursor.executemany("UPDATE inventory SET quantity=%s WHERE id=%s",
+                                   [(row['quantity'], row['id']) for row in new_rows])
+                adjustments = {}
+                for old, new in zip(old_rows, new_rows):
+                    add_holding(adjustments, old['name'], old['user_id'], new['quantity'] - old['quantity'], 0)
+                self._adjust_holdings(cursor, adjustments)
+            return old_rows, new_rows
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return [], []
+
+    @contextmanager
+    def transaction(self):
+        # One connection and one commit for a whole unit of work; raises (after rollback) on error
+        with self.pool.cursor(commit=True, name="inventory.batch") as cursor:
+            yield cursor
+
+    def apply_batch(self, cursor, inserts: list, changes: dict) -> dict:
+        # changes maps item id -> {"fields": {...}, "flag": bool, "delete": bool}, already
+        # coalesced per item, so statements can be grouped by kind without reordering effects.
+        # Returns the pre-change rows of the items that exist.
+        old_rows = {}
+        ids = list(changes)
+        for start in range(0, len(ids), 1000):
+            chunk = ids[start:start + 1000]
+            cursor.execute(f"SELECT * FROM inventory WHERE id IN ({', '.join(['%s'] * len(chunk))}) FOR UPDATE", chunk)
+            for row in cursor.fetchall():
+                old_rows[row['id']] = row
+        adjustments = {}
+        for item in inserts:
+            # Row by row to learn each id; still no commit until the batch ends
+            cursor.execute(
+                "INSERT INTO inventory (user_id, name, quantity, price, code, expiry_date, created_at, flag) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                (item['user_id'], item['name'], item['quantity'], item['price'], item['code'], item['expiry_date'], item['created_at'], item['flag'])
+            )
+            item['id'] = cursor.lastrowid
+            add_holding(adjustments, item['name'], item['user_id'], item['quantity'], 1)
+        updates = {}
+        flagged = []
+        deleted = []
+        for item_id, change in changes.items():
+            old = old_rows.get(item_id)
+            if old is None:
+                continue
+            if change.get('delete'):
+                deleted.append(item_id)
+                add_holding(adjustments, old['name'], old['user_id'], -old['quantity'], -1)
+                continue
+            fields = change.get('fields', {})
+            if fields:
+                columns = tuple(sorted(fields))
+                if not set(columns) <= set(BATCH_FIELDS):
+                    raise ValueError(f"Unsupported batch fields: {columns}")
+                updates.setdefault(columns, []).append(tuple(fields[column] for column in columns) + (item_id,))
+                new_name = fields.get('name', old['name'])
+                new_quantity = fields.get('quantity', old['quantity'])
+                add_holding(adjustments, old['name'], old['user_id'], -old['quantity'], -1)
+                add_holding(adjustments, new_name, old['user_id'], new_quantity, 1)
+            if change.get('flag'):
+                flagged.append(item_id)
+        for columns, params in updates.items():
+            assignments = ", ".join(f"{column}=%s" for column in columns)
+            cursor.executemany(f"UPDATE inventory SET {assignments} WHERE id=%s", params)
+        for start in range(0, len(flagged), 1000):
+            chunk = flagged[start:start + 1000]
+            cursor.execute(f"UPDATE inventory SET flag=1 WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        for start in range(0, len(deleted), 1000):
+            chunk = deleted[start:start + 1000]
+            cursor.execute(f"DELETE FROM inventory WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        self._adjust_holdings(cursor, adjustments)
+        return old_rows
+
+    def get_item(self, item_id: int) -> dict:
+        try:
+            with self.pool.cursor(name="inventory.get_item") as cursor:
+                cursor.execute("SELECT * FROM inventory WHERE id=%s", (item_id,))
+                return cursor.fetchone()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return None
+
+    def load_inventory(self, user_id: int, form: str = "dict"):
+        return self._load_rows("inventory.load_inventory", "SELECT {columns} FROM inventory WHERE user_id=%s", [user_id], form)
+
+    def _load_rows(self, name: str, query: str, params: list, form: str):
+        # form is one of records.ROW_FORMS; records and columns are decoded
+        # straight from tuples of a prepared (binary protocol) cursor
+        check_form(form)
+        try:
+            if form == "dict":
+                with self.pool.cursor(name=name) as cursor:
+                    cursor.execute(query.format(columns="*"), params)
+                    return cursor.fetchall()
+            with self.pool.cursor(dictionary=False, prepared=True, name=name) as cursor:
+                cursor.execute(query.format(columns=INVENTORY_SELECT), params)
+                if form == "record":
+                    return decode_inventory(cursor.fetchall(), form)
+                batch = InventoryBatch()
+                while True:
+                    rows = cursor.fetchmany(1000)
+                    if not rows:
+                        return batch
+                    batch.extend(rows)
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return [] if form != "columns" else InventoryBatch()
+
+    def _inventory_query(self, user_id: typing.Optional[int], sort_key: str, descending: bool,
+                         after: typing.Optional[tuple], filters: dict) -> typing.Tuple[str, list]:
+        if sort_key not in SORT_KEYS:
+            raise ValueError(f"Unsupported sort key: {sort_key}")
+        clauses = []
+        params = []
+        if user_id is not None:
+            clauses.append("user_id=%s")
+            params.append(user_id)
+        if filters.get('expires_before') is not None:
+            clauses.append("expiry_date < %s")
+            params.append(filters['expires_before'])
+        if filters.get('expires_after') is not None:
+            clauses.append("expiry_date >= %s")
+            params.append(filters['expires_after'])
+        if filters.get('min_price') is not None:
+            clauses.append("price >= %s")
+            params.append(filters['min_price'])
+        if filters.get('max_price') is not None:
+            clauses.append("price <= %s")
+            params.append(filters['max_price'])
+        if filters.get('item_name') is not None:
+            clauses.append("name=%s")
+            params.append(filters['item_name'])
+        if filters.get('name'):
+            clauses.append("name LIKE %s")
+            params.append(filters['name'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if filters.get('flag') is not None:
+            clauses.append("flag=%s")
+            params.append(1 if filters['flag'] else 0)
+
+        op = "<" if descending else ">"
+        if after is not None:
+            if sort_key == "id":
+                clauses.append(f"id {op} %s")
+                params.append(after[1])
+            else:
+                clauses.append(f"({sort_key} {op} %s OR ({sort_key} = %s AND id {op} %s))")
+                params.extend([after[0], after[0], after[1]])
+
+        direction = "DESC" if descending else "ASC"
+        order = f"id {direction}" if sort_key == "id" else f"{sort_key} {direction}, id {direction}"
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return f"SELECT {{columns}} FROM inventory {where} ORDER BY {order}", params
+
+    def load_inventory_page(self, user_id: typing.Optional[int], sort_key: str = "id", after: typing.Optional[tuple] = None,
+                            limit: int = 100, descending: bool = False, form: str = "dict", **filters):
+        query, params = self._inventory_query(user_id, sort_key, descending, after, filters)
+        return self._load_rows("inventory.load_inventory_page", query + " LIMIT %s", params + [limit], form)
+
+    def iter_inventory(self, user_id: typing.Optional[int], sort_key: str = "id", descending: bool = False,
+                       form: str = "dict", batch_size: int = 1000, raise_errors: bool = False, **filters) -> typing.Iterator:
+        # Yields dicts or records one at a time, or InventoryBatch chunks of
+        # batch_size rows for form="columns". By default an error ends the
+        # stream early; raise_errors is for callers that must not mistake that
+        # for the end of the data.
+        check_form(form)
+        query, params = self._inventory_query(user_id, sort_key, descending, None, filters)
+        try:
+            # Unbuffered: rows are streamed from the server as the caller iterates
+            if form == "dict":
+                with self.pool.cursor(buffered=False, name="inventory.iter_inventory") as cursor:
+                    cursor.execute(query.format(columns="*"), params)
+                    for row in cursor:
+                        yield row
+                return
+            with self.pool.cursor(dictionary=False, prepared=True, name="inventory.iter_inventory") as cursor:
+                cursor.execute(query.format(columns=INVENTORY_SELECT), params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    if form == "columns":
+                        yield InventoryBatch.from_rows(rows)
+                    else:
+                        yield from decode_inventory(rows, form)
+        except mysql.connector.Error as err:
+            if raise_errors:
+                raise
+            print(f"Error: {err}")
+
+    def latest_change_id(self) -> int:
+        try:
+            with self.pool.cursor(name="inventory.latest_change_id") as cursor:
+                cursor.execute("SELECT COALESCE(MAX(change_id), 0) AS change_id FROM inventory_changes")
+                return int(cursor.fetchone()['change_id'])
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return 0
+
+    def changes_since(self, watermark: int, user_id: typing.Optional[int] = None, limit: int = 1000,
+                      missing: typing.Sequence[int] = ()) -> list:
+        # Every change after the watermark (plus any ids in missing, gaps the
+        # caller is still waiting on) comes back so callers can track gaps, but
+        # current item rows are only joined in for user_id's items; deleted
+        # items come back with item None.
+        join = "i.id = c.item_id"
+        params = []
+        if user_id is not None:
+            join += " AND i.user_id = %s"
+            params.append(user_id)
+        where = "c.change_id > %s"
+        params.append(watermark)
+        if missing:
+            where = f"({where} OR c.change_id IN ({', '.join(['%s'] * len(missing))}))"
+            params.extend(missing)
+        try:
+            with self.pool.cursor(name="inventory.changes_since") as cursor:
+                cursor.execute(f"""
+                    SELECT c.change_id, c.item_id, c.user_id AS change_user_id, c.op, i.*
+                    FROM inventory_changes c
+                    LEFT JOIN inventory i ON {join}
+                    WHERE {where}
+                    ORDER BY c.change_id
+                    LIMIT %s
+                """, params + [limit])
+                rows = cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+        return [{
+            "change_id": row['change_id'],
+            "item_id": row['item_id'],
+            "user_id": row['change_user_id'],
+            "op": row['op'],
+            "item": {column: row[column] for column in INVENTORY_COLUMNS} if row['id'] is not None else None,
+        } for row in rows]
+
+    def prune_changes(self, before: datetime) -> int:
+        try:
+            with self.pool.cursor(commit=True, name="inventory.prune_changes") as cursor:
+                # The newest change is always kept so latest_change_id() never goes backwards
+                cursor.execute("SELECT COALESCE(MAX(change_id), 0) AS change_id FROM inventory_changes")
+                latest = cursor.fetchone()['change_id']
+                cursor.execute("DELETE FROM inventory_changes WHERE changed_at < %s AND change_id < %s", (before, latest))
+                return cursor.rowcount
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return 0
+
+    def lock_items(self, cursor, item_ids: list) -> dict:
+        # Current rows of the given items, locked until the caller's transaction ends
+        rows = {}
+        ids = list(dict.fromkeys(item_ids))
+        for start in range(0, len(ids), 1000):
+            chunk = ids[start:start + 1000]
+            cursor.execute(f"SELECT * FROM inventory WHERE id IN ({', '.join(['%s'] * len(chunk))}) FOR UPDATE", chunk)
+            for row in cursor.fetchall():
+                rows[row['id']] = row
+        return rows
+
+    def delete_by_code_prefix(self, cursor, prefix: str, user_id: typing.Optional[int] = None) -> int:
+        # Bulk removal (e.g. benchmark rows) inside the caller's transaction,
+        # keeping item_holdings in step like delete_item does
+        where = "SUBSTR(code, 1, %s) = %s"
+        params = [len(prefix), prefix]
+        if user_id is not None:
+            where += " AND user_id=%s"
+            params.append(user_id)
+        cursor.execute(f"SELECT name, user_id, quantity FROM inventory WHERE {where} FOR UPDATE", params)
+        adjustments = {}
+        for row in cursor.fetchall():
+            add_holding(adjustments, row['name'], row['user_id'], -row['quantity'], -1)
+        cursor.execute(f"DELETE FROM inventory WHERE {where}", params)
+        deleted = cursor.rowcount
+        self._adjust_holdings(cursor, adjustments)
+        return deleted
+
+    def applied_mutation_keys(self, cursor, keys: list) -> set:
+        applied = set()
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            cursor.execute(f"SELECT mutation_key FROM applied_mutations WHERE mutation_key IN ({', '.join(['%s'] * len(chunk))})", chunk)
+            applied.update(row['mutation_key'] for row in cursor.fetchall())
+        return applied
+
+    def record_mutation_keys(self, cursor, keys: list):
+        if keys:
+            now = datetime.now().replace(microsecond=0)
+            cursor.executemany("INSERT INTO applied_mutations (mutation_key, applied_at) VALUES (%s, %s)",
+                               [(key, now) for key in keys])
+
+    def prune_applied_mutations(self, before: datetime) -> int:
+        try:
+            with self.pool.cursor(commit=True, name="inventory.prune_applied_mutations") as cursor:
+                cursor.execute("DELETE FROM applied_mutations WHERE applied_at < %s", (before,))
+                return cursor.rowcount
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return 0
+
+    def _stock_on_hand(self, cursor, user_id: int, at: datetime,
+                       name: typing.Optional[str] = None) -> typing.Tuple[typing.Optional[datetime], dict]:
+        # Nearest snapshot at or before `at`, plus the movements after it; returns (snapshot time, {name: quantity})
+        cursor.execute("SELECT MAX(taken_at) AS taken_at FROM stock_checkpoints WHERE user_id=%s AND taken_at <= %s",
+                       (user_id, at))
+        base = cursor.fetchone()['taken_at']
+        movements = "SELECT name, delta AS quantity FROM stock_movements WHERE user_id=%s AND moved_at <= %s"
+        params = [user_id, at]
+        if base is not None:
+            movements += " AND moved_at > %s"
+            params.append(base)
+        if name is not None:
+            movements += " AND name=%s"
+            params.append(name)
+        query = movements
+        if base is not None:
+            snapshot = "SELECT name, quantity FROM stock_snapshots WHERE user_id=%s AND taken_at=%s"
+            snapshot_params = [user_id, base]
+            if name is not None:
+                snapshot += " AND name=%s"
+                snapshot_params.append(name)
+            query = f"{snapshot} UNION ALL {movements}"
+            params = snapshot_params + params
+        cursor.execute(f"SELECT name, SUM(quantity) AS quantity FROM ({query}) ledger GROUP BY name", params)
+        return base, {row['name']: int(row['quantity']) for row in cursor.fetchall() if row['quantity']}
+
+    def load_stock_on_hand(self, user_id: int, at: datetime,
+                           name: typing.Optional[str] = None) -> typing.Tuple[typing.Optional[datetime], dict]:
         try:
-            self.cursor.execute("SELECT * FROM inventory WHERE user_id=%s", (user_id,))
-            return self.cursor.fetchall()
+            with self.pool.cursor(name="inventory.load_stock_on_hand") as cursor:
+                return self._stock_on_hand(cursor, user_id, at, name)
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return None, {}
+
+    def load_stock_movement_totals(self, user_id: int, start: datetime, end: datetime,
+                                   name: typing.Optional[str] = None) -> list:
+        # Per item name over (start, end]: receipts, consumption (quantity cut on an existing
+        # item), write-offs (deletes) and the net of everything including renames
+        query = """
+            SELECT name,
+                   SUM(CASE WHEN kind = 'in' OR (kind = 'adjust' AND delta > 0) THEN delta ELSE 0 END) AS received,
+                   SUM(CASE WHEN kind = 'adjust' AND delta < 0 THEN -delta ELSE 0 END) AS consumed,
+                   SUM(CASE WHEN kind = 'out' THEN -delta ELSE 0 END) AS removed,
+                   SUM(delta) AS net
+            FROM stock_movements
+            WHERE user_id = %s AND moved_at > %s AND moved_at <= %s
+        """
+        params = [user_id, start, end]
+        if name is not None:
+            query += " AND name = %s"
+            params.append(name)
+        try:
+            with self.pool.cursor(name="inventory.load_stock_movement_totals") as cursor:
+                cursor.execute(query + " GROUP BY name", params)
+                return cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+
+    def load_checkpoint_due(self, before: datetime) -> list:
+        # Users whose latest stock snapshot is older than `before`, or who have none yet
+        try:
+            with self.pool.cursor(name="inventory.load_checkpoint_due") as cursor:
+                cursor.execute("""
+                    SELECT u.id AS user_id
+                    FROM users u
+                    LEFT JOIN stock_checkpoints c ON c.user_id = u.id
+                    GROUP BY u.id
+                    HAVING MAX(c.taken_at) IS NULL OR MAX(c.taken_at) <= %s
+                """, (before,))
+                return [row['user_id'] for row in cursor.fetchall()]
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+
+    def create_stock_checkpoint(self, user_id: int, taken_at: datetime, min_interval: timedelta) -> typing.Optional[int]:
+        # Returns the number of item names snapshotted, or None when skipped: another
+        # terminal took a snapshot within min_interval, or nothing has moved since the last one
+        try:
+            with self.pool.cursor(commit=True, name="inventory.create_stock_checkpoint") as cursor:
+                # Serialises terminals checkpointing the same user
+                cursor.execute("SELECT id FROM users WHERE id=%s FOR UPDATE", (user_id,))
+                cursor.execute("SELECT 1 AS recent FROM stock_checkpoints WHERE user_id=%s AND taken_at > %s LIMIT 1",
+                               (user_id, taken_at - min_interval))
+                if cursor.fetchone() is not None:
+                    return None
+                cursor.execute("SELECT MAX(taken_at) AS taken_at FROM stock_checkpoints WHERE user_id=%s", (user_id,))
+                last = cursor.fetchone()['taken_at']
+                if last is not None:
+                    cursor.execute("SELECT 1 AS moved FROM stock_movements WHERE user_id=%s AND moved_at > %s AND moved_at <= %s LIMIT 1",
+                                   (user_id, last, taken_at))
+                    if cursor.fetchone() is None:
+                        return None
+                _, on_hand = self._stock_on_hand(cursor, user_id, taken_at)
+                cursor.executemany("INSERT INTO stock_snapshots (user_id, taken_at, name, quantity) VALUES (%s, %s, %s, %s)",
+                                   [(user_id, taken_at, name, quantity) for name, quantity in on_hand.items()])
+                cursor.execute("INSERT INTO stock_checkpoints (user_id, taken_at) VALUES (%s, %s)", (user_id, taken_at))
+                return len(on_hand)
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return None
+
+    def _adjust_holdings(self, cursor, adjustments: dict):
+        # Keeps item_holdings in step with inventory inside the caller's transaction
+        changes = [(name, user_id, quantity, count) for (name, user_id), (quantity, count) in adjustments.items()
+                   if quantity or count]
+        if not changes:
+            return
+        cursor.executemany(
+            "INSERT INTO item_holdings (name, user_id, total_quantity, item_count) VALUES (%s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE total_quantity = total_quantity + VALUES(total_quantity), item_count = item_count + VALUES(item_count)",
+            changes
+        )
+        emptied = [(name, user_id) for name, user_id, _, count in changes if count < 0]
+        if emptied:
+            cursor.executemany("DELETE FROM item_holdings WHERE name=%s AND user_id=%s AND item_count <= 0", emptied)
+
+    def load_item_names(self) -> list:
+        try:
+            with self.pool.cursor(name="inventory.load_item_names") as cursor:
+                cursor.execute("SELECT name, SUM(item_count) AS items FROM item_holdings GROUP BY name")
+                return cursor.fetchall()
         except mysql.connector.Error as err:
             print(f"Error: {err}")
             return []
 
     def load_top_users_for_item(self, item_name: str) -> list:
         try:
-            self.cursor.execute("""
-                SELECT u.username, SUM(i.quantity) as total_quantity
-                FROM inventory i
-                JOIN users u ON i.user_id = u.id
-                WHERE i.name = %s
-                GROUP BY u.username
-                ORDER BY total_quantity DESC
-                LIMIT 5
-            """, (item_name,))
-            return self.cursor.fetchall()
+            with self.pool.cursor(name="inventory.load_top_users_for_item") as cursor:
+                cursor.execute("""
+                    SELECT u.username, h.total_quantity
+                    FROM item_holdings h
+                    JOIN users u ON h.user_id = u.id
+                    WHERE h.name = %s
+                    ORDER BY h.total_quantity DESC
+                    LIMIT 5
+                """, (item_name,))
+                return cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+
+    def load_top_users_for_item_raw(self, item_name: str) -> list:
+        try:
+            with self.pool.cursor(name="inventory.load_top_users_for_item_raw") as cursor:
+                cursor.execute("""
+                    SELECT u.username, SUM(i.quantity) as total_quantity
+                    FROM inventory i
+                    JOIN users u ON i.user_id = u.id
+                    WHERE i.name = %s
+                    GROUP BY u.username
+                    ORDER BY total_quantity DESC
+                    LIMIT 5
+                """, (item_name,))
+                return cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+
+    def _scope(self, user_id: typing.Optional[int], column: str = "user_id") -> typing.Tuple[str, list]:
+        if user_id is None:
+            return "", []
+        return f"WHERE {column}=%s", [user_id]
+
+    def load_valuation(self, user_id: typing.Optional[int] = None) -> dict:
+        where, params = self._scope(user_id)
+        try:
+            with self.pool.cursor(name="inventory.load_valuation") as cursor:
+                cursor.execute(f"""
+                    SELECT COUNT(*) AS items, COALESCE(SUM(quantity), 0) AS total_quantity,
+                           COALESCE(SUM(quantity * price), 0) AS total_value, COALESCE(SUM(flag), 0) AS flagged
+                    FROM inventory {where}
+                """, params)
+                return cursor.fetchone()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return None
+
+    def load_expiry_buckets(self, now: datetime, bounds: typing.Sequence[datetime], user_id: typing.Optional[int] = None) -> list:
+        # Bucket 0 is already expired, bucket n is "before bounds[n - 1]", the last one everything later
+        where, params = self._scope(user_id)
+        cases = " ".join(f"WHEN expiry_date < %s THEN {number}" for number in range(len(bounds) + 1))
+        try:
+            with self.pool.cursor(name="inventory.load_expiry_buckets") as cursor:
+                cursor.execute(f"""
+                    SELECT CASE {cases} ELSE {len(bounds) + 1} END AS bucket, COUNT(*) AS items,
+                           SUM(quantity) AS total_quantity, SUM(quantity * price) AS total_value
+                    FROM inventory {where}
+                    GROUP BY bucket
+                    ORDER BY bucket
+                """, [now, *bounds] + params)
+                return cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+
+    def load_user_totals_page(self, after: typing.Optional[int] = None, limit: int = 50) -> list:
+        # Keyset-paged per-user totals: the inner GROUP BY walks idx_inventory_user in
+        # user_id order and stops after `limit` users, whatever the table size
+        where, params = ("WHERE user_id > %s", [after]) if after is not None else ("", [])
+        try:
+            with self.pool.cursor(name="inventory.load_user_totals_page") as cursor:
+                cursor.execute(f"""
+                    SELECT t.user_id, u.username, u.role, t.items, t.total_quantity, t.total_value, t.flagged
+                    FROM (
+                        SELECT user_id, COUNT(*) AS items, SUM(quantity) AS total_quantity,
+                               SUM(quantity * price) AS total_value, SUM(flag) AS flagged
+                        FROM inventory
+                        {where}
+                        GROUP BY user_id
+                        ORDER BY user_id
+                        LIMIT %s
+                    ) t
+                    JOIN users u ON u.id = t.user_id
+                    ORDER BY t.user_id
+                """, params + [limit])
+                return cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+
+    def load_item_totals_page(self, after: typing.Optional[str] = None, limit: int = 50) -> list:
+        # Per item name from item_holdings, grouped in primary key (name, user_id) order
+        clauses, params = ["item_count > 0"], []
+        if after is not None:
+            clauses.append("name > %s")
+            params.append(after)
+        try:
+            with self.pool.cursor(name="inventory.load_item_totals_page") as cursor:
+                cursor.execute(f"""
+                    SELECT name, COUNT(*) AS holders, SUM(item_count) AS items, SUM(total_quantity) AS total_quantity
+                    FROM item_holdings
+                    WHERE {' AND '.join(clauses)}
+                    GROUP BY name
+                    ORDER BY name
+                    LIMIT %s
+                """, params + [limit])
+                return cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+
+    def load_item_holders_page(self, name: str, after: typing.Optional[int] = None, limit: int = 50) -> list:
+        params = [name]
+        query = """
+            SELECT h.user_id, u.username, u.role, h.item_count AS items, h.total_quantity
+            FROM item_holdings h
+            JOIN users u ON u.id = h.user_id
+            WHERE h.name = %s AND h.item_count > 0
+        """
+        if after is not None:
+            query += " AND h.user_id > %s"
+            params.append(after)
+        try:
+            with self.pool.cursor(name="inventory.load_item_holders_page") as cursor:
+                cursor.execute(query + " ORDER BY h.user_id LIMIT %s", params + [limit])
+                return cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+
+    def next_expiry(self, on_or_after: datetime) -> typing.Optional[datetime]:
+        # One seek on idx_inventory_expiry; lets the monthly view skip empty stretches
+        try:
+            with self.pool.cursor(name="inventory.next_expiry") as cursor:
+                cursor.execute("SELECT expiry_date FROM inventory WHERE expiry_date >= %s ORDER BY expiry_date LIMIT 1",
+                               (on_or_after,))
+                row = cursor.fetchone()
+                return row['expiry_date'] if row else None
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return None
+
+    def load_expiry_range_totals(self, bounds: typing.Sequence[datetime]) -> list:
+        # Totals for [bounds[0], bounds[1]), [bounds[1], bounds[2]), ...; only that range of idx_inventory_expiry is read
+        cases = " ".join(f"WHEN expiry_date < %s THEN {number}" for number in range(len(bounds) - 1))
+        try:
+            with self.pool.cursor(name="inventory.load_expiry_range_totals") as cursor:
+                cursor.execute(f"""
+                    SELECT CASE {cases} END AS bucket, COUNT(*) AS items,
+                           SUM(quantity) AS total_quantity, SUM(quantity * price) AS total_value
+                    FROM inventory
+                    WHERE expiry_date >= %s AND expiry_date < %s
+                    GROUP BY bucket
+                    ORDER BY bucket
+                """, [*bounds[1:], bounds[0], bounds[-1]])
+                return cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+
+    def load_totals_by_user(self, limit: int = 20) -> list:
+        try:
+            with self.pool.cursor(name="inventory.load_totals_by_user") as cursor:
+                cursor.execute("""
+                    SELECT u.id AS user_id, u.username, u.role, t.items, t.total_quantity, t.total_value
+                    FROM (
+                        SELECT user_id, COUNT(*) AS items, SUM(quantity) AS total_quantity, SUM(quantity * price) AS total_value
+                        FROM inventory
+                        GROUP BY user_id
+                    ) t
+                    JOIN users u ON u.id = t.user_id
+                    ORDER BY t.total_value DESC
+                    LIMIT %s
+                """, (limit,))
+                return cursor.fetchall()
         except mysql.connector.Error as err:
             print(f"Error: {err}")
             return []
+
+    def load_totals_by_role(self) -> list:
+        try:
+            with self.pool.cursor(name="inventory.load_totals_by_role") as cursor:
+                cursor.execute("""
+                    SELECT u.role, COUNT(*) AS users, SUM(t.items) AS items,
+                           SUM(t.total_quantity) AS total_quantity, SUM(t.total_value) AS total_value
+                    FROM (
+                        SELECT user_id, COUNT(*) AS items, SUM(quantity) AS total_quantity, SUM(quantity * price) AS total_value
+                        FROM inventory
+                        GROUP BY user_id
+                    ) t
+                    JOIN users u ON u.id = t.user_id
+                    GROUP BY u.role
+                    ORDER BY total_value DESC
+                """)
+                return cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+
+    def load_low_stock(self, threshold: int, user_id: typing.Optional[int] = None, limit: int = 50) -> list:
+        # Per item name and holder, from the item_holdings aggregate rather than the inventory rows
+        params = [threshold]
+        query = """
+            SELECT h.name, h.user_id, u.username, h.total_quantity, h.item_count
+            FROM item_holdings h
+            JOIN users u ON u.id = h.user_id
+            WHERE h.total_quantity <= %s
+        """
+        if user_id is not None:
+            query += " AND h.user_id = %s"
+            params.append(user_id)
+        try:
+            with self.pool.cursor(name="inventory.load_low_stock") as cursor:
+                cursor.execute(query + " ORDER BY h.total_quantity, h.name LIMIT %s", params + [limit])
+                return cursor.fetchall()
+        except mysql.connector.Error as err:
+            print(f"Error: {err}")
+            return []
+
+    def rebuild_item_holdings(self) -> int:
+        # Same steps as migration 3, so this also creates the table on a database that predates it
+        with self.pool.cursor(commit=True, name="inventory.rebuild_item_holdings") as cursor:
+            create_item_holdings(cursor)
+            return cursor.rowcount
+
+    def check_item_holdings(self) -> list:
+        with self.pool.cursor(name="inventory.check_item_holdings") as cursor:
+            cursor.execute("""
+                SELECT r.name, r.user_id, r.total_quantity AS expected, h.total_quantity AS actual
+                FROM (
+                    SELECT name, user_id, SUM(quantity) AS total_quantity, COUNT(*) AS item_count
+                    FROM inventory
+                    GROUP BY name, user_id
+                ) r
+                LEFT JOIN item_holdings h ON h.name = r.name AND h.user_id = r.user_id
+                WHERE h.name IS NULL OR h.total_quantity <> r.total_quantity OR h.item_count <> r.item_count
+                UNION ALL
+                SELECT h.name, h.user_id, NULL AS expected, h.total_quantity AS actual
+                FROM item_holdings h
+                WHERE NOT EXISTS (SELECT 1 FROM inventory i WHERE i.name = h.name AND i.user_id = h.user_id)
+            """)
+            return cursor.fetchall()
@@ -0,0 +1,244 @@
+import csv
+import json
+import os
+import struct
+import sys
+import typing
+from array import array
+from datetime import datetime, timedelta
+from records import EPOCH, INVENTORY_COLUMNS, InventoryBatch
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+EXPORT_FORMATS = ("csv", "jsonl", "col")
+
+# Columnar file layout: MAGIC, a JSON schema line, then one row group per
+# chunk (little-endian): <I row count>, and for every column <I byte length>
+# followed by the raw array; string columns are an array of end offsets
+# ('I') followed by the UTF-8 bytes they index.
+MAGIC = b"EMITICOL1\n"
+COLUMN_TYPES = (
+    ("id", "q"),
+    ("user_id", "q"),
+    ("name", "str"),
+    ("quantity", "q"),
+    ("price_cents", "q"),
+    ("code", "str"),
+    ("expiry_date", "d"),
+    ("created_at", "d"),
+    ("flag", "b"),
+)
+
+
+class ExportResult:
+    def __init__(self):
+        self.rows = 0
+        self.files = []
+
+    def __repr__(self):
+        return f"ExportResult(rows={self.rows}, files={len(self.files)})"
+
+
+def format_price(cents: int) -> str:
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+def format_date(seconds: float) -> str:
+    return (EPOCH + timedelta(seconds=seconds)).strftime(DATE_FORMAT)
+
+
+def text_rows(batch: InventoryBatch) -> typing.Iterator[tuple]:
+    # Rows in INVENTORY_COLUMNS order with dates in the format the importer reads back.
+    # Expiry dates repeat heavily within a chunk, so each is only formatted once.
+    expiry_dates = {}
+    for values in zip(batch.id, batch.user_id, batch.name, batch.quantity, batch.price_cents,
+                      batch.code, batch.expiry_date, batch.created_at, batch.flag):
+        item_id, user_id, name, quantity, cents, code, expiry_date, created_at, flag = values
+        expiry_text = expiry_dates.get(expiry_date)
+        if expiry_text is None:
+            expiry_text = expiry_dates[expiry_date] = format_date(expiry_date)
+        yield (item_id, user_id, name, quantity, format_price(cents), code,
+               expiry_text, format_date(created_at), flag)
+
+
+class CSVExportWriter:
+    def __init__(self, f):
+        self.writer = csv.writer(f)
+        self.writer.writerow(INVENTORY_COLUMNS)
+
+    def write_batch(self, batch: InventoryBatch):
+        self.writer.writerows(text_rows(batch))
+
+
+class JSONLExportWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def write_batch(self, batch: InventoryBatch):
+        lines = []
+        for row in text_rows(batch):
+            row = dict(zip(INVENTORY_COLUMNS, row))
+            row['price'] = float(row['price'])
+            lines.append(json.dumps(row))
+        self.f.write("\n".join(lines) + "\n")
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class ColumnarExportWriter:
+    def __init__(self, f):
+        self.f = f
+        f.write(MAGIC)
+        f.write(json.dumps({"columns": COLUMN_TYPES}).encode() + b"\n")
+
+    def write_batch(self, batch: InventoryBatch):
+        self.f.write(struct.pack("<I", len(batch)))
+        for column, typecode in COLUMN_TYPES:
+            values = getattr(batch, column)
+            if typecode == "str":
+                encoded = [value.encode() for value in values]
+                offsets = array('I')
+                end = 0
+                for value in encoded:
+                    end += len(value)
+                    offsets.append(end)
+                payload = _little_endian(offsets) + b"".join(encoded)
+            else:
+                payload = _little_endian(values)
+            self.f.write(struct.pack("<I", len(payload)))
+            self.f.write(payload)
+
+
+WRITERS = {
+    "csv": (CSVExportWriter, "w"),
+    "jsonl": (JSONLExportWriter, "w"),
+    "col": (ColumnarExportWriter, "wb"),
+}
+
+
+def export_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    if extension == "ndjson":
+        return "jsonl"
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {path}")
+    return extension
+
+
+def part_path(path: str, part: int) -> str:
+    root, extension = os.path.splitext(path)
+    return f"{root}-{part:05d}{extension}"
+
+
+def _open_temporary(target: str, mode: str):
+    if mode == "wb":
+        return open(target + ".tmp", mode)
+    return open(target + ".tmp", mode, newline="", encoding="utf-8")
+
+
+def export_inventory(inventory_mgmt, path: str, user_id: typing.Optional[int] = None, fmt: typing.Optional[str] = None,
+                     chunk_size: int = 10000, rows_per_file: typing.Optional[int] = None,
+                     expires_before: typing.Optional[datetime] = None, expires_after: typing.Optional[datetime] = None,
+                     flag: typing.Optional[bool] = None) -> ExportResult:
+    # Streams one user's inventory (or everyone's when user_id is None) chunk by
+    # chunk from an unbuffered cursor, so memory stays flat however many rows
+    # there are. With rows_per_file, output rolls over to path-00001.ext,
+    # path-00002.ext, ... Each file is written under a temporary name and
+    # moved into place when complete. A database error part way raises, and
+    # removes the temporary file and any parts already written by this run.
+    fmt = fmt or export_format(path)
+    if fmt not in WRITERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if rows_per_file is not None:
+        chunk_size = min(chunk_size, rows_per_file)
+    writer_class, mode = WRITERS[fmt]
+    result = ExportResult()
+    f = None
+    writer = None
+    target = None
+    in_file = 0
+    complete = False
+    try:
+        batches = inventory_mgmt.iter_inventory(user_id, form="columns", batch_size=chunk_size, raise_errors=True,
+                                                expires_before=expires_before, expires_after=expires_after, flag=flag)
+        for batch in batches:
+            start = 0
+            while start < len(batch):
+                if writer is not None and rows_per_file is not None and in_file >= rows_per_file:
+                    f.close()
+                    os.replace(target + ".tmp", target)
+                    f = None
+                    writer = None
+                if writer is None:
+                    target = path if rows_per_file is None else part_path(path, len(result.files) + 1)
+                    f = _open_temporary(target, mode)
+                    writer = writer_class(f)
+                    result.files.append(target)
+                    in_file = 0
+                # A chunk that straddles a file boundary is split there
+                stop = len(batch) if rows_per_file is None else min(len(batch), start + rows_per_file - in_file)
+                writer.write_batch(batch if start == 0 and stop == len(batch) else batch.slice(start, stop))
+                in_file += stop - start
+                result.rows += stop - start
+                start = stop
+        if writer is None:
+            # Nothing matched: still leave a (header-only) file behind for the nightly job
+            target = path if rows_per_file is None else part_path(path, 1)
+            f = _open_temporary(target, mode)
+            writer_class(f)
+            result.files.append(target)
+        f.close()
+        os.replace(target + ".tmp", target)
+        f = None
+        complete = True
+    finally:
+        if f is not None:
+            f.close()
+            os.remove(target + ".tmp")
+        if not complete:
+            for written in result.files:
+                if written != target and os.path.exists(written):
+                    os.remove(written)
+    return result
+
+
+def _from_little_endian(typecode: str, payload: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(payload)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def read_columnar(path: str) -> typing.Iterator[InventoryBatch]:
+    # Yields the row groups of a columnar export back as InventoryBatch objects
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a columnar inventory export: {path}")
+        columns = [tuple(column) for column in json.loads(f.readline())["columns"]]
+        while True:
+            header = f.read(4)
+            if not header:
+                return
+            rows, = struct.unpack("<I", header)
+            batch = InventoryBatch()
+            for column, typecode in columns:
+                size, = struct.unpack("<I", f.read(4))
+                payload = f.read(size)
+                if typecode == "str":
+                    split = rows * array('I').itemsize
+                    offsets = _from_little_endian("I", payload[:split])
+                    data = payload[split:]
+                    start = 0
+                    values = []
+                    for end in offsets:
+                        values.append(data[start:end].decode())
+                        start = end
+                else:
+                    values = _from_little_endian(typecode, payload)
+                setattr(batch, column, values)
+            yield batch
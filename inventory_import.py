@@ -0,0 +1,89 @@
+import csv
+import json
+import typing
+from datetime import datetime
+
+FIELDS = ("name", "quantity", "price", "code", "expiry_date", "flag")
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d")
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.errors = []
+
+    def add_error(self, line: int, message: str):
+        self.errors.append((line, message))
+
+    def __repr__(self):
+        return f"ImportResult(inserted={self.inserted}, errors={len(self.errors)})"
+
+
+def parse_expiry_date(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"invalid expiry_date {value!r}")
+
+
+def parse_flag(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    return str(value).strip().lower() in ("1", "true", "yes", "y")
+
+
+def validate_row(row: dict) -> dict:
+    for field in ("name", "quantity", "price", "code", "expiry_date"):
+        if row.get(field) in (None, ""):
+            raise ValueError(f"missing {field}")
+    try:
+        quantity = int(row["quantity"])
+    except (TypeError, ValueError):
+        raise ValueError(f"quantity must be an integer, got {row['quantity']!r}")
+    try:
+        price = float(row["price"])
+    except (TypeError, ValueError):
+        raise ValueError(f"price must be a number, got {row['price']!r}")
+    if quantity < 0 or price < 0:
+        raise ValueError("quantity and price must not be negative")
+    return {
+        "name": str(row["name"]).strip(),
+        "quantity": quantity,
+        "price": price,
+        "code": str(row["code"]).strip(),
+        "expiry_date": parse_expiry_date(row["expiry_date"]),
+        "flag": parse_flag(row.get("flag")),
+    }
+
+
+def read_csv(path: str) -> typing.Iterator[typing.Tuple[int, dict]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def read_jsonl(path: str) -> typing.Iterator[typing.Tuple[int, typing.Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as err:
+                yield line_no, err
+
+
+def read_rows(path: str) -> typing.Iterator[typing.Tuple[int, typing.Any]]:
+    if path.endswith(".jsonl") or path.endswith(".ndjson"):
+        return read_jsonl(path)
+    if path.endswith(".csv"):
+        return read_csv(path)
+    raise ValueError(f"Unsupported import format: {path}")
@@ -1,11 +1,51 @@
+import threading
 import typing
-from datetime import datetime
+import mysql.connector
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from inventory_import import ImportResult, read_rows, validate_row
+from inventory_cache import LRUCache, freeze_rows
+from inventory_reports import LOW_STOCK_THRESHOLD, InventoryReport, build_report, dashboard_rows, expiry_month_page
+from search_index import ItemSearchIndex
+from stock_ledger import SNAPSHOT_INTERVAL, SNAPSHOT_SETTLE, StockHistory, build_stock_history
+from unit_of_work import UnitOfWork
+from write_journal import JournalFlusher, WriteJournal
 
 class InventoryManagement:
-    def __init__(self, db):
+    def __init__(self, db, cache_size: int = 1024, cache_ttl: float = 30.0, code_cache_size: int = 10000,
+                 journal: typing.Optional[WriteJournal] = None):
         self.db = db
+        # With a journal, single-item writes are acknowledged once they are on
+        # local disk and reach the database later through the flusher
+        self.journal = journal
+        self.flusher = JournalFlusher(self, journal) if journal is not None else None
+        self.cache = LRUCache(cache_size, cache_ttl)
+        self.code_cache = LRUCache(code_cache_size, cache_ttl)
+        self.listeners = []
+        self.search_index = None
+        self._search_index_lock = threading.Lock()
+
+    def add_listener(self, listener: typing.Callable[[str, dict, typing.Optional[dict]], None]):
+        # Called as listener(event, item, old) after each successful write;
+        # event is one of "add", "update", "delete" or "flag".
+        self.listeners.append(listener)
+
+    def _notify(self, event: str, item: dict, old: typing.Optional[dict] = None):
+        for listener in self.listeners:
+            listener(event, item, old)
+
+    def _invalidate(self, user_id: typing.Optional[int] = None, *names: str):
+        if user_id is not None:
+            self.cache.invalidate_prefix(("inventory", user_id))
+            # Estate-wide results (user_id None) include every user's rows
+            self.cache.invalidate_prefix(("inventory", None))
+        for name in names:
+            self.cache.invalidate(("top_users", name))
 
     def add_item(self, user_id: int, name: str, quantity: int, price: float, code: str, expiry_date: str, flag: bool = False) -> bool:
+        return self.create_item(user_id, name, quantity, price, code, expiry_date, flag) is not None
+
+    def create_item(self, user_id: int, name: str, quantity: int, price: float, code: str, expiry_date: str, flag: bool = False) -> typing.Optional[dict]:
         item = {
             "user_id": user_id,
             "name": name,
@@ -16,9 +56,75 @@ class InventoryManagement:
             "created_at": datetime.now(),
             "flag": flag
         }
-        return self.db.save_item(item)
+        if self.journal is not None:
+            # No id yet; the row shows up through the change feed once flushed
+            self.journal.append("add", **item)
+            return item
+        if self.db.save_item(item):
+            self._invalidate(user_id, name)
+            # A new lot may now be the first to expire under its code
+            self.code_cache.invalidate((user_id, code))
+            self._notify("add", item)
+            return item
+        return None
+
+    def add_items_bulk(self, user_id: int, rows: typing.Iterable[dict], chunk_size: int = 1000) -> ImportResult:
+        return self._insert_chunked(user_id, enumerate(rows, start=1), chunk_size)
 
-    def update_item(self, item_id: int, name: str, quantity: int, price: float, code: str, expiry_date: str) -> bool:
+    def import_file(self, user_id: int, path: str, chunk_size: int = 1000) -> ImportResult:
+        return self._insert_chunked(user_id, read_rows(path), chunk_size)
+
+    def _insert_chunked(self, user_id: int, numbered_rows, chunk_size: int) -> ImportResult:
+        result = ImportResult()
+        chunk = []
+        for line, row in numbered_rows:
+            if isinstance(row, Exception):
+                result.add_error(line, str(row))
+                continue
+            if not isinstance(row, dict):
+                result.add_error(line, "row must be an object")
+                continue
+            try:
+                item = validate_row(row)
+            except ValueError as err:
+                result.add_error(line, str(err))
+                continue
+            item["user_id"] = user_id
+            item["created_at"] = datetime.now()
+            chunk.append((line, item))
+            if len(chunk) >= chunk_size:
+                self._flush_chunk(chunk, result)
+                chunk = []
+        if chunk:
+            self._flush_chunk(chunk, result)
+        return result
+
+    def _flush_chunk(self, chunk: list, result: ImportResult):
+        saved = [item for _, item in chunk]
+        try:
+            result.inserted += self.db.save_items(saved)
+        except mysql.connector.Error:
+            # The chunk was rolled back; retry row by row to pinpoint the bad lines
+            saved = []
+            for line, item in chunk:
+                if self.db.save_item(item):
+                    result.inserted += 1
+                    saved.append(item)
+                else:
+                    result.add_error(line, "rejected by database")
+        self._invalidate(chunk[0][1]['user_id'], *{item['name'] for _, item in chunk})
+        for item in saved:
+            self.code_cache.invalidate((item['user_id'], item['code']))
+            self._notify("add", item)
+
+    def update_item(self, item_id: int, name: str, quantity: int, price: float, code: str, expiry_date: str,
+                    expected: typing.Optional[dict] = None) -> bool:
+        # expected holds fields as the editor last saw them; a journalled update
+        # that finds the item changed since is reported as a conflict instead
+        if self.journal is not None:
+            self.journal.append("update", item_id=item_id, name=name, quantity=quantity, price=price, code=code,
+                                expiry_date=expiry_date, expected=expected)
+            return True
         item = {
             "id": item_id,
             "name": name,
@@ -27,16 +133,236 @@ class InventoryManagement:
             "code": code,
             "expiry_date": expiry_date
         }
-        return self.db.update_item(item)
+        old = self.db.get_item(item_id)
+        if not self.db.update_item(item):
+            return False
+        if old:
+            self._invalidate(old['user_id'], old['name'], name)
+            self.code_cache.invalidate((old['user_id'], old['code']))
+            self.code_cache.invalidate((old['user_id'], code))
+            self._notify("update", dict(old, **item), old)
+        return True
 
-    def delete_item(self, item_id: int) -> bool:
-        return self.db.delete_item(item_id)
+    def delete_item(self, item_id: int, expected: typing.Optional[dict] = None) -> bool:
+        if self.journal is not None:
+            self.journal.append("delete", item_id=item_id, expected=expected)
+            return True
+        old = self.db.get_item(item_id)
+        if not self.db.delete_item(item_id):
+            return False
+        if old:
+            self._invalidate(old['user_id'], old['name'])
+            self.code_cache.invalidate((old['user_id'], old['code']))
+            self._notify("delete", old)
+        return True
 
     def flag_item(self, item_id: int) -> bool:
-        return self.db.flag_item(item_id)
+        if self.journal is not None:
+            self.journal.append("flag", item_id=item_id)
+            return True
+        old = self.db.get_item(item_id)
+        if not self.db.flag_item(item_id):
+            return False
+        if old:
+            self._invalidate(old['user_id'])
+            self.code_cache.invalidate((old['user_id'], old['code']))
+            self._notify("flag", dict(old, flag=1), old)
+        return True
+
+    def flag_items(self, items: typing.List[dict], expiring_before: typing.Optional[datetime] = None) -> int:
+        flagged = self.db.flag_items([item['id'] for item in items], expiring_before)
+        for user_id in {item['user_id'] for item in items}:
+            self._invalidate(user_id)
+        if flagged:
+            self.code_cache.clear()
+        return flagged
+
+    def flag_expiring(self, before: datetime) -> int:
+        flagged = self.db.flag_expiring(before)
+        if flagged:
+            self.cache.invalidate_prefix(("inventory",))
+            self.code_cache.clear()
+        return flagged
+
+    @contextmanager
+    def batch(self, flush_size: int = 500) -> typing.Iterator[UnitOfWork]:
+        # with inventory_mgmt.batch() as batch: batch.set_quantity(...) -- one commit for the lot.
+        # Caches and listeners only hear about the batch once it has committed.
+        with self.db.transaction() as cursor:
+            work = UnitOfWork(self.db, cursor, flush_size)
+            yield work
+            work.flush()
+        for item in work.inserted:
+            self._invalidate(item['user_id'], item['name'])
+            self.code_cache.invalidate((item['user_id'], item['code']))
+            self._notify("add", item)
+        for event, item, old in work.changed_rows():
+            before = old or item
+            self._invalidate(before['user_id'], before['name'], item['name'])
+            self.code_cache.invalidate((before['user_id'], before['code']))
+            self.code_cache.invalidate((item['user_id'], item['code']))
+            self._notify(event, item, old)
+
+    def find_by_code(self, code: str, user_id: int) -> typing.Optional[typing.Mapping]:
+        # Codes are per user and may cover several lots; this is the lot that expires first
+        item = self.code_cache.get((user_id, code))
+        if item is None:
+            generation = self.code_cache.generation
+            row = self.db.find_by_code(code, user_id)
+            if row is None:
+                return None
+            item = freeze_rows([row])[0]
+            self.code_cache.set((user_id, code), item, generation)
+        return item
+
+    def adjust_quantity_by_code(self, code: str, delta: int, user_id: typing.Optional[int] = None) -> typing.Optional[typing.Mapping]:
+        return self.adjust_quantities_by_code({code: delta}, user_id).get(code)
+
+    def adjust_quantities_by_code(self, deltas: typing.Dict[str, int], user_id: typing.Optional[int] = None) -> typing.Dict[str, typing.Mapping]:
+        old_rows, new_rows = self.db.adjust_quantities_by_code(deltas, user_id)
+        adjusted = {}
+        for old, new in zip(old_rows, new_rows):
+            self._invalidate(old['user_id'], old['name'])
+            item = freeze_rows([new])[0]
+            self.code_cache.set((new['user_id'], new['code']), item)
+            adjusted[new['code']] = item
+            self._notify("update", new, old)
+        return adjusted
+
+    def get_expiry_schedule(self, before: datetime, limit: int = 10000) -> typing.List[dict]:
+        return self.db.load_expiry_schedule(before, limit)
+
+    def get_expiring(self, user_id: int, days: int, limit: int = 100, after: typing.Optional[tuple] = None) -> typing.Sequence[typing.Mapping]:
+        now = datetime.now()
+        return self.get_inventory_page(user_id, sort_key="expiry_date", after=after, limit=limit,
+                                       expires_after=now.replace(microsecond=0),
+                                       expires_before=now.replace(microsecond=0) + timedelta(days=days))
+
+    def _shared(self, rows, form: str):
+        # Cached results are handed to every caller: dicts are frozen, records
+        # and columns are returned as they are and must not be modified
+        if form == "dict":
+            return freeze_rows(rows)
+        if form == "record":
+            return tuple(rows)
+        return rows
+
+    def _cached(self, key: tuple, load: typing.Callable[[], typing.Any]):
+        # The database layer reports errors and returns an empty result; that
+        # result is handed back but not cached, so the next read tries again.
+        # Nor is a result that a write invalidated while it was loading
+        value = self.cache.get(key)
+        if value is None:
+            generation = self.cache.generation
+            failures = self.db.pool.failures()
+            value = load()
+            if self.db.pool.failures() == failures:
+                self.cache.set(key, value, generation)
+        return value
+
+    def get_inventory(self, user_id: int, form: str = "dict"):
+        return self._cached(("inventory", user_id, form), lambda: self._shared(self.db.load_inventory(user_id, form), form))
+
+    def get_inventory_page(self, user_id: int, sort_key: str = "id", after: typing.Optional[tuple] = None,
+                           limit: int = 100, descending: bool = False, form: str = "dict", **filters):
+        key = ("inventory", user_id, "page", sort_key, after, limit, descending, form, tuple(sorted(filters.items())))
+        return self._cached(key, lambda: self._shared(
+            self.db.load_inventory_page(user_id, sort_key, after, limit, descending, form, **filters), form))
+
+    def iter_inventory(self, user_id: int, sort_key: str = "id", descending: bool = False, form: str = "dict",
+                       batch_size: int = 1000, raise_errors: bool = False, **filters) -> typing.Iterator:
+        return self.db.iter_inventory(user_id, sort_key, descending, form, batch_size, raise_errors, **filters)
+
+    def get_top_users_for_item(self, item_name: str) -> typing.Sequence[typing.Mapping]:
+        return self._cached(("top_users", item_name), lambda: freeze_rows(self.db.load_top_users_for_item(item_name)))
+
+    def get_report(self, user_id: typing.Optional[int] = None, low_stock_threshold: int = LOW_STOCK_THRESHOLD) -> InventoryReport:
+        return self._cached(("inventory", user_id, "report", low_stock_threshold),
+                            lambda: build_report(self.db, user_id, low_stock_threshold=low_stock_threshold))
+
+    def _admin_page(self, kind: str, load: typing.Callable[[], list], *args) -> typing.Sequence[typing.Mapping]:
+        # Estate-wide pages for the Admin dashboard, cached under ("inventory", None)
+        # so any inventory write drops them
+        return self._cached(("inventory", None, "admin", kind, *args), lambda: freeze_rows(load()))
+
+    def get_user_totals_page(self, after: typing.Optional[int] = None, limit: int = 50) -> typing.Sequence[typing.Mapping]:
+        return self._admin_page("users", lambda: dashboard_rows(self.db.load_user_totals_page(after, limit), "user_id"),
+                                after, limit)
+
+    def get_item_totals_page(self, after: typing.Optional[str] = None, limit: int = 50) -> typing.Sequence[typing.Mapping]:
+        return self._admin_page("items", lambda: dashboard_rows(self.db.load_item_totals_page(after, limit), "name"),
+                                after, limit)
+
+    def get_item_holders_page(self, name: str, after: typing.Optional[int] = None,
+                              limit: int = 50) -> typing.Sequence[typing.Mapping]:
+        return self._admin_page("holders", lambda: dashboard_rows(self.db.load_item_holders_page(name, after, limit), "user_id"),
+                                name, after, limit)
+
+    def get_expiry_month_page(self, after: typing.Optional[datetime] = None, limit: int = 12) -> typing.Sequence[typing.Mapping]:
+        return self._admin_page("expiry", lambda: expiry_month_page(self.db, after, limit), after, limit)
+
+    def get_stock_on_hand(self, user_id: int, at: datetime, name: typing.Optional[str] = None) -> typing.Dict[str, int]:
+        # Quantity per item name as it stood at `at`, from the stock movement ledger
+        return self.db.load_stock_on_hand(user_id, at, name)[1]
+
+    def get_stock_history(self, user_id: int, start: datetime, end: typing.Optional[datetime] = None,
+                          name: typing.Optional[str] = None) -> StockHistory:
+        return build_stock_history(self.db, user_id, start, end, name)
+
+    def checkpoint_stock(self, now: typing.Optional[datetime] = None, interval: timedelta = SNAPSHOT_INTERVAL) -> int:
+        # Snapshots every user whose last snapshot is older than interval; returns how many were taken
+        taken_at = (now or datetime.now()) - SNAPSHOT_SETTLE
+        taken = 0
+        for user_id in self.db.load_checkpoint_due(taken_at - interval):
+            if self.db.create_stock_checkpoint(user_id, taken_at, interval) is not None:
+                taken += 1
+        return taken
+
+    def latest_change_id(self) -> int:
+        return self.db.latest_change_id()
+
+    def changes_since(self, watermark: int, user_id: typing.Optional[int] = None, limit: int = 1000,
+                      missing: typing.Sequence[int] = ()) -> typing.List[dict]:
+        # Also how writes from other terminals reach this process's caches
+        changes = self.db.changes_since(watermark, user_id, limit, missing)
+        if changes:
+            for changed_user in {change['user_id'] for change in changes}:
+                self._invalidate(changed_user)
+            self.cache.invalidate_prefix(("top_users",))
+            self.code_cache.clear()
+        for change in changes:
+            if change['item'] is not None:
+                change['item'] = freeze_rows([change['item']])[0]
+        return changes
+
+    def prune_changes(self, before: datetime) -> int:
+        return self.db.prune_changes(before)
+
+    def prune_applied_mutations(self, before: datetime) -> int:
+        # Keys only need to outlive a crash between commit and the journal's done line
+        return self.db.prune_applied_mutations(before)
+
+    def pending_writes(self) -> int:
+        return len(self.journal) if self.journal is not None else 0
+
+    def take_conflicts(self) -> typing.List[typing.Tuple[dict, str]]:
+        # Journalled writes the flusher could not apply, oldest first, each reported once
+        conflicts = []
+        if self.flusher is not None:
+            while self.flusher.conflicts:
+                conflicts.append(self.flusher.conflicts.popleft())
+        return conflicts
 
-    def get_inventory(self, user_id: int) -> typing.List[dict]:
-        return self.db.load_inventory(user_id)
+    def search_item_names(self, query: str, limit: int = 10) -> typing.List[str]:
+        # The index is built on first use and then maintained from the write paths
+        if self.search_index is None:
+            with self._search_index_lock:
+                if self.search_index is None:
+                    index = ItemSearchIndex()
+                    self.add_listener(index.on_change)
+                    index.build((row['name'], int(row['items'])) for row in self.db.load_item_names())
+                    self.search_index = index
+        return self.search_index.search(query, limit)
 
-    def get_top_users_for_item(self, item_name: str) -> typing.List[typing.Tuple[str, int]]:
-        return self.db.load_top_users_for_item(item_name)
+    def cache_stats(self) -> dict:
+        return self.cache.stats()
@@ -0,0 +1,182 @@
+import typing
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Expiry buckets: already expired, then "within N days" for each of these
+BUCKET_DAYS = (30, 90)
+LOW_STOCK_THRESHOLD = 10
+# Counts in dashboard aggregate rows; total_value is money
+DASHBOARD_COUNTS = ("items", "total_quantity", "holders", "flagged")
+
+
+def bucket_labels(days: typing.Sequence[int] = BUCKET_DAYS) -> typing.List[str]:
+    return ["expired"] + [f"under_{count}_days" for count in days] + ["later"]
+
+
+def _number(value):
+    # SUM() comes back as Decimal from MySQL and as int/float from SQLite
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else value
+    return value if value is not None else 0
+
+
+def _money(value) -> Decimal:
+    return Decimal(str(value or 0)).quantize(Decimal("0.01"))
+
+
+def month_start(when: datetime) -> datetime:
+    return when.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(when: datetime) -> datetime:
+    start = month_start(when)
+    return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+
+
+def dashboard_rows(rows: typing.Iterable[dict], key: str) -> typing.List[dict]:
+    # The group column doubles as 'id', the key the dashboard pages and drills down by
+    result = []
+    for row in rows:
+        row = dict(row, id=row[key])
+        for column in DASHBOARD_COUNTS:
+            if column in row:
+                row[column] = _number(row[column])
+        if "total_value" in row:
+            row["total_value"] = _money(row["total_value"])
+        result.append(row)
+    return result
+
+
+def expiry_month_page(db, after: typing.Optional[datetime] = None, limit: int = 12,
+                      now: typing.Optional[datetime] = None) -> typing.List[dict]:
+    # Calendar months with stock expiring in them, from the month after `after`.
+    # A gap of empty months costs one index seek, and each range query reads
+    # only the months it can return, so paging never scans the whole table.
+    now = now or datetime.now()
+    start = next_month(after) if after is not None else datetime.min
+    rows = []
+    while len(rows) < limit:
+        first = db.next_expiry(start)
+        if first is None:
+            break
+        bounds = [month_start(first)]
+        while len(bounds) <= limit - len(rows):
+            bounds.append(next_month(bounds[-1]))
+        totals = {int(row['bucket']): row for row in db.load_expiry_range_totals(bounds)}
+        for number in sorted(totals):
+            row = totals[number]
+            begins, ends = bounds[number], bounds[number + 1]
+            rows.append({
+                "id": begins,
+                "month": begins.strftime("%Y-%m"),
+                "status": "expired" if ends <= now else "expiring" if begins <= now else "",
+                "expires_after": begins,
+                "expires_before": ends,
+                "items": _number(row['items']),
+                "total_quantity": _number(row['total_quantity']),
+                "total_value": _money(row['total_value']),
+            })
+        start = bounds[-1]
+    return rows
+
+
+class InventoryReport:
+    # Every figure is aggregated by the database; only the summary rows come back
+    def __init__(self, user_id: typing.Optional[int], generated_at: datetime):
+        self.user_id = user_id
+        self.generated_at = generated_at
+        self.valuation = {"items": 0, "total_quantity": 0, "total_value": _money(0), "flagged": 0}
+        self.expiry_buckets = []
+        self.by_role = []
+        self.by_user = []
+        self.low_stock = []
+        self.low_stock_threshold = LOW_STOCK_THRESHOLD
+
+    def as_dict(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "generated_at": self.generated_at,
+            "valuation": self.valuation,
+            "expiry_buckets": self.expiry_buckets,
+            "by_role": self.by_role,
+            "by_user": self.by_user,
+            "low_stock_threshold": self.low_stock_threshold,
+            "low_stock": self.low_stock,
+        }
+
+
+def build_report(db, user_id: typing.Optional[int] = None, now: typing.Optional[datetime] = None,
+                 low_stock_threshold: int = LOW_STOCK_THRESHOLD, top_users: int = 20) -> InventoryReport:
+    # user_id=None is the whole estate and adds the per-role and per-user totals
+    now = (now or datetime.now()).replace(microsecond=0)
+    report = InventoryReport(user_id, now)
+    report.low_stock_threshold = low_stock_threshold
+
+    valuation = db.load_valuation(user_id)
+    if valuation:
+        report.valuation = {
+            "items": _number(valuation['items']),
+            "total_quantity": _number(valuation['total_quantity']),
+            "total_value": _money(valuation['total_value']),
+            "flagged": _number(valuation['flagged']),
+        }
+
+    labels = bucket_labels()
+    buckets = {int(row['bucket']): row for row in db.load_expiry_buckets(now, [now + timedelta(days=days) for days in BUCKET_DAYS], user_id)}
+    for number, label in enumerate(labels):
+        row = buckets.get(number, {})
+        report.expiry_buckets.append({
+            "bucket": label,
+            "items": _number(row.get('items')),
+            "total_quantity": _number(row.get('total_quantity')),
+            "total_value": _money(row.get('total_value')),
+        })
+
+    if user_id is None:
+        report.by_role = [
+            {"role": row['role'], "users": _number(row['users']), "items": _number(row['items']),
+             "total_quantity": _number(row['total_quantity']), "total_value": _money(row['total_value'])}
+            for row in db.load_totals_by_role()
+        ]
+        report.by_user = [
+            {"user_id": row['user_id'], "username": row['username'], "role": row['role'], "items": _number(row['items']),
+             "total_quantity": _number(row['total_quantity']), "total_value": _money(row['total_value'])}
+            for row in db.load_totals_by_user(top_users)
+        ]
+
+    report.low_stock = [
+        {"name": row['name'], "user_id": row['user_id'], "username": row['username'],
+         "total_quantity": _number(row['total_quantity']), "items": _number(row['item_count'])}
+        for row in db.load_low_stock(low_stock_threshold, user_id)
+    ]
+    return report
+
+
+def format_report(report: InventoryReport) -> str:
+    valuation = report.valuation
+    scope = "All inventory" if report.user_id is None else "My inventory"
+    lines = [
+        f"{scope} at {report.generated_at.strftime('%Y-%m-%d %H:%M')}",
+        "",
+        f"Items: {valuation['items']}  Quantity: {valuation['total_quantity']}  Flagged: {valuation['flagged']}",
+        f"Stock value: {valuation['total_value']}",
+        "",
+        "Expiry",
+    ]
+    for bucket in report.expiry_buckets:
+        lines.append(f"  {bucket['bucket'].replace('_', ' '):<16} {bucket['items']:>7} items  {bucket['total_value']:>12}")
+    if report.by_role:
+        lines += ["", "By role"]
+        for row in report.by_role:
+            lines.append(f"  {row['role']:<18} {row['users']:>4} users {row['items']:>7} items  {row['total_value']:>12}")
+    if report.by_user:
+        lines += ["", "Top users by value"]
+        for row in report.by_user:
+            lines.append(f"  {row['username']:<18} {row['items']:>7} items  {row['total_value']:>12}")
+    lines += ["", f"Low stock (<= {report.low_stock_threshold})"]
+    if not report.low_stock:
+        lines.append("  none")
+    for row in report.low_stock:
+        holder = f" ({row['username']})" if report.user_id is None else ""
+        lines.append(f"  {row['name']}{holder}: {row['total_quantity']}")
+    return "\n".join(lines)
@@ -0,0 +1,267 @@
+import bisect
+import typing
+import urwid
+from collections import OrderedDict
+from datetime import datetime
+
+COLUMNS = ["ID", "Name", "Expiry Date", "Price", "Quantity", "Code"]
+
+
+def inventory_header() -> urwid.Columns:
+    return urwid.Columns([urwid.Text(column) for column in COLUMNS])
+
+
+class InventoryRow(urwid.WidgetWrap):
+    def __init__(self, item: dict, now: datetime):
+        expiry_date = item['expiry_date']
+        columns = urwid.Columns([
+            urwid.Text(str(item['id'])),
+            urwid.Text(item['name']),
+            urwid.Text(expiry_date.strftime('%Y-%m-%d %H:%M:%S')),
+            urwid.Text(str(item['price'])),
+            urwid.Text(str(item['quantity'])),
+            urwid.Text(str(item['code']))
+        ])
+        if expiry_date < now:
+            style = 'expired'
+        elif item.get('flag', False):
+            style = 'flagged'
+        else:
+            style = None
+        super().__init__(urwid.AttrMap(columns, style, focus_map='reversed'))
+
+    def selectable(self):
+        return True
+
+    def keypress(self, size, key):
+        return key
+
+
+class AggregateRow(urwid.WidgetWrap):
+    # One group from a dashboard aggregate; Enter drills down into it
+    def __init__(self, row: dict, columns: typing.Sequence[typing.Tuple[str, str]], on_select: typing.Callable[[dict], None]):
+        self.row = row
+        self.on_select = on_select
+        text = urwid.Columns([urwid.Text(str(row.get(field, ""))) for _, field in columns])
+        style = 'expired' if row.get('status') == 'expired' else None
+        super().__init__(urwid.AttrMap(text, style, focus_map='reversed'))
+
+    def selectable(self):
+        return True
+
+    def keypress(self, size, key):
+        if key != 'enter':
+            return key
+        self.on_select(self.row)
+        return None
+
+
+def aggregate_header(columns: typing.Sequence[typing.Tuple[str, str]]) -> urwid.Columns:
+    return urwid.Columns([urwid.Text(title) for title, _ in columns])
+
+
+class InventoryWalker(urwid.ListWalker):
+    # Rows are fetched one keyset page at a time as the list is scrolled, and
+    # widgets are only built for positions urwid asks for while rendering.
+    # With request_page set, pages are requested asynchronously half a page
+    # ahead of the focus and appended when they arrive; a request that fails or
+    # is cancelled calls back so the next scroll asks again.
+    def __init__(self, fetch_page: typing.Callable[[typing.Optional[tuple], int], list],
+                 sort_key: str = "id", page_size: int = 100, cache_size: int = 256,
+                 request_page: typing.Callable[[typing.Optional[tuple], int, typing.Callable, typing.Callable], None] = None):
+        self.fetch_page = fetch_page
+        self.request_page = request_page
+        self.sort_key = sort_key
+        self.page_size = page_size
+        self.cache_size = cache_size
+        self.rows = []
+        self.exhausted = False
+        self.loading = False
+        self.focus = 0
+        self.now = datetime.now()
+        self._generation = 0
+        self._widgets = OrderedDict()
+        self._by_id = {}
+        self._start()
+
+    def reload(self):
+        self.rows = []
+        self.exhausted = False
+        self.loading = False
+        self.focus = 0
+        self.now = datetime.now()
+        self._generation += 1
+        self._widgets.clear()
+        self._by_id.clear()
+        self._start()
+        self._modified()
+
+    def _start(self):
+        if self.request_page is None:
+            self._load_more()
+        else:
+            self._request_more()
+
+    def _append(self, page: list):
+        if len(page) < self.page_size:
+            self.exhausted = True
+        for item in page:
+            if item['id'] in self._by_id:
+                continue
+            # Copy so deltas can be applied to rows handed out as read-only snapshots
+            item = dict(item)
+            self.rows.append(item)
+            self._by_id[item['id']] = item
+
+    def _request_more(self):
+        if self.exhausted or self.loading:
+            return
+        self.loading = True
+        after = self._key(self.rows[-1]) if self.rows else None
+        generation = self._generation
+        self.request_page(after, self.page_size, lambda page: self._page_loaded(generation, page),
+                          lambda: self._page_failed(generation))
+
+    def _page_loaded(self, generation: int, page: list):
+        if generation != self._generation:
+            return
+        self.loading = False
+        self._append(page)
+        self._modified()
+
+    def _page_failed(self, generation: int):
+        if generation == self._generation:
+            self.loading = False
+
+    def _key(self, item: dict) -> tuple:
+        return (item[self.sort_key], item['id'])
+
+    def _index_of(self, item: dict) -> int:
+        index = bisect.bisect_left(self.rows, self._key(item), key=self._key)
+        while self.rows[index] is not item:
+            index += 1
+        return index
+
+    def insert_row(self, item: dict):
+        if item['id'] in self._by_id:
+            self.patch_row(item['id'], dict(item))
+            return
+        # Rows past the loaded window arrive with a later page instead
+        if not self.exhausted and (not self.rows or self._key(item) > self._key(self.rows[-1])):
+            return
+        item = dict(item)
+        index = bisect.bisect_left(self.rows, self._key(item), key=self._key)
+        self.rows.insert(index, item)
+        self._by_id[item['id']] = item
+        if index <= self.focus and len(self.rows) > 1:
+            self.focus += 1
+        self._modified()
+
+    def get_row(self, item_id: int) -> typing.Optional[dict]:
+        item = self._by_id.get(item_id)
+        return dict(item) if item is not None else None
+
+    def patch_row(self, item_id: int, changes: dict):
+        item = self._by_id.get(item_id)
+        if item is None:
+            return
+        if self.sort_key in changes and changes[self.sort_key] != item[self.sort_key]:
+            self.remove_row(item_id)
+            self.insert_row(dict(item, **changes))
+            return
+        item.update(changes)
+        self._widgets.pop(item_id, None)
+        self._modified()
+
+    def remove_row(self, item_id: int):
+        item = self._by_id.pop(item_id, None)
+        if item is None:
+            return
+        index = self._index_of(item)
+        del self.rows[index]
+        self._widgets.pop(item_id, None)
+        if index < self.focus or self.focus >= len(self.rows):
+            self.focus = max(self.focus - 1, 0)
+        self._modified()
+
+    def _load_more(self) -> bool:
+        if self.exhausted:
+            return False
+        after = self._key(self.rows[-1]) if self.rows else None
+        page = self.fetch_page(after, self.page_size)
+        self._append(page)
+        return bool(page)
+
+    def _ensure(self, position: int) -> bool:
+        if self.request_page is not None:
+            if position >= len(self.rows) - self.page_size // 2:
+                self._request_more()
+            return position < len(self.rows)
+        while position >= len(self.rows):
+            if not self._load_more():
+                return False
+        return True
+
+    def _widget(self, position: int) -> urwid.Widget:
+        item = self.rows[position]
+        widget = self._widgets.get(item['id'])
+        if widget is not None:
+            self._widgets.move_to_end(item['id'])
+            return widget
+        widget = self._make_widget(item)
+        self._widgets[item['id']] = widget
+        if len(self._widgets) > self.cache_size:
+            self._widgets.popitem(last=False)
+        return widget
+
+    def _make_widget(self, item: dict) -> urwid.Widget:
+        return InventoryRow(item, self.now)
+
+    def get_focus(self):
+        if not self.rows:
+            return None, None
+        return self._widget(self.focus), self.focus
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+    def get_next(self, position):
+        if not self._ensure(position + 1):
+            return None, None
+        return self._widget(position + 1), position + 1
+
+    def get_prev(self, position):
+        if position <= 0:
+            return None, None
+        return self._widget(position - 1), position - 1
+
+
+class AggregateWalker(InventoryWalker):
+    # Pages of GROUP BY rows keyed by their group ('id' holds the user id, item
+    # name or month); the page key handed to fetch_page is that group key alone
+    def __init__(self, columns: typing.Sequence[typing.Tuple[str, str]], on_select: typing.Callable[[dict], None],
+                 fetch_page: typing.Callable, page_size: int = 50, request_page: typing.Callable = None):
+        self.columns = columns
+        self.on_select = on_select
+        super().__init__(fetch_page, page_size=page_size, request_page=request_page)
+
+    def _key(self, item: dict):
+        return item['id']
+
+    def _make_widget(self, item: dict) -> urwid.Widget:
+        return AggregateRow(item, self.columns, self.on_select)
+
+
+class ScanEdit(urwid.Edit):
+    # Barcode scanners type the code followed by Enter
+    signals = urwid.Edit.signals + ["scan"]
+
+    def keypress(self, size, key):
+        if key != 'enter':
+            return super().keypress(size, key)
+        code = self.edit_text.strip()
+        self.set_edit_text("")
+        if code:
+            urwid.emit_signal(self, "scan", self, code)
+        return None
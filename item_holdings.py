@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+from db_pool import ConnectionPool
+from inventory_database import InventoryDatabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the item_holdings aggregate used by top-holder search")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("rebuild", help="recompute item_holdings from the inventory table")
+    check = subcommands.add_parser("check", help="compare item_holdings with the raw inventory aggregate")
+    check.add_argument("--item", help="also compare the top-5 holders of one item name")
+    args = parser.parse_args()
+
+    load_dotenv()
+    pool = ConnectionPool(host=os.getenv("DB_HOST"), user=os.getenv("DB_USER"),
+                          password=os.getenv("DB_PASSWORD"), database=os.getenv("DB_NAME"),
+                          pool_size=1)
+    inventory_db = InventoryDatabase(pool)
+    try:
+        if args.command == "rebuild":
+            rows = inventory_db.rebuild_item_holdings()
+            print(f"Rebuilt item_holdings: {rows} rows")
+            return 0
+
+        mismatches = inventory_db.check_item_holdings()
+        for row in mismatches:
+            print(f"Mismatch: name={row['name']!r} user_id={row['user_id']} expected={row['expected']} actual={row['actual']}")
+        if args.item:
+            fast = [(row['username'], int(row['total_quantity'])) for row in inventory_db.load_top_users_for_item(args.item)]
+            raw = [(row['username'], int(row['total_quantity'])) for row in inventory_db.load_top_users_for_item_raw(args.item)]
+            if sorted(fast) != sorted(raw):
+                print(f"Top holders differ for {args.item!r}: aggregate={fast} raw={raw}")
+                mismatches.append(args.item)
+        if mismatches:
+            return 1
+        print("item_holdings is consistent with inventory")
+        return 0
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,29 @@
 #!/usr/bin/python3
+import time
+STARTED_AT = time.perf_counter()
+
+import sys
+import threading
+import typing
 import warnings
+from datetime import datetime, timedelta
 import urwid
-from user_management import UserManagement
-from user_database import UserDatabase
-from inventory_management import InventoryManagement
-from inventory_database import InventoryDatabase
-from datetime import datetime
+from background import DatabaseWorker
+from inventory_view import AggregateWalker, InventoryWalker, ScanEdit, aggregate_header, inventory_header
+from inventory_import import parse_expiry_date
+from inventory_reports import format_report
+from stock_ledger import HISTORY_DAYS, format_stock_history
+from change_feed import ChangeTracker
 import os
+from collections import Counter
 from dotenv import load_dotenv
 
+# The database stack (mysql.connector, pool, migrations) is only imported on
+# first use, from services.connect_services, so the first screen paints fast
+if typing.TYPE_CHECKING:
+    from inventory_management import InventoryManagement
+    from user_management import UserManagement
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -33,12 +48,37 @@ palette = [
 ]
 
 choices = ["Register", "Login", "Exit"]
-inventory_choices = ["Add Item", "Update Item", "Delete Item", "Search Item", "Flag Item", "Logout"]
+inventory_choices = ["Add Item", "Update Item", "Delete Item", "Search Item", "Flag Item", "Scan Mode", "Stock Take", "Expiring Soon", "Report", "Stock History", "Refresh", "Logout"]
+admin_choices = ["By User", "By Item", "By Expiry", "Refresh", "Back"]
+
+# Admin dashboard columns as (heading, row field); every list is a paged GROUP BY
+USER_TOTAL_COLUMNS = [("User", "username"), ("Role", "role"), ("Items", "items"), ("Quantity", "total_quantity"),
+                      ("Value", "total_value"), ("Flagged", "flagged")]
+ITEM_TOTAL_COLUMNS = [("Name", "name"), ("Holders", "holders"), ("Items", "items"), ("Quantity", "total_quantity")]
+HOLDER_COLUMNS = [("User", "username"), ("Role", "role"), ("Items", "items"), ("Quantity", "total_quantity")]
+EXPIRY_COLUMNS = [("Month", "month"), ("Status", "status"), ("Items", "items"), ("Quantity", "total_quantity"),
+                  ("Value", "total_value")]
+ADMIN_PAGE_SIZE = 50
+
+# Scans arriving within SCAN_DEBOUNCE seconds of each other are applied together
+SCAN_DEBOUNCE = 0.4
+SCAN_BATCH_SIZE = 50
+
+# A stock take is applied as one transaction, sent to the server in groups of this size
+STOCK_TAKE_FLUSH_SIZE = 500
+
+# Open inventory views poll the change feed and apply other terminals' edits as deltas
+CHANGE_POLL_INTERVAL = 2.0
+CHANGE_BATCH_SIZE = 500
 
 class InventorySystemUI:
-    def __init__(self, user_mgmt: UserManagement, inventory_mgmt: InventoryManagement):
+    def __init__(self, user_mgmt: "UserManagement" = None, inventory_mgmt: "InventoryManagement" = None,
+                 connect: typing.Callable = None):
         self.user_mgmt = user_mgmt
         self.inventory_mgmt = inventory_mgmt
+        self.connect = connect
+        self.services = None
+        self._connect_lock = threading.Lock()
         self.main = urwid.Padding(urwid.SolidFill(), left=2, right=2)
         self.top = urwid.Overlay(
             self.main, urwid.SolidFill("\N{MEDIUM SHADE}"),
@@ -48,9 +88,89 @@ class InventorySystemUI:
         )
         self.username = None
         self.user_id = None
+        self.role = None
+        self.session = 0
+        self.admin_views = []
         self.action_view = None
+        self.status_view = None
+        self.inventory_walker = None
+        self.worker = None
+        self.scan_pending = Counter()
+        self.scan_alarm = None
+        self.scan_status = None
+        self.scan_remove = None
+        self.change_tracker = None
+        self.change_alarm = None
+
+    def ensure_services(self):
+        # Runs on a worker thread the first time the database is needed
+        with self._connect_lock:
+            if self.user_mgmt is None:
+                self.services = self.connect()
+                self.user_mgmt = self.services.user_mgmt
+                self.inventory_mgmt = self.services.inventory_mgmt
+
+    def register_user(self, username, password, role):
+        self.ensure_services()
+        return self.user_mgmt.register_user(username, password, role)
+
+    def authenticate_user(self, username, password):
+        self.ensure_services()
+        return self.user_mgmt.authenticate_user(username, password)
+
+    def close(self):
+        if self.worker is not None:
+            self.worker.shutdown()
+        if self.services is not None:
+            self.services.close()
+
+    def run_db(self, key, callback, fn, *args, on_failure=None):
+        # Without a worker (e.g. when driven headless) calls run inline. on_failure
+        # runs when the call fails or is cancelled. Results that arrive after the
+        # session that asked for them has ended (logout, another login) are dropped.
+        if self.worker is None:
+            callback(fn(*args))
+            return
+        session = self.session
+
+        def current(handler):
+            return lambda *result: handler(*result) if session == self.session else None
+
+        def failed(err):
+            if on_failure is not None:
+                on_failure()
+            self.show_error(err)
+
+        self.worker.submit(key, fn, *args, callback=current(callback), on_error=current(failed),
+                           on_cancel=current(on_failure) if on_failure is not None else None)
+
+    def show_error(self, err):
+        if self.action_view is not None:
+            self.show_message(f"Error: {err}")
+        else:
+            self.show_notice(("error", f"Error: {err}\n"))
+
+    def show_notice(self, response):
+        done = urwid.Button("Ok")
+        urwid.connect_signal(done, "click", lambda button: self.main_menu())
+        self.main.original_widget = urwid.Filler(urwid.Pile([urwid.Text(response), urwid.AttrMap(done, None, focus_map="reversed")]))
+
+    def show_loading(self, message):
+        self.main.original_widget = urwid.Filler(urwid.Text(("streak", message), align='center'))
 
     def main_menu(self, button=None):
+        self.session += 1
+        if self.worker is not None:
+            self.worker.cancel_all()
+            if self.scan_alarm is not None:
+                self.worker.loop.remove_alarm(self.scan_alarm)
+        # Scans still waiting for the debounce belong to the user who is leaving
+        self.scan_alarm = None
+        self.scan_pending = Counter()
+        self.stop_change_polling()
+        self.action_view = None
+        self.status_view = None
+        self.admin_views = []
         title = urwid.BigText("E-miti Inventory System", urwid.font.HalfBlock7x7Font())
         title = urwid.Padding(title, 'center', width='clip')
         
@@ -111,14 +231,16 @@ class InventorySystemUI:
         role_group = edits[2]
         selected_role = next((rb.label for rb in role_group if rb.state), None)
         if not selected_role:
-            response = urwid.Text(("error", "Please select a role\n"))
-        elif self.user_mgmt.register_user(username, password, selected_role.lower()):
-            response = urwid.Text(("success", "Registration successful\n"))
+            self.show_notice(("error", "Please select a role\n"))
+            return
+        self.show_loading("Registering...")
+        self.run_db("auth", self.register_done, self.register_user, username, password, selected_role.lower())
+
+    def register_done(self, registered):
+        if registered:
+            self.show_notice(("success", "Registration successful\n"))
         else:
-            response = urwid.Text(("error", "Username already taken\n"))
-        done = urwid.Button("Ok")
-        urwid.connect_signal(done, "click", lambda button: self.main_menu())
-        self.main.original_widget = urwid.Filler(urwid.Pile([response, urwid.AttrMap(done, None, focus_map="reversed")]))
+            self.show_notice(("error", "Username already taken\n"))
     
     def login_form(self):
         body = [urwid.Text("Login"), urwid.Divider()]
@@ -132,52 +254,42 @@ class InventorySystemUI:
     def login_action(self, button, edits):
         username = edits[0].edit_text
         password = edits[1].edit_text
-        authenticated, user_id, role = self.user_mgmt.authenticate_user(username, password)
+        self.show_loading("Logging in...")
+        self.run_db("auth", lambda result: self.login_done(username, result),
+                    self.authenticate_user, username, password)
+
+    def login_done(self, username, result):
+        authenticated, user_id, role = result
         if authenticated:
             self.username = username
             self.user_id = user_id
+            self.role = role
             self.inventory_menu()
         else:
-            response = urwid.Text(("error", "Login failed\n"))
-            done = urwid.Button("Ok")
-            urwid.connect_signal(done, "click", self.main_menu)
-            self.main.original_widget = urwid.Filler(urwid.Pile([response, urwid.AttrMap(done, None, focus_map="reversed")]))
+            self.show_notice(("error", "Login failed\n"))
 
     def inventory_menu(self):
-        inventory = self.inventory_mgmt.get_inventory(self.user_id)
-
-        header = urwid.Columns([
-            urwid.Text("ID"),
-            urwid.Text("Name"),
-            urwid.Text("Expiry Date"),
-            urwid.Text("Price"),
-            urwid.Text("Quantity"),
-            urwid.Text("Code")
-        ])
-
-        items = []
-        for item in inventory:
-            # Format the expiry_date as a string
-            expiry_date_str = item['expiry_date'].strftime('%Y-%m-%d %H:%M:%S')
-            item_widget = urwid.Columns([
-                urwid.Text(str(item['id'])),
-                urwid.Text(item['name']),
-                urwid.Text(expiry_date_str),  # Use the formatted string here
-                urwid.Text(str(item['price'])),
-                urwid.Text(str(item['quantity'])),
-                urwid.Text(str(item['code']))
-            ])
-            if item['expiry_date'] < datetime.now():
-                items.append(urwid.AttrMap(item_widget, 'expired'))
-            elif item.get('flag', False):
-                items.append(urwid.AttrMap(item_widget, 'flagged'))
-            else:
-                items.append(item_widget)
-
-        inventory_list = urwid.ListBox(urwid.SimpleFocusListWalker([header] + items))
-        inventory_box = urwid.LineBox(inventory_list, title="Inventory")
-
-        menu_items = [urwid.Button(choice, on_press=self.menu_choice) for choice in inventory_choices]
+        self.admin_views = []
+        user_id = self.user_id
+        self.inventory_walker = InventoryWalker(
+            lambda after, limit: self.inventory_mgmt.get_inventory_page(user_id, after=after, limit=limit, form="record"),
+            request_page=lambda after, limit, deliver, failed: self.run_db(
+                "inventory_page", lambda result: self.inventory_page_loaded(result, deliver),
+                self.load_inventory_page, user_id, after, limit, on_failure=failed
+            )
+        )
+        choices = list(inventory_choices)
+        if self.role == "admin":
+            choices.insert(choices.index("Refresh"), "Admin Dashboard")
+        self.show_columns("Inventory", inventory_header(), self.inventory_walker, choices, self.menu_choice)
+
+    def show_columns(self, title, header, walker, menu_choices, on_choice):
+        inventory_list = urwid.ListBox(walker)
+        # Background news (e.g. journalled edits that did not save) goes here so it never replaces a form
+        self.status_view = urwid.Text("")
+        inventory_box = urwid.LineBox(urwid.Frame(inventory_list, header=header, footer=self.status_view), title=title)
+
+        menu_items = [urwid.Button(choice, on_press=on_choice) for choice in menu_choices]
         menu_list = urwid.ListBox(urwid.SimpleFocusListWalker(menu_items))
         menu_box = urwid.LineBox(menu_list, title="Menu")
 
@@ -196,6 +308,70 @@ class InventorySystemUI:
 
         self.main.original_widget = columns 
 
+    def load_inventory_page(self, user_id, after, limit):
+        # The first page also fixes the change-feed position. It is read before
+        # the page (and the page bypasses the cache) so no change can fall between them.
+        position = None
+        if after is None:
+            position = self.inventory_mgmt.latest_change_id()
+            self.inventory_mgmt.cache.invalidate_prefix(("inventory", user_id))
+        return position, self.inventory_mgmt.get_inventory_page(user_id, "id", after, limit, False, "record")
+
+    def inventory_page_loaded(self, result, deliver):
+        position, page = result
+        if position is not None and self.action_view is not None:
+            self.change_tracker = ChangeTracker(self.user_id, position)
+            self.schedule_change_poll(CHANGE_POLL_INTERVAL)
+        deliver(page)
+
+    def stop_change_polling(self):
+        if self.worker is not None:
+            self.worker.cancel("inventory_page")
+            self.worker.cancel("changes")
+            if self.change_alarm is not None:
+                self.worker.loop.remove_alarm(self.change_alarm)
+        self.change_alarm = None
+        self.change_tracker = None
+
+    def schedule_change_poll(self, delay):
+        if self.worker is None:
+            return
+        if self.change_alarm is not None:
+            self.worker.loop.remove_alarm(self.change_alarm)
+        self.change_alarm = self.worker.loop.set_alarm_in(delay, lambda loop, data: self.poll_changes())
+
+    def poll_changes(self):
+        self.change_alarm = None
+        tracker = self.change_tracker
+        if tracker is None:
+            return
+        # Errors (e.g. a dropped connection) just push the next poll back
+        self.worker.submit("changes", self.inventory_mgmt.changes_since, tracker.position, self.user_id,
+                           CHANGE_BATCH_SIZE, tracker.missing(),
+                           callback=lambda changes: self.changes_received(tracker, changes),
+                           on_error=lambda err: self.schedule_change_poll(CHANGE_POLL_INTERVAL * 5))
+
+    def changes_received(self, tracker, changes):
+        if tracker is not self.change_tracker:
+            return
+        deltas, resync = tracker.accept(changes)
+        conflicts = self.inventory_mgmt.take_conflicts()
+        if conflicts:
+            self.status_view.set_text(("error", "\n".join(f"Not saved: {message}" for _, message in conflicts)))
+            # Rows patched ahead of the database may be wrong now
+            resync = True
+        if resync:
+            # A change may have been missed; start over from a fresh first page and position
+            self.change_tracker = None
+            self.inventory_walker.reload()
+            return
+        for item_id, item in deltas:
+            if item is None:
+                self.inventory_walker.remove_row(item_id)
+            else:
+                self.inventory_walker.insert_row(item)
+        self.schedule_change_poll(0 if len(changes) >= CHANGE_BATCH_SIZE else CHANGE_POLL_INTERVAL)
+
     def menu_choice(self, button):
         choice = button.label
         if choice == "Add Item":
@@ -208,6 +384,22 @@ class InventorySystemUI:
             self.show_search_item()
         elif choice == "Flag Item":
             self.show_flag_item()
+        elif choice == "Scan Mode":
+            self.show_scan_mode()
+        elif choice == "Stock Take":
+            self.show_stock_take()
+        elif choice == "Expiring Soon":
+            self.show_expiring()
+        elif choice == "Report":
+            self.show_report()
+        elif choice == "Stock History":
+            self.show_stock_history()
+        elif choice == "Admin Dashboard":
+            self.show_admin_dashboard()
+        elif choice == "Refresh":
+            # An explicit refresh reads from the database, not from pages cached up to cache_ttl ago
+            self.inventory_mgmt.cache.invalidate_prefix(("inventory", self.user_id))
+            self.inventory_walker.reload()
         elif choice == "Logout":
             self.main_menu()
 
@@ -240,13 +432,23 @@ class InventorySystemUI:
         try:
             quantity = int(quantity)
             price = float(price)
-            if self.inventory_mgmt.add_item(self.user_id, name, quantity, price, code, expiry_date, flag):
-                self.show_message("Item added successfully")
-                self.inventory_menu()  # Refresh inventory
-            else:
-                self.show_message("Failed to add item")
+            expiry_date = parse_expiry_date(expiry_date)
         except ValueError:
-            self.show_message("Invalid input. Quantity must be an integer and price must be a float")
+            self.show_message("Invalid input. Quantity must be an integer, price must be a float and expiry date must be YYYY-MM-DD")
+            return
+        self.show_message("Saving...")
+        self.run_db(None, self.add_item_done, self.inventory_mgmt.create_item,
+                    self.user_id, name, quantity, price, code, expiry_date, flag)
+
+    def add_item_done(self, item):
+        if item and item.get('id') is None:
+            # Journalled: the row arrives through the change feed once it reaches the database
+            self.show_message("Item saved; it will appear in the list shortly")
+        elif item:
+            self.show_message("Item added successfully")
+            self.inventory_walker.insert_row(item)
+        else:
+            self.show_message("Failed to add item")
 
     def show_update_item(self):
         content = [
@@ -278,13 +480,24 @@ class InventorySystemUI:
             item_id = int(item_id)
             quantity = int(quantity)
             price = float(price)
-            if self.inventory_mgmt.update_item(item_id, name, quantity, price, code, expiry_date):
-                self.show_message("Item updated successfully")
-                self.inventory_menu()  # Refresh inventory
-            else:
-                self.show_message("Item not found")
+            expiry_date = parse_expiry_date(expiry_date)
         except ValueError:
-            self.show_message("Invalid input. Item ID, Quantity must be integers and price must be a float")
+            self.show_message("Invalid input. Item ID, Quantity must be integers, price must be a float and expiry date must be YYYY-MM-DD")
+            return
+        changes = {"name": name, "quantity": quantity, "price": price, "code": code, "expiry_date": expiry_date}
+        # What this terminal last showed; a write-behind update is refused if the item has moved on
+        row = self.inventory_walker.get_row(item_id)
+        expected = {field: row[field] for field in changes} if row is not None else None
+        self.show_message("Saving...")
+        self.run_db(None, lambda updated: self.update_item_done(item_id, changes, updated),
+                    self.inventory_mgmt.update_item, item_id, name, quantity, price, code, expiry_date, expected)
+
+    def update_item_done(self, item_id, changes, updated):
+        if updated:
+            self.show_message("Item updated successfully")
+            self.inventory_walker.patch_row(item_id, changes)
+        else:
+            self.show_message("Item not found")
 
     def show_delete_item(self):
         content = [
@@ -304,13 +517,18 @@ class InventorySystemUI:
 
         try:
             item_id = int(item_id)
-            if self.inventory_mgmt.delete_item(item_id):
-                self.show_message("Item deleted successfully")
-                self.inventory_menu()  # Refresh inventory
-            else:
-                self.show_message("Item not found")
         except ValueError:
             self.show_message("Invalid input. Item ID must be an integer")
+            return
+        self.show_message("Deleting...")
+        self.run_db(None, lambda deleted: self.delete_item_done(item_id, deleted), self.inventory_mgmt.delete_item, item_id)
+
+    def delete_item_done(self, item_id, deleted):
+        if deleted:
+            self.show_message("Item deleted successfully")
+            self.inventory_walker.remove_row(item_id)
+        else:
+            self.show_message("Item not found")
 
     def show_search_item(self):
         content = [
@@ -328,7 +546,27 @@ class InventorySystemUI:
             self.show_message("Item name is required.")
             return
 
-        top_users = self.inventory_mgmt.get_top_users_for_item(name)
+        self.show_message("Searching...")
+        self.run_db("search", lambda result: self.search_item_done(*result), self.find_item, name)
+
+    def find_item(self, name):
+        # Exact names go straight to the holders lookup; anything else is
+        # resolved through the fuzzy name index first. The index only sees this
+        # process's writes, so a name it lacks may still have been added by
+        # another terminal: the database has the last word before "not found".
+        matches = self.inventory_mgmt.search_item_names(name, 8)
+        if matches and matches[0].lower() == name.strip().lower():
+            return matches[0], self.inventory_mgmt.get_top_users_for_item(matches[0]), matches[1:]
+        return name, self.inventory_mgmt.get_top_users_for_item(name.strip()), matches
+
+    def search_item_done(self, name, top_users, suggestions):
+        if not top_users and suggestions:
+            buttons = [urwid.Button(match, on_press=self.search_suggestion) for match in suggestions]
+            self.action_view = urwid.ListBox(urwid.SimpleFocusListWalker(
+                [urwid.Text(f"No exact match for {name}. Did you mean:"), urwid.Divider(), *buttons]
+            ))
+            self.update_action_box()
+            return
         if top_users:
             result = f"Research Result For {name}\n\n"
             for user in top_users:
@@ -337,6 +575,11 @@ class InventorySystemUI:
         else:
             self.show_message("Item not found")
 
+    def search_suggestion(self, button):
+        name = button.label
+        self.show_message("Searching...")
+        self.run_db("search", lambda result: self.search_item_done(*result), self.find_item, name)
+
     def show_search_result(self, result):
         self.action_view = urwid.Text(result)
         self.update_action_box()
@@ -359,15 +602,235 @@ class InventorySystemUI:
 
         try:
             item_id = int(item_id)
-            if self.inventory_mgmt.flag_item(item_id):
-                self.show_message("Item flagged successfully")
-                self.inventory_menu()  # Refresh inventory
-            else:
-                self.show_message("Item not found")
         except ValueError:
             self.show_message("Invalid input. Item ID must be an integer")
+            return
+        self.show_message("Flagging...")
+        self.run_db(None, lambda flagged: self.flag_item_done(item_id, flagged), self.inventory_mgmt.flag_item, item_id)
+
+    def flag_item_done(self, item_id, flagged):
+        if flagged:
+            self.show_message("Item flagged successfully")
+            self.inventory_walker.patch_row(item_id, {"flag": 1})
+        else:
+            self.show_message("Item not found")
+
+    def show_scan_mode(self):
+        scan_edit = ScanEdit("Scan: ")
+        urwid.connect_signal(scan_edit, "scan", self.scan_received)
+        self.scan_remove = urwid.CheckBox("Dispense (subtract)")
+        self.scan_status = urwid.Text("Waiting for scans")
+        content = [scan_edit, self.scan_remove, urwid.Divider(), self.scan_status]
+        self.action_view = urwid.ListBox(urwid.SimpleFocusListWalker(content))
+        self.update_action_box()
+
+    def scan_received(self, edit, code):
+        self.scan_pending[code] += -1 if self.scan_remove.state else 1
+        pending = sum(abs(delta) for delta in self.scan_pending.values())
+        self.scan_status.set_text(f"{pending} scans pending")
+        if self.worker is None or pending >= SCAN_BATCH_SIZE:
+            self.flush_scans()
+            return
+        # Debounce: every scan pushes the flush back until the burst is over
+        if self.scan_alarm is not None:
+            self.worker.loop.remove_alarm(self.scan_alarm)
+        self.scan_alarm = self.worker.loop.set_alarm_in(SCAN_DEBOUNCE, lambda loop, data: self.flush_scans())
+
+    def flush_scans(self):
+        if self.scan_alarm is not None and self.worker is not None:
+            self.worker.loop.remove_alarm(self.scan_alarm)
+        self.scan_alarm = None
+        deltas = {code: delta for code, delta in self.scan_pending.items() if delta}
+        self.scan_pending = Counter()
+        if not deltas:
+            return
+        status = self.scan_status
+        self.run_db(None, lambda adjusted: self.flush_scans_done(status, deltas, adjusted),
+                    self.inventory_mgmt.adjust_quantities_by_code, deltas, self.user_id)
+
+    def flush_scans_done(self, status, deltas, adjusted):
+        for item in adjusted.values():
+            self.inventory_walker.patch_row(item['id'], {"quantity": item['quantity']})
+        result = f"Applied {len(adjusted)} codes"
+        unknown = [code for code in deltas if code not in adjusted]
+        if unknown:
+            result += f"\nUnknown codes: {', '.join(unknown)}"
+        status.set_text(result)
+
+    def show_stock_take(self):
+        content = [
+            urwid.Text("One counted item per line: ID QUANTITY"),
+            urwid.Edit("Counts:\n", multiline=True),
+            urwid.Button("Apply", on_press=self.stock_take)
+        ]
+        self.action_view = urwid.ListBox(urwid.SimpleFocusListWalker(content))
+        self.update_action_box()
+
+    def stock_take(self, button):
+        form = self.action_view
+        counts = {}
+        for number, line in enumerate(form.body[1].edit_text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                item_id, quantity = (int(value) for value in line.split())
+            except ValueError:
+                self.show_message(f"Invalid input on line {number}. Expected: ID QUANTITY")
+                return
+            if quantity < 0:
+                self.show_message(f"Invalid input on line {number}. Quantity cannot be negative")
+                return
+            counts[item_id] = quantity
+        if not counts:
+            self.show_message("Enter at least one count.")
+            return
+        self.show_message(f"Applying {len(counts)} counts...")
+        self.run_db(None, lambda batch: self.stock_take_done(counts, batch), self.apply_stock_take, counts)
+
+    def apply_stock_take(self, counts):
+        # All or nothing: an error rolls back every count in the batch
+        with self.inventory_mgmt.batch(STOCK_TAKE_FLUSH_SIZE) as batch:
+            for item_id, quantity in counts.items():
+                batch.set_quantity(item_id, quantity)
+        return batch
+
+    def stock_take_done(self, counts, batch):
+        for event, item, old in batch.changed_rows():
+            self.inventory_walker.patch_row(item['id'], {"quantity": item['quantity']})
+        result = f"Stock take applied: {len(batch.applied)} items counted"
+        unknown = [str(item_id) for item_id in counts if item_id not in batch.applied]
+        if unknown:
+            result += f"\nUnknown item IDs: {', '.join(unknown)}"
+        self.show_message(result)
+
+    def show_expiring(self):
+        content = [
+            urwid.Edit("Within Days: ", "30"),
+            urwid.Button("Show", on_press=self.expiring_items)
+        ]
+        self.action_view = urwid.ListBox(urwid.SimpleFocusListWalker(content))
+        self.update_action_box()
+
+    def expiring_items(self, button):
+        form = self.action_view
+        try:
+            days = int(form.body[0].edit_text)
+        except ValueError:
+            self.show_message("Invalid input. Days must be an integer")
+            return
+        self.show_message("Searching...")
+        self.run_db("expiring", lambda items: self.expiring_items_done(days, items),
+                    self.inventory_mgmt.get_expiring, self.user_id, days, 50)
+
+    def expiring_items_done(self, days, items):
+        if not items:
+            self.show_message(f"Nothing expires within {days} days")
+            return
+        result = f"Expiring within {days} days\n\n"
+        for item in items:
+            result += f"{item['expiry_date'].strftime('%Y-%m-%d')} {item['name']} (ID {item['id']}, Qty {item['quantity']})\n"
+        self.show_search_result(result)
+
+    def show_report(self):
+        # Aggregated by the database on a worker thread; the pane fills in when it arrives
+        self.show_message("Computing report...")
+        self.run_db("report", self.report_done, self.inventory_mgmt.get_report, self.user_id)
+
+    def report_done(self, report):
+        self.show_search_result(format_report(report))
+
+    def show_stock_history(self):
+        self.show_message("Computing stock history...")
+        start = datetime.now() - timedelta(days=HISTORY_DAYS)
+        self.run_db("report", self.stock_history_done, self.inventory_mgmt.get_stock_history, self.user_id, start)
+
+    def stock_history_done(self, history):
+        self.show_search_result(format_stock_history(history))
+
+    def show_admin_dashboard(self):
+        # Estate-wide view for admins. Every list is aggregated and paged by the
+        # database; Enter on a row drills down and loads its rows on demand.
+        self.stop_change_polling()
+        self.show_user_totals()
+
+    def admin_choice(self, button):
+        choice = button.label
+        if choice == "By User":
+            self.show_user_totals()
+        elif choice == "By Item":
+            self.show_item_totals()
+        elif choice == "By Expiry":
+            self.show_expiry_totals()
+        elif choice == "Refresh":
+            self.inventory_mgmt.cache.invalidate_prefix(("inventory",))
+            self.admin_views[-1][2].reload()
+        elif choice == "Back":
+            self.admin_back()
+
+    def admin_request(self, fetch):
+        # One worker key per drill-down depth, so a deeper view never drops the pages of the one beneath it
+        key = f"admin_page:{len(self.admin_views)}"
+        return lambda after, limit, deliver, failed: self.run_db(key, deliver, fetch, after, limit, on_failure=failed)
+
+    def push_admin_view(self, title, header, walker):
+        self.admin_views.append((title, header, walker))
+        self.show_columns(title, header, walker, admin_choices, self.admin_choice)
+
+    def admin_back(self):
+        self.admin_views.pop()
+        if not self.admin_views:
+            self.inventory_menu()
+            return
+        self.show_columns(*self.admin_views[-1], admin_choices, self.admin_choice)
+
+    def aggregate_view(self, title, columns, fetch, on_select, top=False):
+        if top:
+            self.admin_views = []
+        walker = AggregateWalker(columns, on_select, fetch, page_size=ADMIN_PAGE_SIZE,
+                                 request_page=self.admin_request(fetch))
+        self.push_admin_view(title, aggregate_header(columns), walker)
+
+    def inventory_view(self, title, fetch, sort_key="id"):
+        walker = InventoryWalker(fetch, sort_key=sort_key, request_page=self.admin_request(fetch))
+        self.push_admin_view(title, inventory_header(), walker)
+
+    def show_user_totals(self):
+        self.aggregate_view("All users", USER_TOTAL_COLUMNS, self.inventory_mgmt.get_user_totals_page,
+                            self.show_user_inventory, top=True)
+
+    def show_item_totals(self):
+        self.aggregate_view("All items", ITEM_TOTAL_COLUMNS, self.inventory_mgmt.get_item_totals_page,
+                            self.show_item_holders, top=True)
+
+    def show_expiry_totals(self):
+        self.aggregate_view("Expiry by month", EXPIRY_COLUMNS, self.inventory_mgmt.get_expiry_month_page,
+                            self.show_expiry_month, top=True)
+
+    def show_user_inventory(self, row):
+        user_id = row['user_id']
+        self.inventory_view(f"{row['username']} ({row['role']})", lambda after, limit: self.inventory_mgmt.get_inventory_page(
+            user_id, after=after, limit=limit, form="record"))
+
+    def show_item_holders(self, row):
+        name = row['name']
+        self.aggregate_view(f"Holders of {name}", HOLDER_COLUMNS,
+                            lambda after, limit: self.inventory_mgmt.get_item_holders_page(name, after, limit),
+                            lambda holder: self.show_holder_items(name, holder))
+
+    def show_holder_items(self, name, holder):
+        user_id = holder['user_id']
+        self.inventory_view(f"{name} held by {holder['username']}", lambda after, limit: self.inventory_mgmt.get_inventory_page(
+            user_id, after=after, limit=limit, form="record", item_name=name))
+
+    def show_expiry_month(self, row):
+        bounds = {"expires_after": row['expires_after'], "expires_before": row['expires_before']}
+        self.inventory_view(f"Expiring {row['month']}", lambda after, limit: self.inventory_mgmt.get_inventory_page(
+            None, "expiry_date", after, limit, form="record", **bounds), sort_key="expiry_date")
 
     def show_message(self, message):
+        # Results can arrive after logout; there is no action pane to show them in then
+        if self.action_view is None:
+            return
         self.action_view = urwid.Text(message)
         self.update_action_box()
 
@@ -379,20 +842,40 @@ class InventorySystemUI:
     def exit_program(self, button):
         raise urwid.ExitMainLoop()
 
+def report_first_paint(loop: urwid.MainLoop, started_at: float, timings: dict):
+    # Wraps draw_screen once to record the time from interpreter start to the first frame
+    draw_screen = loop.draw_screen
+
+    def first_draw():
+        draw_screen()
+        loop.draw_screen = draw_screen
+        timings["first_paint_ms"] = (time.perf_counter() - started_at) * 1000
+        timings["mysql_imported"] = "mysql.connector" in sys.modules
+
+    loop.draw_screen = first_draw
+
+
+def print_startup_timings(timings: dict):
+    if "first_paint_ms" in timings:
+        print(f"Cold start to first paint: {timings['first_paint_ms']:.1f} ms "
+              f"(database stack imported: {timings['mysql_imported']})", file=sys.stderr)
+
+
+def connect_services():
+    from services import connect_services
+    return connect_services()
+
+
 if __name__ == "__main__":
-    # Load environment variables
-    load_dotenv()
-
-    # Get MySQL connection parameters from environment variables
-    db_host = os.getenv("DB_HOST")
-    db_user = os.getenv("DB_USER")
-    db_password = os.getenv("DB_PASSWORD")
-    db_name = os.getenv("DB_NAME")
-
-    user_db = UserDatabase(host=db_host, user=db_user, password=db_password, database=db_name)
-    inventory_db = InventoryDatabase(host=db_host, user=db_user, password=db_password, database=db_name)
-    user_mgmt = UserManagement(user_db)
-    inventory_mgmt = InventoryManagement(inventory_db)
-    system = InventorySystemUI(user_mgmt, inventory_mgmt)
+    system = InventorySystemUI(connect=connect_services)
     system.main_menu()
-    urwid.MainLoop(system.top, palette).run()
+    loop = urwid.MainLoop(system.top, palette)
+    system.worker = DatabaseWorker(loop, max_workers=int(os.getenv("DB_POOL_SIZE", "5")))
+    timings = {}
+    if os.getenv("EMITI_STARTUP_TIMING") == "1":
+        report_first_paint(loop, STARTED_AT, timings)
+    try:
+        loop.run()
+    finally:
+        system.close()
+        print_startup_timings(timings)
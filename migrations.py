@@ -0,0 +1,357 @@
+#!/usr/bin/python3
+import argparse
+import os
+import sys
+import typing
+from datetime import datetime
+import mysql.connector
+from dotenv import load_dotenv
+from db_pool import ConnectionPool
+
+LOCK_NAME = "e_miti_schema_migrations"
+
+
+def index_exists(cursor, table: str, name: str) -> bool:
+    cursor.execute(
+        "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1",
+        (table, name)
+    )
+    return cursor.fetchone() is not None
+
+
+def create_index(cursor, table: str, name: str, columns: str, unique: bool = False):
+    # MySQL has no CREATE INDEX IF NOT EXISTS, so look the index up first
+    if not index_exists(cursor, table, name):
+        cursor.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({columns})")
+
+
+def create_base_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(255) NOT NULL,
+            password CHAR(64) NOT NULL,
+            role VARCHAR(50) NOT NULL,
+            UNIQUE KEY uq_users_username (username)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventory (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            quantity INT NOT NULL,
+            price DECIMAL(12, 2) NOT NULL,
+            code VARCHAR(64) NOT NULL,
+            expiry_date DATETIME NOT NULL,
+            created_at DATETIME NOT NULL,
+            flag TINYINT(1) NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def create_lookup_indexes(cursor):
+    create_index(cursor, "users", "idx_users_login", "username, password")
+    # (user_id, <sort key>, id) serves both the per-user filter and keyset pagination
+    create_index(cursor, "inventory", "idx_inventory_user", "user_id, id")
+    create_index(cursor, "inventory", "idx_inventory_user_name", "user_id, name, id")
+    create_index(cursor, "inventory", "idx_inventory_user_expiry", "user_id, expiry_date, id")
+    create_index(cursor, "inventory", "idx_inventory_user_price", "user_id, price, id")
+    create_index(cursor, "inventory", "idx_inventory_name", "name, user_id")
+
+
+def create_item_holdings(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_holdings (
+            name VARCHAR(255) NOT NULL,
+            user_id INT NOT NULL,
+            total_quantity BIGINT NOT NULL DEFAULT 0,
+            item_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, user_id),
+            KEY idx_item_holdings_top (name, total_quantity)
+        )
+    """)
+    cursor.execute("DELETE FROM item_holdings")
+    cursor.execute("""
+        INSERT INTO item_holdings (name, user_id, total_quantity, item_count)
+        SELECT name, user_id, SUM(quantity), COUNT(*)
+        FROM inventory
+        GROUP BY name, user_id
+    """)
+
+
+def create_expiry_index(cursor):
+    create_index(cursor, "inventory", "idx_inventory_flag_expiry", "flag, expiry_date")
+
+
+def create_code_index(cursor):
+    # Codes repeat across users and across lots of one product, so the index is per user and not unique
+    create_index(cursor, "inventory", "idx_inventory_user_code", "user_id, code")
+
+
+def drop_global_code_index(cursor):
+    # Databases that ran the first version of migration 5 have a global UNIQUE(code)
+    create_code_index(cursor)
+    if index_exists(cursor, "inventory", "uq_inventory_code"):
+        cursor.execute("DROP INDEX uq_inventory_code ON inventory")
+
+
+def create_change_feed(cursor):
+    # Every write to inventory, including set-based flagging, appends a row
+    # here from a trigger; change_id is the watermark terminals poll from
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventory_changes (
+            change_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            item_id INT NOT NULL,
+            user_id INT NOT NULL,
+            op VARCHAR(8) NOT NULL,
+            changed_at DATETIME(6) NOT NULL,
+            KEY idx_inventory_changes_changed_at (changed_at)
+        )
+    """)
+    for event, row in (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD")):
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_inventory_changes_{event}")
+        cursor.execute(
+            f"CREATE TRIGGER trg_inventory_changes_{event} AFTER {event.upper()} ON inventory FOR EACH ROW "
+            f"INSERT INTO inventory_changes (item_id, user_id, op, changed_at) VALUES ({row}.id, {row}.user_id, '{event}', NOW(6))"
+        )
+
+
+def create_applied_mutations(cursor):
+    # Idempotency keys of journalled writes, recorded in the same transaction
+    # as the write so a replayed journal entry is recognised and skipped
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS applied_mutations (
+            mutation_key CHAR(32) PRIMARY KEY,
+            applied_at DATETIME NOT NULL,
+            KEY idx_applied_mutations_applied_at (applied_at)
+        )
+    """)
+
+
+# Quantity movements per inventory write: receipts and write-offs on insert
+# and delete, the difference on a quantity change, and an out/in pair when an
+# item is renamed or moves to another user
+STOCK_MOVEMENT_TRIGGERS = {
+    "insert": "INSERT INTO stock_movements (user_id, item_id, name, delta, kind, moved_at) "
+              "VALUES (NEW.user_id, NEW.id, NEW.name, NEW.quantity, 'in', NOW(6))",
+    "delete": "INSERT INTO stock_movements (user_id, item_id, name, delta, kind, moved_at) "
+              "VALUES (OLD.user_id, OLD.id, OLD.name, -OLD.quantity, 'out', NOW(6))",
+    "update": "INSERT INTO stock_movements (user_id, item_id, name, delta, kind, moved_at) "
+              "SELECT OLD.user_id, OLD.id, OLD.name, -OLD.quantity, 'move', NOW(6) FROM DUAL "
+              "WHERE OLD.name <> NEW.name OR OLD.user_id <> NEW.user_id "
+              "UNION ALL SELECT NEW.user_id, NEW.id, NEW.name, NEW.quantity, 'move', NOW(6) FROM DUAL "
+              "WHERE OLD.name <> NEW.name OR OLD.user_id <> NEW.user_id "
+              "UNION ALL SELECT NEW.user_id, NEW.id, NEW.name, NEW.quantity - OLD.quantity, 'adjust', NOW(6) FROM DUAL "
+              "WHERE OLD.name = NEW.name AND OLD.user_id = NEW.user_id AND OLD.quantity <> NEW.quantity",
+}
+
+
+def create_stock_ledger(cursor):
+    # Append-only ledger plus per-user snapshots; a point-in-time query starts
+    # from the nearest snapshot and replays only the movements after it
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            movement_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            item_id INT NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            delta INT NOT NULL,
+            kind VARCHAR(8) NOT NULL,
+            moved_at DATETIME(6) NOT NULL,
+            KEY idx_stock_movements_user_time (user_id, moved_at)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_checkpoints (
+            user_id INT NOT NULL,
+            taken_at DATETIME(6) NOT NULL,
+            PRIMARY KEY (user_id, taken_at)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            user_id INT NOT NULL,
+            taken_at DATETIME(6) NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            quantity BIGINT NOT NULL,
+            PRIMARY KEY (user_id, taken_at, name)
+        )
+    """)
+    # Second triggers per event alongside the change feed's (MySQL 5.7.2+)
+    for event, body in STOCK_MOVEMENT_TRIGGERS.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_stock_movements_{event}")
+        cursor.execute(f"CREATE TRIGGER trg_stock_movements_{event} AFTER {event.upper()} ON inventory FOR EACH ROW {body}")
+    # Opening balances for existing stock, net of anything written since the triggers went in
+    cursor.execute("""
+        INSERT INTO stock_movements (user_id, item_id, name, delta, kind, moved_at)
+        SELECT i.user_id, i.id, i.name, i.quantity - COALESCE(SUM(m.delta), 0), 'open', NOW(6)
+        FROM inventory i
+        LEFT JOIN stock_movements m ON m.item_id = i.id
+        GROUP BY i.id, i.user_id, i.name, i.quantity
+        HAVING i.quantity - COALESCE(SUM(m.delta), 0) <> 0
+    """)
+
+
+def create_dashboard_indexes(cursor):
+    # Covering index: per-user totals are read in user_id order without touching
+    # rows, so a page of users stops after those users' entries
+    create_index(cursor, "inventory", "idx_inventory_user_totals", "user_id, quantity, price, flag")
+    # Estate-wide expiry ranges and drill-down pages across all users
+    create_index(cursor, "inventory", "idx_inventory_expiry", "expiry_date, id")
+
+
+MIGRATIONS = [
+    (1, "create users and inventory tables", create_base_tables),
+    (2, "indexes for login, per-user listing and name lookups", create_lookup_indexes),
+    (3, "item_holdings aggregate for top-holder search", create_item_holdings),
+    (4, "index for the expiry scheduler's unflagged-by-expiry scans", create_expiry_index),
+    (5, "per-user item code index for barcode lookups", create_code_index),
+    (6, "inventory_changes feed maintained by triggers", create_change_feed),
+    (7, "applied_mutations keys for write-behind journal replay", create_applied_mutations),
+    (8, "stock_movements ledger with per-user snapshots", create_stock_ledger),
+    (9, "indexes for the Admin dashboard's estate-wide aggregates", create_dashboard_indexes),
+    (10, "replace the global unique item code index with the per-user one", drop_global_code_index),
+]
+
+
+def applied_versions(cursor) -> set:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def apply_migrations(pool: ConnectionPool) -> typing.List[int]:
+    applied = []
+    with pool.connection() as conn:
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        try:
+            # Serialise terminals that start at the same time
+            cursor.execute("SELECT GET_LOCK(%s, 60) AS locked", (LOCK_NAME,))
+            if not cursor.fetchone()['locked']:
+                raise mysql.connector.errors.OperationalError("Timed out waiting for the schema migration lock")
+            try:
+                done = applied_versions(cursor)
+                for version, description, migrate in MIGRATIONS:
+                    if version in done:
+                        continue
+                    migrate(cursor)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, description, applied_at) VALUES (%s, %s, %s)",
+                        (version, description, datetime.now())
+                    )
+                    conn.commit()
+                    applied.append(version)
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        finally:
+            cursor.close()
+    return applied
+
+
+def index_checks() -> typing.List[typing.Tuple[str, str, tuple]]:
+    # Representative statements for every query in UserDatabase and InventoryDatabase
+    from inventory_database import InventoryDatabase
+    page_sql, page_params = InventoryDatabase(None)._inventory_query(1, "expiry_date", False, (datetime.now(), 1), {})
+    bucket_sql, bucket_params = InventoryDatabase(None)._inventory_query(
+        None, "expiry_date", False, (datetime.now(), 1), {"expires_after": datetime.now(), "expires_before": datetime.now()})
+    return [
+        ("UserDatabase.get_user", "SELECT * FROM users WHERE username=%s AND password=%s", ("admin", "0" * 64)),
+        ("InventoryDatabase.get_item", "SELECT * FROM inventory WHERE id=%s", (1,)),
+        ("InventoryDatabase.update_item", "UPDATE inventory SET name=%s, quantity=%s, price=%s, code=%s, expiry_date=%s WHERE id=%s",
+         ("x", 1, 1.0, "x", datetime.now(), 1)),
+        ("InventoryDatabase.delete_item", "DELETE FROM inventory WHERE id=%s", (1,)),
+        ("InventoryDatabase.flag_item", "UPDATE inventory SET flag=1 WHERE id=%s", (1,)),
+        ("InventoryDatabase.find_by_code",
+         "SELECT * FROM inventory WHERE user_id=%s AND code=%s ORDER BY expiry_date, id LIMIT 1", (1, "0123456789012")),
+        ("InventoryDatabase.flag_expiring", "UPDATE inventory SET flag=1 WHERE flag=0 AND expiry_date < %s", (datetime.now(),)),
+        ("InventoryDatabase.load_expiry_schedule",
+         "SELECT id, user_id, expiry_date FROM inventory WHERE flag=0 AND expiry_date < %s ORDER BY expiry_date LIMIT %s",
+         (datetime.now(), 10000)),
+        ("InventoryDatabase.load_inventory", "SELECT * FROM inventory WHERE user_id=%s", (1,)),
+        ("InventoryDatabase.load_inventory_page", page_sql.format(columns="*") + " LIMIT %s", tuple(page_params) + (100,)),
+        ("InventoryDatabase.load_top_users_for_item",
+         "SELECT u.username, h.total_quantity FROM item_holdings h JOIN users u ON h.user_id = u.id "
+         "WHERE h.name = %s ORDER BY h.total_quantity DESC LIMIT 5", ("Paracetamol",)),
+        ("InventoryDatabase.changes_since",
+         "SELECT c.change_id, c.item_id, c.user_id AS change_user_id, c.op, i.* FROM inventory_changes c "
+         "LEFT JOIN inventory i ON i.id = c.item_id AND i.user_id = %s WHERE c.change_id > %s ORDER BY c.change_id LIMIT %s",
+         (1, 0, 1000)),
+        ("InventoryDatabase.load_top_users_for_item_raw",
+         "SELECT u.username, SUM(i.quantity) as total_quantity FROM inventory i JOIN users u ON i.user_id = u.id "
+         "WHERE i.name = %s GROUP BY u.username ORDER BY total_quantity DESC LIMIT 5", ("Paracetamol",)),
+        ("InventoryDatabase.load_stock_movement_totals",
+         "SELECT name, SUM(delta) AS net FROM stock_movements WHERE user_id = %s AND moved_at > %s AND moved_at <= %s GROUP BY name",
+         (1, datetime.now(), datetime.now())),
+        ("InventoryDatabase.load_stock_on_hand",
+         "SELECT name, quantity FROM stock_snapshots WHERE user_id=%s AND taken_at=%s", (1, datetime.now())),
+        ("InventoryDatabase.load_user_totals_page",
+         "SELECT user_id, COUNT(*) AS items, SUM(quantity * price) AS total_value FROM inventory "
+         "WHERE user_id > %s GROUP BY user_id ORDER BY user_id LIMIT %s", (0, 50)),
+        ("InventoryDatabase.load_item_totals_page",
+         "SELECT name, COUNT(*) AS holders, SUM(total_quantity) AS total_quantity FROM item_holdings "
+         "WHERE item_count > 0 AND name > %s GROUP BY name ORDER BY name LIMIT %s", ("", 50)),
+        ("InventoryDatabase.load_item_holders_page",
+         "SELECT h.user_id, h.total_quantity FROM item_holdings h WHERE h.name = %s AND h.item_count > 0 "
+         "AND h.user_id > %s ORDER BY h.user_id LIMIT %s", ("Paracetamol", 0, 50)),
+        ("InventoryDatabase.load_expiry_range_totals",
+         "SELECT COUNT(*) AS items, SUM(quantity) AS total_quantity FROM inventory WHERE expiry_date >= %s AND expiry_date < %s",
+         (datetime.now(), datetime.now())),
+        ("InventoryDatabase.load_inventory_page (estate-wide expiry)", bucket_sql.format(columns="*") + " LIMIT %s",
+         tuple(bucket_params) + (100,)),
+    ]
+
+
+def explain_queries(pool: ConnectionPool) -> typing.List[typing.Tuple[str, str, list]]:
+    report = []
+    with pool.cursor() as cursor:
+        for name, sql, params in index_checks():
+            cursor.execute("EXPLAIN " + sql, params)
+            plan = cursor.fetchall()
+            full_scans = [
+                row for row in plan
+                if (row.get('type') == 'ALL' or not row.get('key'))
+                and not any(note in (row.get('Extra') or '') for note in ("no matching row", "Impossible WHERE"))
+            ]
+            report.append((name, "ok" if not full_scans else "FULL SCAN", plan))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply and inspect the E-miti database schema")
+    parser.add_argument("command", nargs="?", default="migrate", choices=["migrate", "status", "explain"])
+    args = parser.parse_args()
+
+    load_dotenv()
+    pool = ConnectionPool(host=os.getenv("DB_HOST"), user=os.getenv("DB_USER"),
+                          password=os.getenv("DB_PASSWORD"), database=os.getenv("DB_NAME"),
+                          pool_size=1)
+    try:
+        if args.command == "migrate":
+            applied = apply_migrations(pool)
+            print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
+        elif args.command == "status":
+            with pool.cursor() as cursor:
+                done = applied_versions(cursor)
+            for version, description, _ in MIGRATIONS:
+                print(f"{version:>3} {'applied' if version in done else 'pending':<8} {description}")
+        else:
+            failed = False
+            for name, status, plan in explain_queries(pool):
+                keys = ", ".join(f"{row.get('table')}:{row.get('key') or row.get('type')}" for row in plan)
+                print(f"{status:<10} {name:<45} {keys}")
+                failed = failed or status != "ok"
+            return 1 if failed else 0
+    finally:
+        pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
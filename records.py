@@ -0,0 +1,144 @@
+import typing
+from array import array
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+INVENTORY_COLUMNS = ("id", "user_id", "name", "quantity", "price", "code", "expiry_date", "created_at", "flag")
+USER_COLUMNS = ("id", "username", "password", "role")
+INVENTORY_SELECT = ", ".join(INVENTORY_COLUMNS)
+USER_SELECT = ", ".join(USER_COLUMNS)
+
+# "dict" rows are what the dictionary cursors return; "record" is one slotted
+# object per row and "columns" one InventoryBatch for the whole result
+ROW_FORMS = ("dict", "record", "columns")
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def check_form(form: str):
+    if form not in ROW_FORMS:
+        raise ValueError(f"Unsupported row form: {form}")
+
+
+class Record:
+    # Read access mirrors the row dicts (record['name'], record.get('flag'),
+    # dict(record)), so code written against dict rows takes records as well
+    __slots__ = ()
+
+    def __getitem__(self, column: str):
+        try:
+            return getattr(self, column)
+        except AttributeError:
+            raise KeyError(column) from None
+
+    def get(self, column: str, default=None):
+        return getattr(self, column, default)
+
+    def keys(self) -> tuple:
+        return self.__slots__
+
+    def as_dict(self) -> dict:
+        return {column: getattr(self, column) for column in self.__slots__}
+
+    def replace(self, **changes) -> "Record":
+        # Cached records are shared between callers; derive a copy rather than assigning
+        return type(self)(*(changes.get(column, getattr(self, column)) for column in self.__slots__))
+
+    def __eq__(self, other) -> bool:
+        return type(other) is type(self) and all(getattr(self, column) == getattr(other, column) for column in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{column}={getattr(self, column)!r}' for column in self.__slots__)})"
+
+
+class InventoryItem(Record):
+    __slots__ = INVENTORY_COLUMNS
+
+    def __init__(self, id, user_id, name, quantity, price, code, expiry_date, created_at, flag):
+        self.id = id
+        self.user_id = user_id
+        self.name = name
+        self.quantity = quantity
+        self.price = price
+        self.code = code
+        self.expiry_date = expiry_date
+        self.created_at = created_at
+        self.flag = flag
+
+
+class User(Record):
+    __slots__ = USER_COLUMNS
+
+    def __init__(self, id, username, password, role):
+        self.id = id
+        self.username = username
+        self.password = password
+        self.role = role
+
+
+class InventoryBatch:
+    # Column-per-field storage for bulk reads: numbers live in typed arrays
+    # (price as integer cents, dates as seconds since EPOCH), so a row costs
+    # a few dozen bytes plus its two strings instead of a dict and its values.
+    def __init__(self):
+        self.id = array('q')
+        self.user_id = array('q')
+        self.name = []
+        self.quantity = array('q')
+        self.price_cents = array('q')
+        self.code = []
+        self.expiry_date = array('d')
+        self.created_at = array('d')
+        self.flag = array('b')
+
+    @classmethod
+    def from_rows(cls, rows: typing.Iterable[tuple]) -> "InventoryBatch":
+        batch = cls()
+        batch.extend(rows)
+        return batch
+
+    def extend(self, rows: typing.Iterable[tuple]):
+        # rows are tuples in INVENTORY_COLUMNS order, as a tuple cursor returns them
+        for item_id, user_id, name, quantity, price, code, expiry_date, created_at, flag in rows:
+            self.id.append(item_id)
+            self.user_id.append(user_id)
+            self.name.append(name)
+            self.quantity.append(quantity)
+            self.price_cents.append(round(price * 100))
+            self.code.append(code)
+            self.expiry_date.append((expiry_date - EPOCH).total_seconds())
+            self.created_at.append((created_at - EPOCH).total_seconds())
+            self.flag.append(flag)
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def __getitem__(self, index: int) -> InventoryItem:
+        return InventoryItem(
+            self.id[index], self.user_id[index], self.name[index], self.quantity[index],
+            Decimal(self.price_cents[index]) / 100, self.code[index],
+            EPOCH + timedelta(seconds=self.expiry_date[index]),
+            EPOCH + timedelta(seconds=self.created_at[index]), self.flag[index]
+        )
+
+    def __iter__(self) -> typing.Iterator[InventoryItem]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def slice(self, start: int, stop: typing.Optional[int] = None) -> "InventoryBatch":
+        batch = InventoryBatch()
+        for column, values in vars(self).items():
+            setattr(batch, column, values[start:stop])
+        return batch
+
+    def total_quantity(self) -> int:
+        return sum(self.quantity)
+
+    def total_value(self) -> Decimal:
+        return Decimal(sum(quantity * cents for quantity, cents in zip(self.quantity, self.price_cents))) / 100
+
+
+def decode_inventory(rows: typing.Iterable[tuple], form: str):
+    if form == "columns":
+        return InventoryBatch.from_rows(rows)
+    return [InventoryItem(*row) for row in rows]
@@ -0,0 +1,149 @@
+import threading
+import typing
+from collections import defaultdict
+
+
+def trigrams(text: str) -> typing.Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    # Levenshtein distance, giving up early once every path exceeds limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class ItemSearchIndex:
+    # Item names are indexed case-insensitively in a character trie (prefix
+    # lookups) and a trigram inverted index (substring and typo-tolerant
+    # lookups). Names are reference counted by the number of inventory rows
+    # using them so updates and deletes can be applied incrementally.
+    def __init__(self):
+        self._counts = {}
+        self._display = {}
+        self._gram_counts = {}
+        self._trie = {}
+        self._grams = defaultdict(set)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._counts)
+
+    def build(self, names: typing.Iterable[typing.Tuple[str, int]]):
+        with self._lock:
+            for name, count in names:
+                self.add(name, count)
+
+    def add(self, name: str, count: int = 1):
+        key = name.strip().lower()
+        if not key:
+            return
+        with self._lock:
+            if key in self._counts:
+                self._counts[key] += count
+                return
+            self._counts[key] = count
+            self._display[key] = name.strip()
+            node = self._trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[""] = key
+            grams = trigrams(key)
+            self._gram_counts[key] = len(grams)
+            for gram in grams:
+                self._grams[gram].add(key)
+
+    def remove(self, name: str, count: int = 1):
+        key = name.strip().lower()
+        with self._lock:
+            if key not in self._counts:
+                return
+            self._counts[key] -= count
+            if self._counts[key] > 0:
+                return
+            del self._counts[key]
+            del self._display[key]
+            del self._gram_counts[key]
+            path = [self._trie]
+            for char in key:
+                path.append(path[-1][char])
+            del path[-1][""]
+            for depth in range(len(key), 0, -1):
+                if path[depth]:
+                    break
+                del path[depth - 1][key[depth - 1]]
+            for gram in trigrams(key):
+                self._grams[gram].discard(key)
+                if not self._grams[gram]:
+                    del self._grams[gram]
+
+    def _prefixed(self, prefix: str, limit: int) -> typing.List[str]:
+        node = self._trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        found = []
+        stack = [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            if "" in node:
+                found.append(node[""])
+            stack.extend(child for char, child in sorted(node.items(), reverse=True) if char)
+        return found
+
+    def search(self, query: str, limit: int = 10) -> typing.List[str]:
+        query = query.strip().lower()
+        if not query:
+            return []
+        with self._lock:
+            scores = {}
+            if query in self._counts:
+                scores[query] = 4.0
+            for key in self._prefixed(query, limit):
+                scores.setdefault(key, 3.0)
+
+            query_grams = trigrams(query)
+            overlap = defaultdict(int)
+            for gram in query_grams:
+                for key in self._grams.get(gram, ()):
+                    overlap[key] += 1
+            max_distance = 1 if len(query) <= 4 else 2
+            # A name within max_distance edits keeps all but 3 * max_distance of the query's trigrams
+            min_shared = max(1, len(query_grams) - 3 * max_distance)
+            for key, shared in overlap.items():
+                if key in scores:
+                    continue
+                if shared < min_shared:
+                    continue
+                if query in key:
+                    scores[key] = 2.0
+                    continue
+                similarity = shared / (len(query_grams) + self._gram_counts[key] - shared)
+                if similarity < 0.2:
+                    continue
+                distance = edit_distance(query, key[:len(query) + max_distance], max_distance)
+                if distance <= max_distance or similarity >= 0.5:
+                    scores[key] = similarity + (1.0 - distance / (max_distance + 1) if distance <= max_distance else 0)
+
+            ranked = sorted(scores, key=lambda key: (-scores[key], -self._counts[key], key))
+            return [self._display[key] for key in ranked[:limit]]
+
+    def on_change(self, event: str, item: dict, old: typing.Optional[dict] = None):
+        if event == "add":
+            self.add(item['name'])
+        elif event == "delete":
+            self.remove(item['name'])
+        elif event == "update" and old is not None and old['name'] != item['name']:
+            self.remove(old['name'])
+            self.add(item['name'])
@@ -0,0 +1,97 @@
+import os
+import typing
+from datetime import timedelta
+from db_pool import ConnectionPool
+from db_metrics import PrometheusFileExporter, QueryMetrics, serve_metrics
+from expiry_scheduler import ExpiryScheduler
+from inventory_database import InventoryDatabase
+from inventory_management import InventoryManagement
+from migrations import apply_migrations
+from stock_ledger import StockCheckpointer
+from user_database import UserDatabase
+from user_management import UserManagement
+from write_journal import WriteJournal
+
+
+class Services:
+    def __init__(self, pool, user_mgmt: UserManagement, inventory_mgmt: InventoryManagement,
+                 expiry_scheduler=None, metrics_exporter=None, stock_checkpointer=None, metrics_server=None):
+        self.pool = pool
+        self.user_mgmt = user_mgmt
+        self.inventory_mgmt = inventory_mgmt
+        self.expiry_scheduler = expiry_scheduler
+        self.metrics_exporter = metrics_exporter
+        self.stock_checkpointer = stock_checkpointer
+        self.metrics_server = metrics_server
+
+    def close(self):
+        if self.expiry_scheduler is not None:
+            self.expiry_scheduler.stop()
+        if self.stock_checkpointer is not None:
+            self.stock_checkpointer.stop()
+        journal = self.inventory_mgmt.journal
+        if journal is not None:
+            # Whatever the flusher cannot push now is replayed from the file on the next start
+            self.inventory_mgmt.flusher.stop()
+            journal.close()
+        self.pool.close()
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+        if self.metrics_server is not None:
+            # Frees the port for the next connect (e.g. logging in again from the Welcome screen)
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+
+
+def connect_services(background: bool = True, pool_size: typing.Optional[int] = None) -> Services:
+    # Get MySQL connection parameters from environment variables
+    db_host = os.getenv("DB_HOST")
+    db_user = os.getenv("DB_USER")
+    db_password = os.getenv("DB_PASSWORD")
+    db_name = os.getenv("DB_NAME")
+    db_pool_size = pool_size or int(os.getenv("DB_POOL_SIZE", "5"))
+
+    metrics = QueryMetrics(slow_query_ms=float(os.getenv("DB_SLOW_QUERY_MS", "250")),
+                           slow_query_log=os.getenv("DB_SLOW_QUERY_LOG"))
+
+    # One pool shared by both database classes; connections are opened on demand
+    pool = ConnectionPool(host=db_host, user=db_user, password=db_password, database=db_name,
+                          pool_size=db_pool_size, metrics=metrics)
+    # Nothing is started until the database is reachable and migrated, so a
+    # failed connect leaves nothing behind for the retry to trip over
+    try:
+        if os.getenv("DB_AUTO_MIGRATE", "1") == "1":
+            apply_migrations(pool)
+        # Write-behind journal for interactive sessions; scripted runs write straight through
+        journal = None
+        if background and os.getenv("WRITE_BEHIND_JOURNAL"):
+            journal = WriteJournal(os.getenv("WRITE_BEHIND_JOURNAL"))
+    except Exception:
+        pool.close()
+        raise
+    metrics_exporter = None
+    metrics_server = None
+    if background and os.getenv("DB_METRICS_FILE"):
+        metrics_exporter = PrometheusFileExporter(metrics, os.getenv("DB_METRICS_FILE"))
+        metrics_exporter.start()
+    if background and os.getenv("DB_METRICS_PORT"):
+        try:
+            metrics_server = serve_metrics(metrics, int(os.getenv("DB_METRICS_PORT")))
+        except OSError as err:
+            # Metrics are optional; a taken port must not stop the terminal from working
+            print(f"Error: metrics endpoint not started: {err}")
+    user_mgmt = UserManagement(UserDatabase(pool))
+    inventory_mgmt = InventoryManagement(InventoryDatabase(pool), journal=journal)
+    expiry_scheduler = None
+    stock_checkpointer = None
+    if journal is not None:
+        inventory_mgmt.flusher.start()
+    if background:
+        # Every terminal may run one, but only the holder of its database lock flags anything
+        if os.getenv("EXPIRY_SCHEDULER", "1") == "1":
+            expiry_scheduler = ExpiryScheduler(inventory_mgmt, lead_days=int(os.getenv("EXPIRY_LEAD_DAYS", "0")), pool=pool,
+                                               retry_base=pool.backoff_base, retry_max=pool.backoff_max)
+            expiry_scheduler.start()
+        stock_checkpointer = StockCheckpointer(inventory_mgmt, timedelta(hours=float(os.getenv("STOCK_SNAPSHOT_HOURS", "24"))))
+        stock_checkpointer.start()
+    return Services(pool, user_mgmt, inventory_mgmt, expiry_scheduler, metrics_exporter, stock_checkpointer, metrics_server)
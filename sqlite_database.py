@@ -0,0 +1,284 @@
+import re
+import sqlite3
+import threading
+import typing
+from contextlib import contextmanager
+from datetime import datetime
+import mysql.connector
+from inventory_database import InventoryDatabase
+from migrations import STOCK_MOVEMENT_TRIGGERS
+
+# In-process stand-in for the MySQL server, used by the benchmarks and load
+# tests. SQLitePool exposes the same cursor()/connection() surface as
+# ConnectionPool, so UserDatabase and InventoryDatabase run unchanged on top
+# of it; statements are translated from MySQL's paramstyle and dialect on the
+# fly and sqlite3 errors are re-raised as mysql.connector errors.
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL,
+        role TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inventory (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        price REAL NOT NULL,
+        code TEXT NOT NULL,
+        expiry_date TIMESTAMP NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        flag INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS item_holdings (
+        name TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        total_quantity INTEGER NOT NULL DEFAULT 0,
+        item_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (name, user_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_users_login ON users (username, password)",
+    "CREATE INDEX IF NOT EXISTS idx_inventory_user ON inventory (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_inventory_user_name ON inventory (user_id, name, id)",
+    "CREATE INDEX IF NOT EXISTS idx_inventory_user_expiry ON inventory (user_id, expiry_date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_inventory_user_price ON inventory (user_id, price, id)",
+    "CREATE INDEX IF NOT EXISTS idx_inventory_name ON inventory (name, user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_inventory_flag_expiry ON inventory (flag, expiry_date)",
+    "CREATE INDEX IF NOT EXISTS idx_inventory_user_code ON inventory (user_id, code)",
+    "CREATE INDEX IF NOT EXISTS idx_inventory_user_totals ON inventory (user_id, quantity, price, flag)",
+    "CREATE INDEX IF NOT EXISTS idx_inventory_expiry ON inventory (expiry_date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_item_holdings_top ON item_holdings (name, total_quantity)",
+    """
+    CREATE TABLE IF NOT EXISTS inventory_changes (
+        change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        changed_at TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_inventory_changes_changed_at ON inventory_changes (changed_at)",
+    *(
+        f"CREATE TRIGGER IF NOT EXISTS trg_inventory_changes_{event} AFTER {event.upper()} ON inventory BEGIN "
+        f"INSERT INTO inventory_changes (item_id, user_id, op, changed_at) "
+        f"VALUES ({row}.id, {row}.user_id, '{event}', strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')); END"
+        for event, row in (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD"))
+    ),
+    """
+    CREATE TABLE IF NOT EXISTS applied_mutations (
+        mutation_key TEXT PRIMARY KEY,
+        applied_at TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_applied_mutations_applied_at ON applied_mutations (applied_at)",
+    """
+    CREATE TABLE IF NOT EXISTS stock_movements (
+        movement_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        delta INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        moved_at TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_stock_movements_user_time ON stock_movements (user_id, moved_at)",
+    """
+    CREATE TABLE IF NOT EXISTS stock_checkpoints (
+        user_id INTEGER NOT NULL,
+        taken_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (user_id, taken_at)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_snapshots (
+        user_id INTEGER NOT NULL,
+        taken_at TIMESTAMP NOT NULL,
+        name TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        PRIMARY KEY (user_id, taken_at, name)
+    )
+    """,
+    *(
+        f"CREATE TRIGGER IF NOT EXISTS trg_stock_movements_{event} AFTER {event.upper()} ON inventory BEGIN "
+        + body.replace(" FROM DUAL", "").replace("NOW(6)", "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')")
+        + "; END"
+        for event, body in STOCK_MOVEMENT_TRIGGERS.items()
+    ),
+]
+
+PLACEHOLDER = re.compile(r"%s|%%")
+
+
+def translate(query: str) -> str:
+    query = PLACEHOLDER.sub(lambda match: "?" if match.group() == "%s" else "%", query)
+    query = query.replace(" FOR UPDATE", "")
+    return query.replace("LIKE ?", "LIKE ? ESCAPE '\\'")
+
+
+def database_error(err: sqlite3.Error) -> mysql.connector.Error:
+    if isinstance(err, sqlite3.IntegrityError):
+        return mysql.connector.errors.IntegrityError(msg=str(err))
+    if isinstance(err, sqlite3.OperationalError):
+        return mysql.connector.errors.OperationalError(msg=str(err))
+    return mysql.connector.errors.DatabaseError(msg=str(err))
+
+
+class SQLiteCursor:
+    def __init__(self, cursor: sqlite3.Cursor, dictionary: bool):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> int:
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip([column[0] for column in self._cursor.description], row))
+
+    def execute(self, query: str, params: typing.Sequence = ()):
+        try:
+            self._cursor.execute(translate(query), tuple(params))
+        except sqlite3.Error as err:
+            raise database_error(err) from err
+
+    def executemany(self, query: str, seq_params: typing.Iterable[typing.Sequence]):
+        try:
+            self._cursor.executemany(translate(query), [tuple(params) for params in seq_params])
+        except sqlite3.Error as err:
+            raise database_error(err) from err
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size: int = 1000) -> list:
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self) -> list:
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._row(row)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLitePool:
+    # Each thread gets its own connection to the same database, like pooled
+    # MySQL sessions; ":memory:" is shared between threads via a named
+    # shared-cache database that lives as long as the pool.
+    _counter = 0
+
+    def __init__(self, path: str = ":memory:", timeout: float = 5.0, metrics=None):
+        if path == ":memory:":
+            SQLitePool._counter += 1
+            self.database = f"file:e_miti_{id(self)}_{SQLitePool._counter}?mode=memory&cache=shared"
+        else:
+            self.database = path
+        self.timeout = timeout
+        self.metrics = metrics
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        # Keeps a shared in-memory database alive while the pool exists
+        self._keepalive = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.database, timeout=self.timeout, uri=self.database.startswith("file:"),
+                               detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def failures(self) -> int:
+        return getattr(self._local, "failures", 0)
+
+    @contextmanager
+    def connection(self):
+        try:
+            yield self.acquire()
+        except mysql.connector.Error:
+            self._local.failures = self.failures() + 1
+            raise
+
+    @contextmanager
+    def cursor(self, dictionary: bool = True, commit: bool = False, buffered: bool = True, name: str = "query",
+               prepared: bool = False):
+        # sqlite3 already caches compiled statements per connection, so prepared is a no-op
+        conn = self.acquire()
+        cursor = SQLiteCursor(conn.cursor(), dictionary)
+        if self.metrics is not None:
+            cursor = self.metrics.wrap(cursor, name)
+        try:
+            yield cursor
+            if commit:
+                try:
+                    conn.commit()
+                except sqlite3.Error as err:
+                    # e.g. "database is locked" under concurrent writers
+                    raise database_error(err) from err
+        except Exception as err:
+            if isinstance(err, mysql.connector.Error):
+                self._local.failures = self.failures() + 1
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def create_schema(self):
+        conn = self.acquire()
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+
+class SQLiteInventoryDatabase(InventoryDatabase):
+    def _adjust_holdings(self, cursor, adjustments: dict):
+        changes = [(name, user_id, quantity, count) for (name, user_id), (quantity, count) in adjustments.items()
+                   if quantity or count]
+        if not changes:
+            return
+        cursor.executemany(
+            "INSERT INTO item_holdings (name, user_id, total_quantity, item_count) VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (name, user_id) DO UPDATE SET total_quantity = total_quantity + excluded.total_quantity, "
+            "item_count = item_count + excluded.item_count",
+            changes
+        )
+        emptied = [(name, user_id) for name, user_id, _, count in changes if count < 0]
+        if emptied:
+            cursor.executemany("DELETE FROM item_holdings WHERE name=%s AND user_id=%s AND item_count <= 0", emptied)
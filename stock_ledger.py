@@ -0,0 +1,111 @@
+import threading
+import typing
+from datetime import datetime, timedelta
+
+SNAPSHOT_INTERVAL = timedelta(hours=24)
+# Snapshots only cover movements at least this old, so a transaction still in
+# flight when the snapshot is taken cannot commit a movement behind it
+SNAPSHOT_SETTLE = timedelta(minutes=5)
+HISTORY_DAYS = 30
+
+
+def _number(value) -> int:
+    return int(value or 0)
+
+
+class StockHistory:
+    # Opening and closing stock per item name over (start, end], with what moved in between
+    def __init__(self, user_id: int, start: datetime, end: datetime):
+        self.user_id = user_id
+        self.start = start
+        self.end = end
+        self.opening_snapshot = None
+        self.items = []
+
+    @property
+    def days(self) -> float:
+        return max((self.end - self.start).total_seconds() / 86400, 1 / 24)
+
+    def as_dict(self) -> dict:
+        return {
+            "user_id": self.user_id,
+            "start": self.start,
+            "end": self.end,
+            "opening_snapshot": self.opening_snapshot,
+            "items": self.items,
+        }
+
+
+def build_stock_history(db, user_id: int, start: datetime, end: typing.Optional[datetime] = None,
+                        name: typing.Optional[str] = None) -> StockHistory:
+    # Opening stock comes from the nearest snapshot plus a short replay; the
+    # rest is one aggregate over the period's movements
+    end = end or datetime.now()
+    history = StockHistory(user_id, start, end)
+    history.opening_snapshot, opening = db.load_stock_on_hand(user_id, start, name)
+    totals = {row['name']: row for row in db.load_stock_movement_totals(user_id, start, end, name)}
+    for item_name in sorted(set(opening) | set(totals), key=str.lower):
+        row = totals.get(item_name, {})
+        consumed = _number(row.get('consumed'))
+        closing = opening.get(item_name, 0) + _number(row.get('net'))
+        per_day = round(consumed / history.days, 2)
+        history.items.append({
+            "name": item_name,
+            "opening": opening.get(item_name, 0),
+            "received": _number(row.get('received')),
+            "consumed": consumed,
+            "removed": _number(row.get('removed')),
+            "closing": closing,
+            "consumed_per_day": per_day,
+            "days_of_cover": round(closing / per_day, 1) if per_day and closing > 0 else None,
+        })
+    return history
+
+
+def format_stock_history(history: StockHistory) -> str:
+    lines = [
+        f"Stock movements {history.start.strftime('%Y-%m-%d')} to {history.end.strftime('%Y-%m-%d %H:%M')}",
+        "",
+        f"  {'Item':<20} {'Open':>7} {'In':>7} {'Used':>7} {'Out':>7} {'Close':>7} {'Per day':>8} {'Cover':>6}",
+    ]
+    for item in history.items:
+        cover = "-" if item['days_of_cover'] is None else f"{item['days_of_cover']:.0f}d"
+        lines.append(f"  {item['name'][:20]:<20} {item['opening']:>7} {item['received']:>7} {item['consumed']:>7} "
+                     f"{item['removed']:>7} {item['closing']:>7} {item['consumed_per_day']:>8} {cover:>6}")
+    if not history.items:
+        lines.append("  no stock movements")
+    return "\n".join(lines)
+
+
+class StockCheckpointer:
+    # Takes a per-user stock snapshot once every interval so point-in-time
+    # queries replay at most one interval of movements. Every terminal may run
+    # one; the database skips users another terminal has just snapshotted.
+    def __init__(self, inventory_mgmt, interval: timedelta = SNAPSHOT_INTERVAL, check_every: float = 900.0):
+        self.inventory_mgmt = inventory_mgmt
+        self.interval = interval
+        self.check_every = check_every
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stock-checkpointer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            self.inventory_mgmt.checkpoint_stock(interval=self.interval)
+            with self._condition:
+                if self._stopped:
+                    return
+                self._condition.wait(self.check_every)
+                if self._stopped:
+                    return
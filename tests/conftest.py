@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory_management import InventoryManagement
+from sqlite_database import SQLiteInventoryDatabase, SQLitePool
+
+
+@pytest.fixture
+def pool():
+    pool = SQLitePool()
+    pool.create_schema()
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def inventory_db(pool):
+    return SQLiteInventoryDatabase(pool)
+
+
+@pytest.fixture
+def inventory_mgmt(inventory_db):
+    return InventoryManagement(inventory_db)
@@ -0,0 +1,45 @@
+import types
+
+import pytest
+
+from cli import CommandError, Session
+
+USERS = {"admin": ("secret", 1, "admin"), "clerk": ("secret", 2, "pharmacist")}
+
+
+class FakeUserManagement:
+    def authenticate_user(self, username, password):
+        stored, user_id, role = USERS.get(username, (None, None, None))
+        if stored is None or stored != password:
+            return False, None, None
+        return True, user_id, role
+
+
+def session(username, password):
+    return Session(types.SimpleNamespace(user_mgmt=FakeUserManagement()), username, password)
+
+
+def test_require_user_authenticates_once():
+    clerk = session("clerk", "secret")
+    assert clerk.require_user() == 2
+    clerk.password = "changed"
+    assert clerk.require_user() == 2
+
+
+@pytest.mark.parametrize("username, password", [(None, "secret"), ("clerk", None)])
+def test_require_user_needs_credentials(username, password):
+    with pytest.raises(CommandError, match="needs --username"):
+        session(username, password).require_user()
+
+
+def test_require_user_rejects_bad_password():
+    with pytest.raises(CommandError, match="invalid credentials"):
+        session("clerk", "wrong").require_user()
+
+
+def test_require_admin():
+    session("admin", "secret").require_admin()
+    with pytest.raises(CommandError, match="only Admin"):
+        session("clerk", "secret").require_admin()
+    with pytest.raises(CommandError, match="invalid credentials"):
+        session("admin", "wrong").require_admin()
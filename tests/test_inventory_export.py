@@ -0,0 +1,38 @@
+import csv
+from datetime import datetime
+
+import pytest
+
+from inventory_export import export_inventory, read_columnar
+
+
+@pytest.fixture
+def stocked(inventory_mgmt):
+    for i in range(1234):
+        inventory_mgmt.create_item(1, f"Item {i}", i, 1.5, f"C{i}", datetime(2030, 1, 1))
+    return inventory_mgmt
+
+
+def csv_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))[1:]
+
+
+@pytest.mark.parametrize("chunk_size", [300, 500, 1000])
+def test_rows_per_file_is_never_exceeded(stocked, tmp_path, chunk_size):
+    result = export_inventory(stocked, str(tmp_path / "out.csv"), 1, chunk_size=chunk_size, rows_per_file=500)
+    assert result.rows == 1234
+    assert [len(csv_rows(path)) for path in result.files] == [500, 500, 234]
+    ids = [int(row[0]) for path in result.files for row in csv_rows(path)]
+    assert ids == sorted(ids) and len(set(ids)) == 1234
+
+
+def test_columnar_parts_split_at_the_boundary(stocked, tmp_path):
+    result = export_inventory(stocked, str(tmp_path / "out.col"), 1, chunk_size=300, rows_per_file=500)
+    assert [sum(len(batch) for batch in read_columnar(path)) for path in result.files] == [500, 500, 234]
+
+
+def test_empty_export_leaves_one_part(inventory_mgmt, tmp_path):
+    result = export_inventory(inventory_mgmt, str(tmp_path / "out.csv"), 1, rows_per_file=500)
+    assert result.rows == 0
+    assert [csv_rows(path) for path in result.files] == [[]]
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+EXPIRY = datetime(2030, 1, 1)
+
+
+def holdings(inventory_db, name):
+    with inventory_db.pool.cursor() as cursor:
+        cursor.execute("SELECT user_id, total_quantity FROM item_holdings WHERE name=%s", (name,))
+        return {row['user_id']: int(row['total_quantity']) for row in cursor.fetchall()}
+
+
+def test_single_item_writes_keep_holdings_in_step(inventory_mgmt, inventory_db):
+    inventory_mgmt.create_item(1, "Paracetamol", 10, 1.5, "P1", EXPIRY)
+    inventory_mgmt.create_item(1, "Paracetamol", 5, 1.5, "P2", EXPIRY)
+    inventory_mgmt.create_item(2, "Paracetamol", 7, 1.5, "P1", EXPIRY)
+    first = inventory_mgmt.find_by_code("P1", 1)
+    inventory_mgmt.update_item(first['id'], "Ibuprofen", 4, 2.0, "P1", EXPIRY)
+    inventory_mgmt.delete_item(inventory_mgmt.find_by_code("P2", 1)['id'])
+    inventory_mgmt.adjust_quantities_by_code({"P1": 3}, 2)
+    assert inventory_db.check_item_holdings() == []
+    assert holdings(inventory_db, "Paracetamol") == {2: 10}
+    assert holdings(inventory_db, "Ibuprofen") == {1: 4}
+
+
+def test_batch_keeps_holdings_in_step(inventory_mgmt, inventory_db):
+    ids = []
+    for i in range(4):
+        inventory_mgmt.create_item(1, "Amoxicillin", 10, 1.0, f"A{i}", EXPIRY)
+        ids.append(inventory_mgmt.find_by_code(f"A{i}", 1)['id'])
+    with inventory_mgmt.batch(flush_size=2) as batch:
+        batch.set_quantity(ids[0], 1)
+        batch.delete_item(ids[1])
+        batch.update_item(ids[2], "Cetirizine", 6, 1.0, "A2", EXPIRY)
+        batch.add_item(2, "Amoxicillin", 8, 1.0, "A9", EXPIRY)
+    assert inventory_db.check_item_holdings() == []
+    assert holdings(inventory_db, "Amoxicillin") == {1: 11, 2: 8}
+
+
+def test_delete_by_code_prefix_keeps_holdings_in_step(inventory_mgmt, inventory_db):
+    for i in range(5):
+        inventory_mgmt.create_item(1 + i % 2, "Paracetamol", 10, 1.0, f"BENCH-{i}", EXPIRY)
+    inventory_mgmt.create_item(1, "Paracetamol", 3, 1.0, "KEEP", EXPIRY)
+    with inventory_db.transaction() as cursor:
+        assert inventory_db.delete_by_code_prefix(cursor, "BENCH-", 1) == 3
+    assert inventory_db.check_item_holdings() == []
+    assert holdings(inventory_db, "Paracetamol") == {1: 3, 2: 20}
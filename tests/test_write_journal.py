@@ -0,0 +1,48 @@
+import json
+from datetime import datetime
+
+from inventory_management import InventoryManagement
+from write_journal import WriteJournal
+
+EXPIRY = datetime(2030, 1, 1)
+
+
+def test_replay_after_lost_done_lines_applies_once(inventory_db, tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = WriteJournal(path)
+    inventory_mgmt = InventoryManagement(inventory_db, journal=journal)
+    inventory_mgmt.create_item(1, "Paracetamol", 10, 1.5, "P1", EXPIRY)
+    inventory_mgmt.create_item(1, "Ibuprofen", 4, 2.0, "I1", EXPIRY)
+    assert inventory_mgmt.flusher.flush() == 2
+    journal.close()
+
+    # A crash before the done lines reached disk: every mutation is pending again
+    with open(path, encoding="utf-8") as f:
+        entries = [line for line in f if "done" not in json.loads(line)]
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(entries)
+    journal = WriteJournal(path)
+    inventory_mgmt = InventoryManagement(inventory_db, journal=journal)
+    assert len(journal) == 2
+    assert inventory_mgmt.flusher.flush() == 2
+    journal.close()
+
+    assert len(journal) == 0
+    assert inventory_mgmt.take_conflicts() == []
+    assert sorted(row['code'] for row in inventory_db.load_inventory(1)) == ["I1", "P1"]
+    assert inventory_db.check_item_holdings() == []
+
+
+def test_unreplayable_entry_is_retired_as_conflict(inventory_db, tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"key": "broken", "op": "update", "args": {}, "at": "2030-01-01 00:00:00"}) + "\n")
+    journal = WriteJournal(path)
+    inventory_mgmt = InventoryManagement(inventory_db, journal=journal)
+    inventory_mgmt.create_item(1, "Paracetamol", 10, 1.5, "P1", EXPIRY)
+    assert inventory_mgmt.flusher.flush() == 2
+    journal.close()
+
+    assert [entry['key'] for entry, _ in inventory_mgmt.take_conflicts()] == ["broken"]
+    assert inventory_mgmt.flusher.applied == 1
+    assert inventory_db.find_by_code("P1", 1)['quantity'] == 10
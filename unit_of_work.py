@@ -0,0 +1,102 @@
+import typing
+from datetime import datetime
+
+
+class UnitOfWork:
+    # Mutations are queued and coalesced per item, then sent as grouped
+    # statements whenever flush_size changes are pending and once more when the
+    # batch ends. Everything runs in the caller's single transaction, so nothing
+    # is visible (or durable) until the batch commits, and an error rolls the
+    # whole batch back.
+    def __init__(self, db, cursor, flush_size: int = 500):
+        self.db = db
+        self.cursor = cursor
+        self.flush_size = flush_size
+        self.flushes = 0
+        self.inserted = []
+        self.applied = {}
+        self.old_rows = {}
+        self._inserts = []
+        self._changes = {}
+
+    def __len__(self) -> int:
+        return len(self._inserts) + len(self._changes)
+
+    def add_item(self, user_id: int, name: str, quantity: int, price: float, code: str, expiry_date: str, flag: bool = False) -> dict:
+        item = {
+            "user_id": user_id,
+            "name": name,
+            "quantity": quantity,
+            "price": price,
+            "code": code,
+            "expiry_date": expiry_date,
+            "created_at": datetime.now(),
+            "flag": flag
+        }
+        self._inserts.append(item)
+        self._queued()
+        return item
+
+    def update_item(self, item_id: int, name: str, quantity: int, price: float, code: str, expiry_date: str):
+        self._change(item_id, name=name, quantity=quantity, price=price, code=code, expiry_date=expiry_date)
+
+    def set_quantity(self, item_id: int, quantity: int):
+        self._change(item_id, quantity=quantity)
+
+    def delete_item(self, item_id: int):
+        self._changes[item_id] = {"delete": True}
+        self._queued()
+
+    def flag_item(self, item_id: int):
+        change = self._changes.setdefault(item_id, {})
+        if not change.get('delete'):
+            change['flag'] = True
+        self._queued()
+
+    def _change(self, item_id: int, **fields):
+        change = self._changes.setdefault(item_id, {})
+        # Later writes win; anything after a delete would not match a row anyway
+        if not change.get('delete'):
+            change.setdefault('fields', {}).update(fields)
+        self._queued()
+
+    def _queued(self):
+        if len(self) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if not len(self):
+            return
+        inserts, changes = self._inserts, self._changes
+        self._inserts, self._changes = [], {}
+        old_rows = self.db.apply_batch(self.cursor, inserts, changes)
+        self.flushes += 1
+        self.inserted.extend(inserts)
+        for item_id, change in changes.items():
+            if item_id not in old_rows and item_id not in self.old_rows:
+                continue
+            # Keep the row as it was before the batch, and the net change across flushes
+            self.old_rows.setdefault(item_id, old_rows.get(item_id))
+            applied = self.applied.setdefault(item_id, {})
+            if change.get('delete'):
+                applied.clear()
+                applied['delete'] = True
+            elif not applied.get('delete'):
+                applied.setdefault('fields', {}).update(change.get('fields', {}))
+                applied['flag'] = applied.get('flag', False) or change.get('flag', False)
+
+    def changed_rows(self) -> typing.Iterator[typing.Tuple[str, dict, dict]]:
+        # (event, item, old) per existing item touched by the batch, for cache upkeep and listeners
+        for item_id, applied in self.applied.items():
+            old = self.old_rows[item_id]
+            if old is None:
+                continue
+            if applied.get('delete'):
+                yield "delete", old, None
+            elif applied.get('fields'):
+                item = dict(old, **applied['fields'])
+                if applied['flag']:
+                    item['flag'] = 1
+                yield "update", item, old
+            elif applied['flag']:
+                yield "flag", dict(old, flag=1), old
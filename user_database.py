@@ -1,38 +1,44 @@
 import mysql.connector
 import os
 from dotenv import load_dotenv
+from db_pool import ConnectionPool
+from records import USER_SELECT, User, check_form
 
 load_dotenv()
 
 class UserDatabase:
-    def __init__(self, host, user, password, database):
-        self.conn = mysql.connector.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=database
-        )
-        self.cursor = self.conn.cursor(dictionary=True)
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
 
     def save_user(self, username: str, password: str, role: str) -> bool:
         try:
-            self.cursor.execute(
-                "INSERT INTO users (username, password, role) VALUES (%s, %s, %s)",
-                (username, password, role)
-            )
-            self.conn.commit()
+            with self.pool.cursor(commit=True, name="user.save_user") as cursor:
+                cursor.execute(
+                    "INSERT INTO users (username, password, role) VALUES (%s, %s, %s)",
+                    (username, password, role)
+                )
             return True
         except mysql.connector.Error as err:
             print(f"Error: {err}")
             return False
 
-    def get_user(self, username: str, password: str) -> dict:
+    def get_user(self, username: str, password: str, form: str = "dict"):
+        check_form(form)
         try:
-            self.cursor.execute(
-                "SELECT * FROM users WHERE username=%s AND password=%s",
-                (username, password)
-            )
-            return self.cursor.fetchone()
+            if form == "dict":
+                with self.pool.cursor(name="user.get_user") as cursor:
+                    cursor.execute(
+                        "SELECT * FROM users WHERE username=%s AND password=%s",
+                        (username, password)
+                    )
+                    return cursor.fetchone()
+            with self.pool.cursor(dictionary=False, prepared=True, name="user.get_user") as cursor:
+                cursor.execute(
+                    f"SELECT {USER_SELECT} FROM users WHERE username=%s AND password=%s",
+                    (username, password)
+                )
+                row = cursor.fetchone()
+                return User(*row) if row else None
         except mysql.connector.Error as err:
             print(f"Error: {err}")
             return None
@@ -14,7 +14,7 @@ class UserManagement:
 
     def authenticate_user(self, username: str, password: str) -> typing.Tuple[bool, int, str]:
         hashed_password = self.hash_password(password)
-        user = self.db.get_user(username, hashed_password)
+        user = self.db.get_user(username, hashed_password, form="record")
         if user:
             return True, user['id'], user['role']
         return False, None, None
@@ -0,0 +1,279 @@
+import json
+import os
+import threading
+import time
+import typing
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from decimal import Decimal
+import mysql.connector
+
+DATE_FIELDS = ("expiry_date", "created_at")
+# Errors that mean the database will never accept an entry, as opposed to being unreachable
+REJECTED = (mysql.connector.IntegrityError, mysql.connector.DataError)
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    return value
+
+
+def _decode_args(args: dict) -> dict:
+    args = dict(args)
+    for field in DATE_FIELDS:
+        if isinstance(args.get(field), str):
+            args[field] = datetime.fromisoformat(args[field])
+    return args
+
+
+def _comparable(value):
+    # Journal values went through JSON; database values did not
+    if isinstance(value, (Decimal, float)):
+        return round(float(value), 2)
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+class WriteJournal:
+    # Append-only JSON-lines file of inventory mutations waiting to reach the
+    # database. Each mutation line carries an idempotency key; a later
+    # {"done": key} line retires it. Appends are group-committed: a syncer
+    # thread fsyncs everything written so far every sync_interval seconds and
+    # append() returns once its own line is on disk. Whatever is not retired
+    # when the process stops is pending again on the next start.
+    def __init__(self, path: str, sync_interval: float = 0.005, compact_bytes: int = 1 << 20):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.compact_bytes = compact_bytes
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._written = 0
+        self._synced = 0
+        self._closed = False
+        self._recover()
+        self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._sync_loop, name="journal-sync", daemon=True)
+        self._thread.start()
+
+    def _recover(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append was never acknowledged
+                    continue
+                if "done" in entry:
+                    self._pending.pop(entry["done"], None)
+                else:
+                    self._pending[entry["key"]] = entry
+
+    def append(self, op: str, **args) -> str:
+        key = uuid.uuid4().hex
+        entry = {"key": key, "op": op, "args": _encode(args), "at": datetime.now().isoformat(" ")}
+        line = json.dumps(entry) + "\n"
+        with self._condition:
+            if self._closed:
+                raise ValueError("write journal is closed")
+            self._file.write(line)
+            self._written += 1
+            sequence = self._written
+            self._pending[key] = entry
+            self._condition.notify_all()
+            while self._synced < sequence and not self._closed:
+                self._condition.wait()
+        return key
+
+    def _sync_loop(self):
+        while True:
+            with self._condition:
+                while self._written == self._synced and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+            # Let concurrent appends pile up so one fsync covers them all
+            time.sleep(self.sync_interval)
+            with self._condition:
+                target = self._written
+                self._file.flush()
+            os.fsync(self._file.fileno())
+            with self._condition:
+                self._synced = target
+                self._condition.notify_all()
+
+    def pending(self, limit: int = 1000) -> typing.List[dict]:
+        with self._condition:
+            entries = []
+            for entry in self._pending.values():
+                if len(entries) >= limit:
+                    break
+                entries.append(entry)
+            return entries
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def complete(self, keys: typing.Iterable[str]):
+        # A lost done line only means the entry is replayed and skipped by its key
+        with self._condition:
+            for key in keys:
+                if self._pending.pop(key, None) is not None:
+                    self._file.write(json.dumps({"done": key}) + "\n")
+                    self._written += 1
+            self._condition.notify_all()
+            if not self._pending and self._file.tell() > self.compact_bytes:
+                self._file.flush()
+                self._file.truncate(0)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout=5)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class JournalFlusher:
+    # Replays the journal to the database in batches, one transaction per
+    # batch, recording each key in applied_mutations in the same transaction
+    # so a replay after a crash cannot apply a mutation twice. Entries whose
+    # target is gone, has changed from what the editor saw, or that the
+    # database rejects or that cannot be replayed at all are retired as
+    # conflicts and kept for the UI to show. While the database is unreachable,
+    # entries stay pending and the flusher backs off.
+    def __init__(self, inventory_mgmt, journal: WriteJournal, batch_size: int = 200,
+                 interval: float = 0.5, backoff_max: float = 30.0):
+        self.inventory_mgmt = inventory_mgmt
+        self.journal = journal
+        self.batch_size = batch_size
+        self.interval = interval
+        self.backoff_max = backoff_max
+        self.applied = 0
+        self.conflicts = deque(maxlen=1000)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="journal-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        # One last attempt so a clean shutdown leaves as little as possible behind
+        try:
+            self.flush()
+        except mysql.connector.Error:
+            pass
+
+    def _run(self):
+        delay = self.interval
+        while not self._stopped.is_set():
+            try:
+                flushed = self.flush()
+                delay = self.interval
+            except mysql.connector.Error as err:
+                if delay == self.interval:
+                    # Reported once per outage; entries stay pending until it is over
+                    print(f"Error: {err}")
+                flushed = 0
+                delay = min(delay * 2, self.backoff_max)
+            except Exception as err:
+                # Nothing else may end the thread; whatever was pending is retried
+                print(f"Error: {err}")
+                flushed = 0
+                delay = min(delay * 2, self.backoff_max)
+            if not flushed:
+                self._stopped.wait(delay)
+
+    def flush(self) -> int:
+        entries = self.journal.pending(self.batch_size)
+        if not entries:
+            return 0
+        try:
+            conflicts = self._apply(entries)
+        except mysql.connector.Error as err:
+            if not isinstance(err, REJECTED):
+                raise
+            conflicts = self._apply_each(entries)
+        except Exception:
+            # e.g. an entry written by another version that this one cannot replay
+            conflicts = self._apply_each(entries)
+        for entry in entries:
+            if entry["key"] in conflicts:
+                self.conflicts.append((entry, conflicts[entry["key"]]))
+            else:
+                self.applied += 1
+        self.journal.complete(entry["key"] for entry in entries)
+        return len(entries)
+
+    def _apply_each(self, entries: typing.List[dict]) -> typing.Dict[str, str]:
+        # The batch was rolled back; apply entries one by one to isolate the failing ones
+        conflicts = {}
+        for entry in entries:
+            try:
+                conflicts.update(self._apply([entry]))
+            except REJECTED as err:
+                conflicts[entry["key"]] = f"rejected by database: {err}"
+                self._record_rejected(entry)
+            except mysql.connector.Error:
+                raise
+            except Exception as err:
+                conflicts[entry["key"]] = f"could not be replayed: {err!r}"
+                self._record_rejected(entry)
+        return conflicts
+
+    def _record_rejected(self, entry: dict):
+        with self.inventory_mgmt.db.transaction() as cursor:
+            self.inventory_mgmt.db.record_mutation_keys(cursor, [entry["key"]])
+
+    def _apply(self, entries: typing.List[dict]) -> typing.Dict[str, str]:
+        db = self.inventory_mgmt.db
+        conflicts = {}
+        with self.inventory_mgmt.batch(flush_size=len(entries) + 1) as work:
+            done = db.applied_mutation_keys(work.cursor, [entry["key"] for entry in entries])
+            todo = [entry for entry in entries if entry["key"] not in done]
+            current = db.lock_items(work.cursor, [entry["args"]["item_id"] for entry in todo if entry["op"] != "add"])
+            for entry in todo:
+                args = _decode_args(entry["args"])
+                if entry["op"] == "add":
+                    created_at = args.pop("created_at", None)
+                    item = work.add_item(**args)
+                    item['created_at'] = created_at or item['created_at']
+                    continue
+                item_id = args.pop("item_id")
+                row = current.get(item_id)
+                if row is None:
+                    conflicts[entry["key"]] = f"item {item_id} no longer exists"
+                    continue
+                expected = args.pop("expected", None) or {}
+                changed = [field for field, value in expected.items() if _comparable(row.get(field)) != _comparable(value)]
+                if changed:
+                    conflicts[entry["key"]] = f"item {item_id} was changed elsewhere ({', '.join(changed)})"
+                    continue
+                if entry["op"] == "update":
+                    work.update_item(item_id, **args)
+                    row.update(args)
+                elif entry["op"] == "flag":
+                    work.flag_item(item_id)
+                    row["flag"] = 1
+                elif entry["op"] == "delete":
+                    work.delete_item(item_id)
+                    del current[item_id]
+            db.record_mutation_keys(work.cursor, [entry["key"] for entry in todo])
+        return conflicts